@@ -94,7 +94,7 @@ LOGIN_URL = f"{BASE_URL}/login"
 
 REST_FRAMEWORK = {
     "DEFAULT_RENDERER_CLASSES": [
-        "telescope.utils.DefaultJSONRenderer",
+        "telescope.utils.FastJSONRenderer",
     ],
     "DEFAULT_AUTHENTICATION_CLASSES": (
         "rest_framework.authentication.SessionAuthentication",
@@ -0,0 +1,124 @@
+"""
+Benchmark of single phase vs late materialized (two phase) latest rows fetch.
+
+Creates tables of different column counts and row widths in a scratch
+database, sorted by (service, time) so that the time range does not map to
+a contiguous key range, and compares:
+
+    single: SELECT * ... ORDER BY time DESC LIMIT n
+    late:   SELECT _part, _part_offset, time ... ORDER BY time DESC LIMIT n
+            SELECT * ... WHERE (_part, _part_offset) IN <external keys> ...
+
+Usage:
+    python benchmarks/late_materialization.py --host localhost --rows 2000000
+
+The output shows, per column count and row width, the median time of both
+strategies; the crossover is where the `speedup` column goes above 1.
+"""
+
+import argparse
+import statistics
+import time
+
+import clickhouse_connect
+from clickhouse_connect.driver.external import ExternalData
+
+DATABASE = "telescope_benchmark"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8123)
+    parser.add_argument("--user", default="default")
+    parser.add_argument("--password", default="")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--limit", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--columns", default="5,20,50,100,200")
+    parser.add_argument("--widths", default="16,256,2048")
+    parser.add_argument("--keep", action="store_true", help="keep benchmark tables")
+    return parser.parse_args()
+
+
+def create_table(client, name, columns, width, rows):
+    payload = ", ".join(f"c{idx} String" for idx in range(columns))
+    client.command(f"DROP TABLE IF EXISTS {DATABASE}.{name}")
+    client.command(
+        f"CREATE TABLE {DATABASE}.{name} (service LowCardinality(String), "
+        f"time DateTime64(3), {payload}) ENGINE = MergeTree ORDER BY (service, time)"
+    )
+    values = ", ".join(f"randomPrintableASCII({width})" for _ in range(columns))
+    client.command(
+        f"INSERT INTO {DATABASE}.{name} SELECT concat('service-', toString(number % 50)), "
+        f"now64(3) - toIntervalMillisecond(number * 37), {values} "
+        f"FROM numbers({rows})"
+    )
+    client.command(f"OPTIMIZE TABLE {DATABASE}.{name} FINAL")
+
+
+def single_phase(client, name, limit):
+    client.query(
+        f"SELECT * FROM {DATABASE}.{name} WHERE service != '' "
+        f"ORDER BY time DESC LIMIT {limit}"
+    ).result_rows
+
+
+def late_phase(client, name, limit):
+    keys = client.query(
+        f"SELECT _part, _part_offset, toUnixTimestamp64Milli(time) "
+        f"FROM {DATABASE}.{name} WHERE service != '' ORDER BY time DESC LIMIT {limit}"
+    ).result_rows
+    external = ExternalData(
+        file_name="keys",
+        data="".join(f"{part}\t{offset}\n" for part, offset, _ in keys).encode(),
+        fmt="TabSeparated",
+        structure=["k0 String", "k1 UInt64"],
+    )
+    lower = min(item[2] for item in keys)
+    upper = max(item[2] for item in keys) + 1
+    client.query(
+        f"SELECT * FROM {DATABASE}.{name} WHERE time >= fromUnixTimestamp64Milli({lower}) "
+        f"AND time < fromUnixTimestamp64Milli({upper}) "
+        f"AND (_part, _part_offset) IN (SELECT * FROM keys) "
+        f"ORDER BY time DESC LIMIT {limit}",
+        external_data=external,
+    ).result_rows
+
+
+def measure(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    args = parse_args()
+    client = clickhouse_connect.get_client(
+        host=args.host, port=args.port, username=args.user, password=args.password
+    )
+    client.command(f"CREATE DATABASE IF NOT EXISTS {DATABASE}")
+
+    print(
+        f"{'columns':>8} {'width':>6} {'single ms':>10} {'late ms':>10} {'speedup':>8}"
+    )
+    for columns in [int(x) for x in args.columns.split(",")]:
+        for width in [int(x) for x in args.widths.split(",")]:
+            name = f"wide_{columns}_{width}"
+            create_table(client, name, columns, width, args.rows)
+            single = measure(
+                lambda: single_phase(client, name, args.limit), args.repeat
+            )
+            late = measure(lambda: late_phase(client, name, args.limit), args.repeat)
+            print(
+                f"{columns:>8} {width:>6} {single:>10.1f} {late:>10.1f} {single / late:>8.2f}"
+            )
+            if not args.keep:
+                client.command(f"DROP TABLE {DATABASE}.{name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Micro-benchmark of building and rendering result rows: a `Row` per value
+tuple vs the rows of a shared `RowBatch`.
+
+Builds a result of the given size in memory, no database is needed, and
+compares for both representations the time to build the rows from value
+tuples and the time to render them with `as_dict`, as the data endpoint does.
+
+Usage:
+    python benchmarks/rows.py --rows 25000 --columns 10
+
+The output shows the median time of every step and the speedup of the batch.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "base.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from telescope.constants import UTC_ZONE  # noqa: E402
+from telescope.fetchers.models import Row, RowBatch, format_times  # noqa: E402
+from telescope.models import Source  # noqa: E402
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--rows", type=int, default=25000)
+    parser.add_argument("--columns", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    return parser.parse_args()
+
+
+def make_column(type, jsonstring=False):
+    return {
+        "display_name": "",
+        "type": type,
+        "jsonstring": jsonstring,
+        "autocomplete": False,
+        "suggest": False,
+        "group_by": False,
+        "values": [],
+    }
+
+
+def make_result(rows, columns):
+    names = [f"c{idx}" for idx in range(columns)]
+    source = Source(
+        kind="clickhouse",
+        time_column="timestamp",
+        uniq_column="",
+        severity_column="c0",
+        columns={
+            "timestamp": make_column("DateTime64(6)"),
+            **{name: make_column("String") for name in names},
+        },
+    )
+    selected_columns = [source._record_pseudo_id_column, *names, "timestamp"]
+    started = datetime(2024, 1, 1, tzinfo=UTC_ZONE)
+    values = [
+        (
+            f"id-{idx}",
+            *(f"value {idx} of {name}" for name in names),
+            started - timedelta(microseconds=idx * 1500),
+        )
+        for idx in range(rows)
+    ]
+    return source, selected_columns, values
+
+
+def build_plain(source, selected_columns, values):
+    return [
+        Row(
+            source=source,
+            selected_columns=selected_columns,
+            values=item,
+            tz=UTC_ZONE,
+        )
+        for item in values
+    ]
+
+
+def build_batch(source, selected_columns, values):
+    times = format_times([item[-1] for item in values], UTC_ZONE)
+    return RowBatch(source, selected_columns, values, times).rows()
+
+
+def measure(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def measure_memory(func) -> int:
+    tracemalloc.start()
+    result = func()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def main():
+    args = parse_args()
+    source, selected_columns, values = make_result(args.rows, args.columns)
+    source.column_catalog
+
+    results = {}
+    for name, build in (("row", build_plain), ("batch", build_batch)):
+        results[name] = {
+            "build": measure(
+                lambda: build(source, selected_columns, values), args.repeat
+            ),
+            "build+as_dict": measure(
+                lambda: [
+                    row.as_dict() for row in build(source, selected_columns, values)
+                ],
+                args.repeat,
+            ),
+            "memory": measure_memory(lambda: build(source, selected_columns, values)),
+        }
+
+    print(f"rows={args.rows} columns={args.columns} repeat={args.repeat}")
+    print(f"{'step':<16}{'row':>12}{'batch':>12}{'speedup':>10}")
+    for step in ("build", "build+as_dict"):
+        row, batch = results["row"][step], results["batch"][step]
+        print(
+            f"{step:<16}{row * 1000:>10.1f}ms{batch * 1000:>10.1f}ms{row / batch:>10.2f}"
+        )
+    row, batch = results["row"]["memory"], results["batch"]["memory"]
+    print(
+        f"{'memory':<16}{row / 2**20:>10.1f}MB{batch / 2**20:>10.1f}MB{row / batch:>10.2f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Micro-benchmark of severity extraction and body normalization of Docker and
+Kubernetes log lines: the interpreted rules of `telescope.fetchers.utils` vs
+a compiled `SeverityProgram`.
+
+Generates log lines in memory, half of them JSON, no container runtime is
+needed, and for both implementations measures the time to extract the
+severity and normalize the body of every line, as a `Row` does.
+
+Usage:
+    python benchmarks/severity.py --lines 50000
+
+The output shows the median time of both implementations and the speedup.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "base.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from telescope.fetchers import severity  # noqa: E402
+from telescope.fetchers.utils import (  # noqa: E402
+    extract_severity_with_rules,
+    normalize_body_to_dict,
+)
+
+RULES = {
+    "extract": [
+        {"type": "json", "path": ["level"]},
+        {"type": "json", "path": ["log", "severity"]},
+        {"type": "regex", "pattern": r"\[(\w+)\]", "group": 1},
+        {"type": "regex", "pattern": r"level=(\w+)", "group": 1},
+    ],
+    "remap": [
+        {
+            "pattern": "(crit|fatal|panic)",
+            "value": "CRITICAL",
+            "case_insensitive": True,
+        },
+        {"pattern": "err.*", "value": "ERROR", "case_insensitive": True},
+        {"pattern": "warn.*", "value": "WARNING", "case_insensitive": True},
+        {"pattern": "info", "value": "INFO", "case_insensitive": True},
+        {"pattern": "debug", "value": "DEBUG"},
+    ],
+}
+LEVELS = ["info", "debug", "warn", "error", "INFO", "Error"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--lines", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=5)
+    return parser.parse_args()
+
+
+def make_lines(count):
+    lines = []
+    for idx in range(count):
+        level = LEVELS[idx % len(LEVELS)]
+        if idx % 4 == 0:
+            lines.append(f'{{"level": "{level}", "msg": "request {idx} served"}}')
+        elif idx % 4 == 1:
+            lines.append(f'{{"log": {{"severity": "{level}"}}, "msg": "job {idx}"}}')
+        elif idx % 4 == 2:
+            lines.append(f"2024-01-01 10:00:00 [{level}] worker {idx} finished")
+        else:
+            lines.append(f"ts=2024-01-01 level={level} msg=tick {idx}")
+    return lines
+
+
+def run_interpreted(lines):
+    for line in lines:
+        extract_severity_with_rules(line, RULES)
+        normalize_body_to_dict(line)
+
+
+def run_compiled(lines):
+    program = severity.SeverityProgram(RULES)
+    for line in lines:
+        _, parsed = program.extract(line)
+        if parsed is severity.NOT_PARSED:
+            parsed = severity.parse_object(line)
+        if parsed is None:
+            parsed = {"message": line}
+
+
+def measure(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def main():
+    args = parse_args()
+    lines = make_lines(args.lines)
+
+    interpreted = measure(lambda: run_interpreted(lines), args.repeat)
+    compiled = measure(lambda: run_compiled(lines), args.repeat)
+
+    print(f"lines={args.lines} repeat={args.repeat}")
+    print(f"{'interpreted':<16}{interpreted * 1000:>10.1f}ms")
+    print(f"{'compiled':<16}{compiled * 1000:>10.1f}ms")
+    print(f"{'speedup':<16}{interpreted / compiled:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
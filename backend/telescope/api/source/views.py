@@ -1,11 +1,26 @@
+import logging
+from contextlib import ExitStack
+
+from django.http import StreamingHttpResponse
+
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
+from telescope import metrics, streaming
 from telescope.services.source import SourceService
 from telescope.auth.token import TokenAuth
+from telescope.columns import get_required_column_names
+from telescope.fetchers import get_fetchers, admission, budget, export
+from telescope.fetchers.request import DataRequest
+from telescope.rbac import permissions
+from telescope.rbac.manager import RBACManager
+from telescope.serializers.source import SourceExportRequestSerializer
+
+logger = logging.getLogger("telescope.api.source")
 
 source_srv = SourceService()
+rbac_manager = RBACManager()
 
 
 class SourceView(APIView):
@@ -32,3 +47,78 @@ class SourceView(APIView):
 
     def delete(self, request, pk):
         return Response(source_srv.delete(user=request.user, slug=pk))
+
+
+class SourceExportView(APIView):
+    """
+    Streams the selected columns of the matching rows as CSV, NDJSON or
+    Parquet. Exports run in their own admission lane and query budget.
+    """
+
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [TokenAuth]
+
+    def post(self, request, slug):
+        source = rbac_manager.get_source(
+            user=request.user,
+            source_slug=slug,
+            required_permissions=[permissions.Source.USE.value],
+            fetch_connection=True,
+        )
+        serializer = SourceExportRequestSerializer(
+            data=request.data, context={"source": source, "user": request.user}
+        )
+        serializer.is_valid(raise_exception=True)
+        fmt = serializer.validated_data["format"]
+        export_request = DataRequest(
+            source=source,
+            query=serializer.validated_data.get("query", ""),
+            raw_query=serializer.validated_data.get("raw_query", ""),
+            time_from=serializer.validated_data["from"],
+            time_to=serializer.validated_data["to"],
+            limit=serializer.validated_data["limit"],
+            context_columns={},
+            columns=get_required_column_names(
+                source, serializer.validated_data["columns"]
+            ),
+        )
+
+        stack = ExitStack()
+        try:
+            stack.enter_context(admission.admit(source, admission.LANE_EXPORT))
+            chunks = get_fetchers()[source.kind].export_data(export_request, fmt)
+        except admission.AdmissionRejected as err:
+            return Response(
+                {"detail": str(err)},
+                status=429,
+                headers={"Retry-After": str(err.retry_after)},
+            )
+        except (ValueError, NotImplementedError) as err:
+            stack.close()
+            return Response({"detail": str(err)}, status=400)
+        except Exception:
+            stack.close()
+            raise
+
+        metrics.incr(f"exports_{fmt}")
+        response = StreamingHttpResponse(
+            streaming.ClosingIterable(log_export_errors(chunks, source), stack.close),
+            content_type=export.CONTENT_TYPES[fmt],
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="{export.get_filename(source, fmt)}"'
+        )
+        return response
+
+
+def log_export_errors(chunks, source):
+    # the status line is already sent, a failed export ends with a cut body
+    try:
+        yield from chunks
+    except budget.BudgetExceeded as err:
+        logger.warning("export of source %s stopped: %s", source.slug, err)
+        raise
+    except Exception as err:
+        metrics.incr("exports_failed")
+        logger.exception("export of source %s failed: %s", source.slug, err)
+        raise
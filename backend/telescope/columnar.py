@@ -0,0 +1,136 @@
+"""
+Columnar data responses.
+
+Instead of a dict per row, rows are sent as an array of values per column.
+Strings repeated across rows, like severities, hosts or the formatted
+seconds of the time column, are sent once in a dictionary shared by all
+columns and referenced by their position in it.
+
+Every column is either `{"values": [...]}` with the plain values or
+`{"codes": [...]}` with positions in the dictionary, null values stay null.
+"""
+
+from typing import Any, Dict, Iterable, Iterator, List, Sequence, Tuple
+
+from telescope.constants import SOURCE_SEVERITY_COL_NAME
+from telescope.fetchers.models import BatchRow
+
+# a column is dictionary encoded when it has at most this many distinct
+# values per row
+MAX_DISTINCT_RATIO = 0.5
+
+
+class Dictionary:
+    def __init__(self):
+        self.values: List[str] = []
+        self.codes: Dict[str, int] = {}
+
+    def encode(self, values: List[Any]) -> Dict[str, List[Any]]:
+        distinct = set()
+        for value in values:
+            if value is None:
+                continue
+            if type(value) is not str:
+                return {"values": values}
+            distinct.add(value)
+        if not distinct or len(distinct) > len(values) * MAX_DISTINCT_RATIO:
+            return {"values": values}
+
+        codes = []
+        for value in values:
+            if value is None:
+                codes.append(None)
+                continue
+            code = self.codes.get(value)
+            if code is None:
+                code = len(self.values)
+                self.codes[value] = code
+                self.values.append(value)
+            codes.append(code)
+        return {"codes": codes}
+
+
+def encode_columns(
+    length: int,
+    times: List[Dict[str, Any]],
+    severities: List[Any],
+    data: Dict[str, List[Any]],
+) -> Dict[str, Any]:
+    time_keys = list(times[0]) if times else []
+    dictionary = Dictionary()
+    result = {
+        "length": length,
+        "time": {
+            key: dictionary.encode([time[key] for time in times]) for key in time_keys
+        },
+        SOURCE_SEVERITY_COL_NAME: dictionary.encode(severities),
+        "data": {name: dictionary.encode(values) for name, values in data.items()},
+    }
+    result["dictionary"] = dictionary.values
+    return result
+
+
+def encode_rows(rows: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Returns the columnar form of rows as returned by `as_dict` of rows.
+    Data columns missing in some of the rows are null in them.
+    """
+    rows = list(rows)
+    names = {}
+    for row in rows:
+        for name in row["data"]:
+            names.setdefault(name)
+    return encode_columns(
+        len(rows),
+        [row["time"] for row in rows],
+        [row[SOURCE_SEVERITY_COL_NAME] for row in rows],
+        {name: [row["data"].get(name) for row in rows] for name in names},
+    )
+
+
+def iter_chunks(rows: Sequence[Any]) -> Iterator[Tuple[int, tuple]]:
+    """
+    Yields the row count and the columns of runs of rows: consecutive rows of
+    a batch are taken from the batch columns, other rows one by one.
+    """
+    idx = 0
+    while idx < len(rows):
+        row = rows[idx]
+        if not isinstance(row, BatchRow):
+            item = row.as_dict()
+            data = {name: [value] for name, value in item["data"].items()}
+            yield 1, ([item["time"]], [item[SOURCE_SEVERITY_COL_NAME]], data)
+            idx += 1
+            continue
+        stop = idx + 1
+        while (
+            stop < len(rows)
+            and isinstance(rows[stop], BatchRow)
+            and rows[stop].batch is row.batch
+            and rows[stop].position == row.position + stop - idx
+        ):
+            stop += 1
+        count = stop - idx
+        yield count, row.batch.get_columns(row.position, row.position + count)
+        idx = stop
+
+
+def encode_fetched_rows(rows: Sequence[Any]) -> Dict[str, Any]:
+    """
+    Returns the columnar form of the rows returned by fetchers, without
+    rendering rows read into a batch one by one.
+    """
+    length = 0
+    times = []
+    severities = []
+    data: Dict[str, List[Any]] = {}
+    for count, (chunk_times, chunk_severities, chunk_data) in iter_chunks(rows):
+        times.extend(chunk_times)
+        severities.extend(chunk_severities)
+        for name, values in chunk_data.items():
+            data.setdefault(name, [None] * length).extend(values)
+        length += count
+        for values in data.values():
+            if len(values) < length:
+                values.extend([None] * (length - len(values)))
+    return encode_columns(length, times, severities, data)
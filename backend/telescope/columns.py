@@ -54,6 +54,7 @@ class ParsedColumn:
 
 def parse_columns(source: Source, text: str) -> list[ParsedColumn]:
     flyql_columns = parse_columns_flyql(text)
+    source_columns = source._columns
     parsed_columns = []
 
     for flyql_col in flyql_columns:
@@ -62,7 +63,7 @@ def parse_columns(source: Source, text: str) -> list[ParsedColumn]:
         source_column_name = None
         candidate = flyql_col.name
         while candidate:
-            if candidate in source._columns:
+            if candidate in source_columns:
                 source_column_name = candidate
                 break
             # Remove the last dot-separated suffix
@@ -76,7 +77,7 @@ def parse_columns(source: Source, text: str) -> list[ParsedColumn]:
                 message=f"Source have no '{flyql_col.name}' column", errno=100
             )
 
-        source_column = source._columns[source_column_name]
+        source_column = source_columns[source_column_name]
         titled_name = (
             flyql_col.name.title() if ":" not in flyql_col.name else flyql_col.name
         )
@@ -100,3 +101,17 @@ def parse_columns(source: Source, text: str) -> list[ParsedColumn]:
         )
 
     return parsed_columns
+
+
+def get_required_column_names(source: Source, columns: list[ParsedColumn]) -> list[str]:
+    """
+    Returns names of the source columns needed to render `columns`: their root
+    columns plus the time, uniq and severity columns every row relies on.
+    Display modifiers only transform the value of their own column.
+    """
+    names = {column.root_name for column in columns}
+    names.add(source.time_column)
+    for name in (source.uniq_column, source.severity_column):
+        if name:
+            names.add(name)
+    return sorted(name for name in names if name in source._columns)
@@ -24,6 +24,23 @@ class ConfigValidationError(RuntimeError):
 JSONSchemaValidator = jsonschema.Draft7Validator
 
 
+QUERY_BUDGET_SCHEMA = {
+    "type": "object",
+    "properties": {
+        name: {
+            "type": ["integer", "null"],
+            "minimum": 0,
+        }
+        for name in [
+            "max_execution_time",
+            "max_rows_to_read",
+            "max_bytes_to_read",
+            "max_memory_usage",
+            "timeout_before_checking_execution_speed",
+        ]
+    },
+}
+
 SCHEMA = {
     "type": "object",
     "properties": {
@@ -52,6 +69,17 @@ SCHEMA = {
                 "type": "integer",
             },
         },
+        "metrics": {
+            "type": "object",
+            "properties": {
+                "enabled": {
+                    "type": "boolean",
+                },
+                "token": {
+                    "type": "string",
+                },
+            },
+        },
         "django": {
             "type": "object",
             "properties": {
@@ -65,6 +93,226 @@ SCHEMA = {
         "logging": {
             "type": "object",
         },
+        "fetchers": {
+            "type": "object",
+            "properties": {
+                "client_pool": {
+                    "type": "object",
+                    "properties": {
+                        "max_size": {
+                            "type": "integer",
+                            "minimum": 1,
+                        },
+                        "idle_timeout": {
+                            "type": "integer",
+                            "minimum": 1,
+                        },
+                    },
+                },
+                "adaptive_window": {
+                    "type": "object",
+                    "properties": {
+                        "initial_seconds": {
+                            "type": "integer",
+                            "minimum": 1,
+                        },
+                        "factor": {
+                            "type": "integer",
+                            "minimum": 2,
+                        },
+                    },
+                },
+                "graph_cache": {
+                    "type": "object",
+                    "properties": {
+                        "enabled": {
+                            "type": "boolean",
+                        },
+                        "ttl": {
+                            "type": "integer",
+                            "minimum": 1,
+                        },
+                        "closed_after_seconds": {
+                            "type": "integer",
+                            "minimum": 0,
+                        },
+                    },
+                },
+                "graph_groups": {
+                    "type": "object",
+                    "properties": {
+                        "limit": {
+                            "type": "integer",
+                            "minimum": 0,
+                        },
+                    },
+                },
+                "cancellation": {
+                    "type": "object",
+                    "properties": {
+                        "enabled": {
+                            "type": "boolean",
+                        },
+                        "cache": {
+                            "type": "string",
+                        },
+                    },
+                },
+                "sharded_execution": {
+                    "type": "object",
+                    "properties": {
+                        "shard_seconds": {
+                            "type": "integer",
+                            "minimum": 1,
+                        },
+                        "max_shards": {
+                            "type": "integer",
+                            "minimum": 2,
+                        },
+                        "max_workers": {
+                            "type": "integer",
+                            "minimum": 1,
+                        },
+                    },
+                },
+                "autocomplete_cache": {
+                    "type": "object",
+                    "properties": {
+                        "window_seconds": {
+                            "type": "integer",
+                            "minimum": 1,
+                        },
+                        "refresh_interval": {
+                            "type": "integer",
+                            "minimum": 1,
+                        },
+                        "idle_timeout": {
+                            "type": "integer",
+                            "minimum": 1,
+                        },
+                        "max_values_per_source": {
+                            "type": "integer",
+                            "minimum": 1,
+                        },
+                    },
+                },
+                "query_budgets": {
+                    "type": "object",
+                    "properties": {
+                        "data": QUERY_BUDGET_SCHEMA,
+                        "graph": QUERY_BUDGET_SCHEMA,
+                        "autocomplete": QUERY_BUDGET_SCHEMA,
+                        "export": QUERY_BUDGET_SCHEMA,
+                    },
+                },
+                "compiled_queries": {
+                    "type": "object",
+                    "properties": {
+                        "max_entries": {
+                            "type": "integer",
+                            "minimum": 1,
+                        },
+                    },
+                },
+                "cursor": {
+                    "type": "object",
+                    "properties": {
+                        "max_result_sets": {
+                            "type": "integer",
+                            "minimum": 1,
+                        },
+                        "result_ttl": {
+                            "type": "integer",
+                            "minimum": 1,
+                        },
+                    },
+                },
+                "export": {
+                    "type": "object",
+                    "properties": {
+                        "max_rows": {
+                            "type": "integer",
+                            "minimum": 1,
+                        },
+                        "chunk_size": {
+                            "type": "integer",
+                            "minimum": 1,
+                        },
+                        "batch_rows": {
+                            "type": "integer",
+                            "minimum": 1,
+                        },
+                    },
+                },
+                "admission": {
+                    "type": "object",
+                    "properties": {
+                        "enabled": {
+                            "type": "boolean",
+                        },
+                        "lock_dir": {
+                            "type": "string",
+                        },
+                        "wait_timeout": {
+                            "type": "number",
+                            "minimum": 0,
+                        },
+                        "retry_after": {
+                            "type": "integer",
+                            "minimum": 1,
+                        },
+                        "expensive_range_seconds": {
+                            "type": "integer",
+                            "minimum": 1,
+                        },
+                        "lanes": {
+                            "type": "object",
+                            "properties": {
+                                "cheap": {
+                                    "type": "object",
+                                    "properties": {
+                                        "per_source": {
+                                            "type": "integer",
+                                            "minimum": 1,
+                                        },
+                                        "per_connection": {
+                                            "type": "integer",
+                                            "minimum": 1,
+                                        },
+                                    },
+                                },
+                                "expensive": {
+                                    "type": "object",
+                                    "properties": {
+                                        "per_source": {
+                                            "type": "integer",
+                                            "minimum": 1,
+                                        },
+                                        "per_connection": {
+                                            "type": "integer",
+                                            "minimum": 1,
+                                        },
+                                    },
+                                },
+                                "export": {
+                                    "type": "object",
+                                    "properties": {
+                                        "per_source": {
+                                            "type": "integer",
+                                            "minimum": 1,
+                                        },
+                                        "per_connection": {
+                                            "type": "integer",
+                                            "minimum": 1,
+                                        },
+                                    },
+                                },
+                            },
+                        },
+                    },
+                },
+            },
+        },
         "frontend": {
             "type": "object",
             "properties": {
@@ -181,6 +429,103 @@ def get_default_config():
         "limits": {
             "max_saved_views_per_user": 0,
         },
+        "metrics": {
+            # the /metrics endpoint serves internal counters, off unless enabled
+            "enabled": False,
+            # when set, requests need an `Authorization: Bearer <token>` header
+            "token": "",
+        },
+        "fetchers": {
+            "client_pool": {
+                "max_size": 32,
+                "idle_timeout": 300,
+            },
+            "adaptive_window": {
+                "initial_seconds": 300,
+                "factor": 4,
+            },
+            "graph_cache": {
+                "enabled": False,
+                "ttl": 3600,
+                "closed_after_seconds": 120,
+            },
+            "graph_groups": {
+                # group by values shown as separate series, 0 means all of them
+                "limit": 0,
+            },
+            "cancellation": {
+                # every data and graph request of the UI registers its query in
+                # the cache and running queries poll it, use a cache shared by
+                # all workers and cheaper than the default database cache
+                "enabled": False,
+                # alias of a django cache in CACHES
+                "cache": "default",
+            },
+            "sharded_execution": {
+                # shards are aligned to multiples of it, days match daily partitions
+                "shard_seconds": 86400,
+                # longer ranges get shards of several multiples
+                "max_shards": 32,
+                # shards of a query running at the same time
+                "max_workers": 4,
+            },
+            "autocomplete_cache": {
+                "window_seconds": 86400,
+                "refresh_interval": 300,
+                "idle_timeout": 3600,
+                "max_values_per_source": 100000,
+            },
+            "query_budgets": {
+                # limits of max_execution_time, max_rows_to_read,
+                # max_bytes_to_read, max_memory_usage and
+                # timeout_before_checking_execution_speed per request type,
+                # none by default, null means no limit
+                "data": {},
+                "graph": {},
+                "autocomplete": {},
+                "export": {},
+            },
+            "compiled_queries": {
+                # parsed flyql queries and their SQL kept per process
+                "max_entries": 1024,
+            },
+            "cursor": {
+                # complete results of in-memory fetchers kept per process
+                # for the next pages
+                "max_result_sets": 16,
+                "result_ttl": 600,
+            },
+            "export": {
+                "max_rows": 1000000,
+                # bytes read from ClickHouse per chunk of the response
+                "chunk_size": 65536,
+                # rows fetched per batch from other databases
+                "batch_rows": 5000,
+            },
+            "admission": {
+                # limits hold per host, see telescope.fetchers.admission
+                "enabled": False,
+                # a local directory, empty means one in the system temp dir
+                "lock_dir": "",
+                "wait_timeout": 10,
+                "retry_after": 5,
+                "expensive_range_seconds": 86400,
+                "lanes": {
+                    "cheap": {
+                        "per_source": 8,
+                        "per_connection": 16,
+                    },
+                    "expensive": {
+                        "per_source": 2,
+                        "per_connection": 4,
+                    },
+                    "export": {
+                        "per_source": 1,
+                        "per_connection": 2,
+                    },
+                },
+            },
+        },
         "auth": {
             "providers": {
                 "github": {
@@ -21,6 +21,7 @@ LIMIT = [
 SOURCE_KIND_CLICKHOUSE = "clickhouse"
 SOURCE_KIND_DOCKER = "docker"
 SOURCE_KIND_KUBERNETES = "kubernetes"
+SOURCE_KIND_STARROCKS = "starrocks"
 
 SUPPORTED_SOURCE_KINDS = {
     SOURCE_KIND_CLICKHOUSE,
@@ -35,25 +36,38 @@ SOURCE_QUERY_MODE_COMBINED = "combined"
 SOURCE_CAPABILITY_RAW_QUERY = "raw_query"
 SOURCE_CAPABILITY_SEVERITY_RULES = "severity_rules"
 SOURCE_CAPABILITY_NORMALIZE_BODY = "normalize_body"
+SOURCE_CAPABILITY_SQL_SEVERITY_RULES = "sql_severity_rules"
 SOURCE_CAPABILITY_QUERY_MODE = "query_mode"
+CLICKHOUSE_FETCH_MODE_COLUMNAR = "columnar"
+CLICKHOUSE_FETCH_MODE_ROWS = "rows"
 
 SOURCE_CAPABILITIES = {
     SOURCE_KIND_CLICKHOUSE: {
         SOURCE_CAPABILITY_RAW_QUERY: True,
         SOURCE_CAPABILITY_SEVERITY_RULES: False,
+        SOURCE_CAPABILITY_SQL_SEVERITY_RULES: True,
         SOURCE_CAPABILITY_NORMALIZE_BODY: False,
         SOURCE_CAPABILITY_QUERY_MODE: "separate",
     },
     SOURCE_KIND_DOCKER: {
         SOURCE_CAPABILITY_RAW_QUERY: False,
         SOURCE_CAPABILITY_SEVERITY_RULES: True,
+        SOURCE_CAPABILITY_SQL_SEVERITY_RULES: False,
         SOURCE_CAPABILITY_NORMALIZE_BODY: True,
         SOURCE_CAPABILITY_QUERY_MODE: "combined",
     },
     SOURCE_KIND_KUBERNETES: {
         SOURCE_CAPABILITY_RAW_QUERY: False,
         SOURCE_CAPABILITY_SEVERITY_RULES: True,
+        SOURCE_CAPABILITY_SQL_SEVERITY_RULES: False,
         SOURCE_CAPABILITY_NORMALIZE_BODY: True,
         SOURCE_CAPABILITY_QUERY_MODE: "combined",
     },
+    SOURCE_KIND_STARROCKS: {
+        SOURCE_CAPABILITY_RAW_QUERY: True,
+        SOURCE_CAPABILITY_SEVERITY_RULES: False,
+        SOURCE_CAPABILITY_SQL_SEVERITY_RULES: True,
+        SOURCE_CAPABILITY_NORMALIZE_BODY: False,
+        SOURCE_CAPABILITY_QUERY_MODE: "separate",
+    },
 }
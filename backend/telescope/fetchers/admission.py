@@ -0,0 +1,169 @@
+"""
+Admission control for source queries.
+
+Every query takes a slot of its source and a slot of the source connection
+before it is sent. Slots are per lane, cheap requests (autocomplete, short
+ranges), expensive ones (wide ranges) and exports are limited separately, so
+a few heavy graphs or exports can not starve everything else. A request waits
+for its slots up to `wait_timeout` seconds and is rejected with a retry hint
+after that.
+
+Slots are exclusive `flock` locks on files of a shared directory, which makes
+the limits hold across all gunicorn workers of the host, and a slot of a
+crashed worker is released by the kernel.
+
+The limits are per host, not per cluster: with several hosts serving the same
+sources, a source takes up to the configured limits on each of them, so the
+limits have to be divided by the number of hosts. The lock directory must be
+local, `flock` is not reliable on network filesystems. Admission control is
+off unless enabled.
+"""
+
+import os
+import time
+import fcntl
+import random
+import logging
+import tempfile
+from contextlib import contextmanager
+from typing import List, Optional
+
+from django.conf import settings
+
+from telescope import metrics
+
+logger = logging.getLogger("telescope.fetchers.admission")
+
+LANE_CHEAP = "cheap"
+LANE_EXPENSIVE = "expensive"
+LANE_EXPORT = "export"
+
+POLL_INTERVAL_MIN = 0.02
+POLL_INTERVAL_MAX = 0.5
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, lane: str, retry_after: int):
+        self.lane = lane
+        self.retry_after = retry_after
+        super().__init__(
+            f"source is busy with other {lane} queries, retry in {retry_after} seconds"
+        )
+
+
+class SlotSemaphore:
+    """Counting semaphore shared by processes: one lock file per slot."""
+
+    def __init__(self, path_prefix: str, size: int):
+        self.path_prefix = path_prefix
+        self.size = size
+
+    def try_acquire(self) -> Optional[int]:
+        """Returns the descriptor holding a free slot, None when all are taken."""
+        # a random starting slot spreads waiters over the lock files
+        offset = random.randrange(self.size)
+        for idx in range(self.size):
+            path = f"{self.path_prefix}.{(offset + idx) % self.size}.lock"
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                continue
+            return fd
+        return None
+
+    @staticmethod
+    def release(fd: int):
+        try:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+
+
+def get_config() -> dict:
+    return settings.CONFIG["fetchers"]["admission"]
+
+
+def get_lock_dir() -> str:
+    path = get_config()["lock_dir"] or os.path.join(
+        tempfile.gettempdir(), "telescope-admission"
+    )
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    return path
+
+
+def get_lane(time_from: int, time_to: int) -> str:
+    if (time_to - time_from) / 1000 > get_config()["expensive_range_seconds"]:
+        return LANE_EXPENSIVE
+    return LANE_CHEAP
+
+
+def get_semaphores(source, lane: str) -> List[SlotSemaphore]:
+    limits = get_config()["lanes"][lane]
+    lock_dir = get_lock_dir()
+    semaphores = [
+        SlotSemaphore(
+            os.path.join(lock_dir, f"source-{source.id}-{lane}"),
+            limits["per_source"],
+        )
+    ]
+    if source.conn is not None:
+        semaphores.append(
+            SlotSemaphore(
+                os.path.join(lock_dir, f"connection-{source.conn.id}-{lane}"),
+                limits["per_connection"],
+            )
+        )
+    return semaphores
+
+
+@contextmanager
+def admit(source, lane: str, cancel_token=None):
+    """
+    Holds a source slot and a connection slot of the lane while the block runs.
+
+    Raises AdmissionRejected when the slots are not free within `wait_timeout`,
+    or QueryCancelled when the request is cancelled while waiting.
+    """
+    config = get_config()
+    if not config["enabled"]:
+        yield
+        return
+
+    started = time.monotonic()
+    deadline = started + config["wait_timeout"]
+    held = []
+    metrics.add_gauge(f"admission_queue_depth_{lane}", 1)
+    try:
+        # the narrower source limit goes first, so a request waiting for
+        # its source does not hold a connection slot others could use
+        for semaphore in get_semaphores(source, lane):
+            interval = POLL_INTERVAL_MIN
+            while True:
+                fd = semaphore.try_acquire()
+                if fd is not None:
+                    held.append(fd)
+                    break
+                if cancel_token is not None:
+                    cancel_token.check()
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    metrics.incr(f"admission_rejected_{lane}")
+                    raise AdmissionRejected(lane, config["retry_after"])
+                time.sleep(min(interval, remaining))
+                interval = min(interval * 2, POLL_INTERVAL_MAX)
+    except BaseException:
+        for fd in held:
+            SlotSemaphore.release(fd)
+        raise
+    finally:
+        metrics.add_gauge(f"admission_queue_depth_{lane}", -1)
+
+    metrics.incr(f"admission_admitted_{lane}")
+    metrics.observe(f"admission_wait_seconds_{lane}", time.monotonic() - started)
+    try:
+        yield
+    finally:
+        for fd in held:
+            SlotSemaphore.release(fd)
@@ -0,0 +1,205 @@
+"""
+In-memory autocomplete value cache.
+
+For sources with `autocomplete_cache` enabled, the most frequent values of every
+autocomplete column over a recent time window are kept in a sorted index, so
+keystrokes are answered from memory instead of scanning the column. Indexes are
+built and refreshed by a background thread, every worker process keeps its own.
+
+Source changes are signalled to the process saving them only, so entries
+remember the fingerprint of the source they load from, and are built again
+when a lookup comes with a source whose table, settings, columns or
+connection changed.
+"""
+
+import json
+import time
+import hashlib
+import logging
+from threading import Event, Lock, Thread
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+from django.conf import settings
+
+from telescope import metrics
+from telescope.fetchers.response import AutocompleteResponse
+
+logger = logging.getLogger("telescope.fetchers.autocomplete_cache")
+
+AUTOCOMPLETE_LIMIT = 500
+
+Loader = Callable[[int, int, int], List[str]]
+
+
+class ValueIndex:
+    def __init__(self, values: List[str], incomplete: bool, time_from: int):
+        self.values = sorted(set(values))
+        self.incomplete = incomplete
+        self.time_from = time_from
+
+    def search(
+        self, value: str, limit: int = AUTOCOMPLETE_LIMIT
+    ) -> Tuple[List[str], bool]:
+        """
+        Returns sorted values containing `value`, like `LIKE '%value%'`.
+        """
+        if not value:
+            items = self.values[:limit]
+        else:
+            items = []
+            for item in self.values:
+                if value in item:
+                    items.append(item)
+                    if len(items) >= limit:
+                        break
+        return items, self.incomplete or len(items) >= limit
+
+
+def get_source_fingerprint(source) -> str:
+    """Identifies what the values of the source are loaded with."""
+    conn_data = source.conn.data if source.conn else None
+    payload = json.dumps([source.data, conn_data], sort_keys=True, default=str)
+    return hashlib.sha1(
+        f"{payload}:{source.column_catalog.fingerprint}".encode()
+    ).hexdigest()
+
+
+class CacheEntry:
+    def __init__(self, loader: Loader, limit: int, fingerprint: str):
+        self.loader = loader
+        self.limit = limit
+        self.fingerprint = fingerprint
+        self.index: Optional[ValueIndex] = None
+        self.built_at: Optional[float] = None
+        self.last_used = time.monotonic()
+
+
+class AutocompleteCache:
+    def __init__(self):
+        self._entries: Dict[Tuple[Hashable, str], CacheEntry] = {}
+        self._lock = Lock()
+        self._wakeup = Event()
+        self._thread: Optional[Thread] = None
+
+    @property
+    def config(self) -> dict:
+        return settings.CONFIG["fetchers"]["autocomplete_cache"]
+
+    def search(
+        self,
+        source,
+        column: str,
+        time_from: int,
+        value: str,
+        loader: Loader,
+    ) -> Optional[AutocompleteResponse]:
+        """
+        Returns the cached response, or None when the caller should query the
+        source directly (cache disabled, index not built yet or the requested
+        range starts before the cached window).
+        """
+        if not source.data.get("autocomplete_cache"):
+            return None
+        source_column = source._columns.get(column)
+        if source_column is None or not source_column.autocomplete:
+            return None
+
+        key = (source.id, column)
+        fingerprint = get_source_fingerprint(source)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.fingerprint != fingerprint:
+                # the loader of a changed source reads its new table or connection
+                entry = CacheEntry(loader, self.get_column_limit(source), fingerprint)
+                self._entries[key] = entry
+                self._start()
+                self._wakeup.set()
+            entry.last_used = time.monotonic()
+            index = entry.index
+
+        if index is None or time_from < index.time_from:
+            metrics.incr("autocomplete_cache_misses")
+            return None
+        metrics.incr("autocomplete_cache_hits")
+        items, incomplete = index.search(value)
+        return AutocompleteResponse(items=items, incomplete=incomplete)
+
+    def get_column_limit(self, source) -> int:
+        columns = sum(1 for column in source._columns.values() if column.autocomplete)
+        return max(1, self.config["max_values_per_source"] // max(columns, 1))
+
+    def invalidate(self, source_id: Hashable):
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == source_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = Thread(
+                target=self._refresh_loop,
+                name="autocomplete-cache-refresh",
+                daemon=True,
+            )
+            self._thread.start()
+
+    def _refresh_loop(self):
+        while True:
+            self._wakeup.wait(timeout=1)
+            self._wakeup.clear()
+            try:
+                self.refresh()
+            except Exception as err:
+                logger.exception("autocomplete cache refresh failed: %s", err)
+
+    def refresh(self):
+        """Builds missing indexes, refreshes stale ones and drops unused ones."""
+        config = self.config
+        now = time.monotonic()
+        with self._lock:
+            for key in [
+                key
+                for key, entry in self._entries.items()
+                if now - entry.last_used > config["idle_timeout"]
+            ]:
+                del self._entries[key]
+            due = [
+                (key, entry)
+                for key, entry in self._entries.items()
+                if entry.built_at is None
+                or now - entry.built_at > config["refresh_interval"]
+            ]
+
+        for key, entry in due:
+            time_to = int(time.time() * 1000)
+            time_from = time_to - config["window_seconds"] * 1000
+            entry.built_at = time.monotonic()
+            try:
+                values = entry.loader(time_from, time_to, entry.limit)
+            except Exception as err:
+                logger.exception(
+                    "failed to load autocomplete values for %s: %s", key, err
+                )
+                continue
+            entry.index = ValueIndex(
+                values, incomplete=len(values) >= entry.limit, time_from=time_from
+            )
+            metrics.incr("autocomplete_cache_refreshes")
+
+
+_cache = AutocompleteCache()
+
+
+def search(source, column, time_from, value, loader) -> Optional[AutocompleteResponse]:
+    return _cache.search(source, column, time_from, value, loader)
+
+
+def invalidate(source_id: Hashable):
+    _cache.invalidate(source_id)
+
+
+def clear():
+    _cache.clear()
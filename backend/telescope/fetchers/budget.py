@@ -0,0 +1,138 @@
+"""
+Query budgets.
+
+Data, graph, autocomplete and export queries can run with limits on execution
+time, rows and bytes read and memory, configured per request type in
+`fetchers.query_budgets` and overridable per source in `source.data["budgets"]`.
+No limits are set by default.
+Budgets become ClickHouse query settings and StarRocks `SET_VAR` hints, errors
+raised by the database when a budget is hit are turned into `BudgetExceeded`
+which views report as a regular failure instead of an unhandled error.
+"""
+
+import re
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from telescope import metrics
+
+REQUEST_TYPE_DATA = "data"
+REQUEST_TYPE_GRAPH = "graph"
+REQUEST_TYPE_AUTOCOMPLETE = "autocomplete"
+REQUEST_TYPE_EXPORT = "export"
+
+BUDGET_SETTINGS = [
+    "max_execution_time",
+    "max_rows_to_read",
+    "max_bytes_to_read",
+    "max_memory_usage",
+    "timeout_before_checking_execution_speed",
+]
+
+CLICKHOUSE_ERROR_CODES = {
+    158: "max_rows_to_read",  # TOO_MANY_ROWS
+    159: "max_execution_time",  # TIMEOUT_EXCEEDED
+    160: "max_execution_time",  # TOO_SLOW, estimated time exceeds the budget
+    241: "max_memory_usage",  # MEMORY_LIMIT_EXCEEDED
+    307: "max_bytes_to_read",  # TOO_MANY_BYTES
+}
+CLICKHOUSE_ERROR_CODE_RE = re.compile(r"\bCode: (\d+)\b")
+
+# StarRocks has no session variables limiting rows or bytes read
+STARROCKS_VARIABLES = {
+    "max_execution_time": "query_timeout",
+    "max_memory_usage": "query_mem_limit",
+}
+STARROCKS_ERROR_PATTERNS = [
+    (
+        re.compile(
+            r"query_timeout|query timeout|reached its timeout|exceeded time limit",
+            re.IGNORECASE,
+        ),
+        "max_execution_time",
+    ),
+    (re.compile(r"mem.*exceed|exceed.*mem", re.IGNORECASE), "max_memory_usage"),
+]
+
+SETTING_DESCRIPTIONS = {
+    "max_execution_time": "execution time",
+    "max_rows_to_read": "rows to read",
+    "max_bytes_to_read": "bytes to read",
+    "max_memory_usage": "memory",
+}
+
+
+class BudgetExceeded(Exception):
+    def __init__(self, request_type: str, setting: str, value: Optional[int]):
+        self.request_type = request_type
+        self.setting = setting
+        self.value = value
+        limit = f" ({setting}={value})" if value else ""
+        super().__init__(
+            f"{request_type} query exceeded its {SETTING_DESCRIPTIONS[setting]} "
+            f"budget{limit}, narrow the time range or make the query more selective"
+        )
+
+
+def get_budget(source, request_type: str) -> Dict[str, int]:
+    budget = dict(settings.CONFIG["fetchers"]["query_budgets"].get(request_type, {}))
+    budget.update((source.data.get("budgets") or {}).get(request_type) or {})
+    return {
+        name: value
+        for name, value in budget.items()
+        if name in BUDGET_SETTINGS and value is not None
+    }
+
+
+def get_starrocks_variables(budget: Dict[str, int]) -> List[str]:
+    # zero means unlimited in ClickHouse but is not a valid StarRocks value
+    return [
+        f"{STARROCKS_VARIABLES[name]}={int(value)}"
+        for name, value in budget.items()
+        if name in STARROCKS_VARIABLES and value
+    ]
+
+
+def get_exceeded_setting(err: Exception, dialect: str) -> Optional[str]:
+    message = str(err)
+    if dialect == "clickhouse":
+        match = CLICKHOUSE_ERROR_CODE_RE.search(message)
+        if match:
+            return CLICKHOUSE_ERROR_CODES.get(int(match.group(1)))
+        return None
+    for pattern, setting in STARROCKS_ERROR_PATTERNS:
+        if pattern.search(message):
+            return setting
+    return None
+
+
+@contextmanager
+def enforce(source, request_type: str, dialect: str):
+    """Turns database errors caused by the budget of the request into BudgetExceeded."""
+    try:
+        yield
+    except BudgetExceeded:
+        raise
+    except Exception as err:
+        setting = get_exceeded_setting(err, dialect)
+        if setting is None:
+            raise
+        metrics.incr(f"query_budget_exceeded_{request_type}")
+        value = get_budget(source, request_type).get(setting)
+        raise BudgetExceeded(request_type, setting, value) from err
+
+
+def get_partial_message(err: BudgetExceeded, rows_count: int) -> str:
+    return f"{err}, showing the {rows_count} latest rows read before the limit"
+
+
+def get_within_budget(
+    func: Callable, *args
+) -> Tuple[Optional[Any], Optional[BudgetExceeded]]:
+    """Returns the result of the call, or the error when it exceeded its budget."""
+    try:
+        return func(*args), None
+    except BudgetExceeded as err:
+        return None, err
@@ -0,0 +1,184 @@
+"""
+Cancellation of abandoned queries.
+
+Data and graph requests of the UI carry the id of the browser tab they come
+from. Every query issued for such a request is tagged with a query id derived
+from the user session, the tab and the request kind. When a newer request of
+the same kind comes from the same tab, or the tab reports that it abandoned its
+requests, the previous query is killed on the database and in-process fan-outs
+(Kubernetes and Docker log reads) stop early.
+
+Active queries are tracked in a django cache, so a request served by one
+worker can cancel a query running in another one. Every request registers its
+query there and running queries poll it, so cancellation is off unless
+enabled and should use a cache shared by the workers which is cheaper than the
+default database cache, e.g. memcached or redis.
+"""
+
+import time
+import uuid
+import hashlib
+import logging
+from threading import Event, Lock
+from typing import Dict, List
+
+from django.conf import settings
+from django.core.cache import caches
+
+from telescope import metrics
+
+logger = logging.getLogger("telescope.fetchers.cancellation")
+
+QUERY_KIND_DATA = "data"
+QUERY_KIND_GRAPH = "graph"
+QUERY_KIND_DATA_AND_GRAPH = "dataAndGraph"
+QUERY_KINDS = [QUERY_KIND_DATA, QUERY_KIND_GRAPH, QUERY_KIND_DATA_AND_GRAPH]
+
+# active query entries outlive any sane query duration
+ACTIVE_TTL = 3600
+CHECK_INTERVAL = 0.5
+
+
+class QueryCancelled(Exception):
+    pass
+
+
+def get_config() -> dict:
+    return settings.CONFIG["fetchers"]["cancellation"]
+
+
+def is_enabled() -> bool:
+    return get_config()["enabled"]
+
+
+def get_cache():
+    return caches[get_config()["cache"]]
+
+
+class CancelToken:
+    """
+    Identifies the queries of a single request and tells whether they were
+    cancelled. Database queries use `get_query_id`, long running in-process
+    work polls `is_cancelled` or calls `check` between steps.
+    """
+
+    def __init__(self, query_id: str, scope: str, kind: str, source_id=None):
+        self.query_id = query_id
+        self.scope = scope
+        self.kind = kind
+        self.source_id = source_id
+        self._cancelled = Event()
+        self._checked_at = 0.0
+
+    def get_query_id(self, part: str) -> str:
+        # parts of a request may run concurrently and ClickHouse
+        # rejects a query id which is already running
+        return f"{self.query_id}-{part}"
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def is_cancelled(self) -> bool:
+        if self._cancelled.is_set():
+            return True
+        now = time.monotonic()
+        if now - self._checked_at >= CHECK_INTERVAL:
+            self._checked_at = now
+            if get_cache().get(get_cancelled_key(self.query_id)):
+                self._cancelled.set()
+        return self._cancelled.is_set()
+
+    def check(self):
+        if self.is_cancelled():
+            raise QueryCancelled(f"query {self.query_id} has been cancelled")
+
+
+_tokens: Dict[str, CancelToken] = {}
+_tokens_lock = Lock()
+
+
+def make_scope(session_key: str, tab_id: str) -> str:
+    return hashlib.sha256(f"{session_key}:{tab_id}".encode()).hexdigest()[:16]
+
+
+def get_active_key(scope: str, kind: str) -> str:
+    return f"query:active:{scope}:{kind}"
+
+
+def get_cancelled_key(query_id: str) -> str:
+    return f"query:cancelled:{query_id}"
+
+
+def begin(scope: str, kind: str, source_id=None) -> CancelToken:
+    """
+    Registers a new query of the tab, cancelling the previous one of the same kind.
+    """
+    token = CancelToken(
+        query_id=f"telescope-{scope}-{kind}-{uuid.uuid4().hex[:12]}",
+        scope=scope,
+        kind=kind,
+        source_id=source_id,
+    )
+    cache = get_cache()
+    key = get_active_key(scope, kind)
+    previous = cache.get(key)
+    cache.set(key, {"query_id": token.query_id, "source_id": source_id}, ACTIVE_TTL)
+    with _tokens_lock:
+        _tokens[token.query_id] = token
+    if previous:
+        cancel_query(previous["query_id"], previous["source_id"], reason="superseded")
+    return token
+
+
+def finish(token: CancelToken):
+    with _tokens_lock:
+        _tokens.pop(token.query_id, None)
+    cache = get_cache()
+    key = get_active_key(token.scope, token.kind)
+    active = cache.get(key)
+    if active and active["query_id"] == token.query_id:
+        cache.delete(key)
+
+
+def cancel_scope(scope: str, source_id=None) -> List[str]:
+    """Cancels active queries of the tab (of the source if given), returns their ids."""
+    cache = get_cache()
+    cancelled = []
+    for kind in QUERY_KINDS:
+        key = get_active_key(scope, kind)
+        active = cache.get(key)
+        if not active:
+            continue
+        if source_id is not None and active["source_id"] != source_id:
+            continue
+        cache.delete(key)
+        cancel_query(active["query_id"], active["source_id"], reason="abandoned")
+        cancelled.append(active["query_id"])
+    return cancelled
+
+
+def cancel_query(query_id: str, source_id=None, reason: str = "abandoned"):
+    get_cache().set(get_cancelled_key(query_id), True, ACTIVE_TTL)
+    with _tokens_lock:
+        token = _tokens.get(query_id)
+    if token is not None:
+        token.cancel()
+    metrics.incr("queries_cancelled")
+    metrics.incr(f"queries_cancelled_{reason}")
+    if source_id is not None:
+        kill_query(source_id, query_id)
+
+
+def kill_query(source_id, query_id: str):
+    # imported here, fetchers import this module
+    from telescope.models import Source
+    from telescope.fetchers import get_fetchers
+
+    try:
+        source = Source.objects.select_related("conn").get(id=source_id)
+        if source.conn is None:
+            return
+        if get_fetchers()[source.kind].cancel_query(source, query_id):
+            metrics.incr("queries_killed")
+    except Exception as err:
+        logger.warning("failed to kill query %s: %s", query_id, err)
@@ -1,16 +1,26 @@
 import os
+import re
 import logging
 import tempfile
-from typing import Dict, Optional
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
 import zoneinfo
 
 import clickhouse_connect
+from clickhouse_connect.driver.external import ExternalData
 
-from flyql.core.parser import parse, ParserError
+from django.conf import settings
+
+from flyql.core.parser import ParserError
 from flyql.core.exceptions import FlyqlError
 from flyql.generators.clickhouse.generator import to_sql, Column
 
-from telescope.constants import UTC_ZONE
+from telescope.constants import (
+    UTC_ZONE,
+    CLICKHOUSE_FETCH_MODE_ROWS,
+)
 
 from telescope.models import SourceColumn
 
@@ -18,14 +28,44 @@ from telescope.fetchers.request import (
     AutocompleteRequest,
     DataRequest,
     GraphDataRequest,
+    DataAndGraphDataRequest,
 )
 from telescope.fetchers.response import (
     AutocompleteResponse,
     DataResponse,
     GraphDataResponse,
+    DataAndGraphDataResponse,
 )
 from telescope.fetchers.fetcher import BaseFetcher
-from telescope.fetchers.models import Row
+from telescope.fetchers.models import (
+    BlockBatch,
+    Row,
+    build_rows,
+    format_times,
+    transforms_rows,
+)
+from telescope.fetchers.pool import ClientPool
+from telescope.fetchers.stats import QueryStats
+from telescope.fetchers import (
+    autocomplete_cache,
+    budget,
+    compiled_queries,
+    export,
+    graph_cache,
+    pagination,
+    severity,
+    sharding,
+)
+from telescope.fetchers.graph import (
+    GraphQuery,
+    build_graph_response,
+    build_top_groups_sql,
+    fold_groups,
+    get_graph_buckets,
+    get_group_by_columns,
+    get_graph_interval,
+)
+from telescope import metrics
 
 from telescope.utils import convert_to_base_ch, get_telescope_column
 
@@ -65,33 +105,121 @@ def build_time_clause(time_column, date_column, time_from, time_to):
     return f"{date_clause}`{time_column}` BETWEEN fromUnixTimestamp64Milli({time_from}) and fromUnixTimestamp64Milli({time_to})"
 
 
+def build_window_time_clause(time_column, date_column, time_from, time_to):
+    """Same as build_time_clause, but the upper bound is excluded."""
+    date_clause = ""
+    if date_column:
+        date_clause = f"{date_column} BETWEEN toDate(fromUnixTimestamp64Milli({time_from})) and toDate(fromUnixTimestamp64Milli({time_to})) AND "
+    return f"{date_clause}`{time_column}` >= fromUnixTimestamp64Milli({time_from}) and `{time_column}` < fromUnixTimestamp64Milli({time_to})"
+
+
+def get_window_time_clause(source, time_from, time_to, window=None):
+    """
+    Returns the time clause for a (lower, upper) window of the requested range.
+
+    The upper bound of a window is excluded, unless the window ends at the
+    end of the requested range.
+    """
+    if window is None or window[1] == time_to:
+        return build_time_clause(
+            source.time_column,
+            source.date_column,
+            window[0] if window else time_from,
+            time_to,
+        )
+    return build_window_time_clause(
+        source.time_column,
+        source.date_column,
+        window[0],
+        window[1],
+    )
+
+
+def get_client_kwargs(data: dict) -> dict:
+    client_kwargs = {
+        "host": data["host"],
+        "port": data["port"],
+        "user": data["user"],
+        "password": data["password"],
+        "secure": data["ssl"],
+        "verify": data["verify"],
+    }
+    for name in OPTIONAL_SSL_PARAMS:
+        if data.get(name) and data[name] != "":
+            client_kwargs[name] = data[name]
+    return client_kwargs
+
+
+def create_pooled_client(data: dict, cert_files: Dict[str, str]):
+    # pooled clients are shared between threads, so they must not be bound
+    # to a single ClickHouse session
+    return clickhouse_connect.get_client(
+        apply_server_timezone=False,
+        autogenerate_session_id=False,
+        **get_client_kwargs(data),
+        **cert_files,
+    )
+
+
+_client_pool: Optional[ClientPool] = None
+_client_pool_lock = Lock()
+
+
+def get_client_pool() -> ClientPool:
+    global _client_pool
+    if _client_pool is None:
+        with _client_pool_lock:
+            if _client_pool is None:
+                config = settings.CONFIG["fetchers"]["client_pool"]
+                _client_pool = ClientPool(
+                    name="clickhouse",
+                    factory=create_pooled_client,
+                    cert_params={name: name for name in SSL_CERTS_PARAMS},
+                    max_size=config["max_size"],
+                    idle_timeout=config["idle_timeout"],
+                )
+    return _client_pool
+
+
+def invalidate_connection(conn_id: int):
+    if _client_pool is not None:
+        _client_pool.invalidate(conn_id)
+
+
 class ClickhouseConnect:
-    def __init__(self, data: dict):
+    """
+    Gives access to a ClickHouse client for the given connection data.
+
+    When `conn_id` is known the client is checked out of the per-process pool
+    until the context exits and stays alive after it. Without it (e.g. testing connection
+    settings which are not saved yet) a one-off client is created.
+    """
+
+    def __init__(self, data: dict, conn_id: Optional[int] = None):
         self.data = data
+        self.conn_id = conn_id
         self.temp_dir = None
         self._client = None
+        self._pooled = None
         self.client_kwargs = {}
 
     @property
     def client(self):
         if self._client is None:
-            self._client = clickhouse_connect.get_client(
-                apply_server_timezone=False, **self.client_kwargs
-            )
+            if self.conn_id is not None:
+                self._pooled = get_client_pool().acquire(self.conn_id, self.data)
+                self._client = self._pooled.client
+            else:
+                self._client = clickhouse_connect.get_client(
+                    apply_server_timezone=False, **self.client_kwargs
+                )
         return self._client
 
     def __enter__(self, *args, **kwargs):
-        client_kwargs = {
-            "host": self.data["host"],
-            "port": self.data["port"],
-            "user": self.data["user"],
-            "password": self.data["password"],
-            "secure": self.data["ssl"],
-            "verify": self.data["verify"],
-        }
-        for name in OPTIONAL_SSL_PARAMS:
-            if self.data.get(name) and self.data[name] != "":
-                client_kwargs[name] = self.data[name]
+        if self.conn_id is not None:
+            return self
+
+        client_kwargs = get_client_kwargs(self.data)
 
         self.temp_dir = tempfile.TemporaryDirectory()
 
@@ -105,6 +233,18 @@ class ClickhouseConnect:
         return self
 
     def __exit__(self, *args, **kwargs):
+        if self.conn_id is not None:
+            # the pool closes an evicted client once nobody uses it
+            if self._pooled is not None:
+                get_client_pool().release(self._pooled)
+                self._pooled = None
+                self._client = None
+            return
+        try:
+            if self._client is not None:
+                self._client.close()
+        except Exception as err:
+            logger.exception("error while client close (ignoring): %s", err)
         try:
             if self.temp_dir:
                 self.temp_dir.cleanup()
@@ -124,6 +264,604 @@ def flyql_clickhouse_columns(source_columns: Dict[str, SourceColumn]):
     }
 
 
+def compile_query(source, query: str) -> compiled_queries.CompiledQuery:
+    return compiled_queries.compile_query(
+        source, query, "clickhouse", flyql_clickhouse_columns, to_sql
+    )
+
+
+def build_filter_clause(source, query: str) -> str:
+    if not query:
+        return "true"
+    return compile_query(source, query).sql
+
+
+def get_time_column_type(source) -> str:
+    return convert_to_base_ch(source._columns[source.time_column].type.lower())
+
+
+def get_utc_time_expr(source) -> str:
+    time_column_type = get_time_column_type(source)
+    if time_column_type in ["datetime", "datetime64"]:
+        return f"toTimeZone(`{source.time_column}`, 'UTC')"
+    elif time_column_type in ["timestamp", "uint64", "int64"]:
+        return f"toTimeZone(toDateTime(`{source.time_column}`), 'UTC')"
+    return ""
+
+
+def build_group_by_expr(group_by) -> str:
+    if "." in group_by.name:
+        spl = group_by.name.split(".")
+        if group_by.jsonstring:
+            json_path = spl[1:]
+            json_path = ", ".join([escape_param(x) for x in json_path])
+            return f"JSONExtractString({group_by.root_name}, {json_path})"
+        elif group_by.is_map():
+            map_key = ".".join(spl[1:])
+            return f"{group_by.root_name}['{map_key}']"
+        elif group_by.is_array():
+            array_index = int(".".join(spl[1]))
+            return f"{group_by.root_name}[{array_index}]"
+        else:
+            raise ValueError
+    return f"toString({group_by.root_name})"
+
+
+# name of the extracted severity, before the remap rules are applied
+SEVERITY_VALUE_ALIAS = "_____record_severity_value"
+
+
+class SeveritySqlDialect(severity.SqlDialect):
+    def get_value(self, column: str) -> str:
+        return f"toString(`{column}`)"
+
+    def json_value(self, value: str, path: Sequence[str]) -> str:
+        args = ", ".join(escape_param(key) for key in path)
+        # missing values are empty raw values, null and booleans read as in Python
+        raw = f"JSONExtractRaw({value}, {args})"
+        return (
+            f"if(JSONType({value}, {args}) = 'String', JSONExtractString({value}, {args}), "
+            f"transform({raw}, ['null', 'true', 'false'], ['None', 'True', 'False'], {raw}))"
+        )
+
+    def regex_value(self, value: str, regex: str, group: int) -> str:
+        return f"regexpExtract({value}, {regex}, {group})"
+
+    def first_non_empty(self, values: List[str]) -> str:
+        args = ", ".join(f"nullIf({value}, '')" for value in values)
+        return f"coalesce({args})"
+
+    def regex_match(self, value: str, regex: str) -> str:
+        return f"match({value}, {regex})"
+
+    def conditional(self, branches: List[Tuple[str, str]], default: str) -> str:
+        args = ", ".join(f"{condition}, {value}" for condition, value in branches)
+        return f"multiIf({args}, {default})"
+
+    def remap_literals(
+        self, value: str, literals: List[Tuple[str, str]], default: str
+    ) -> str:
+        keys = ", ".join(literal for literal, _ in literals)
+        targets = ", ".join(target for _, target in literals)
+        return f"transform({value}, [{keys}], [{targets}], {default})"
+
+    def bind(self, value: str, build: Callable[[str, str], str]) -> str:
+        # aliases can be used anywhere in the query, also before their definition
+        alias = f"`{SEVERITY_VALUE_ALIAS}`"
+        return build(alias, f"({value} AS {alias})")
+
+    def if_empty(self, value: str, default: str) -> str:
+        return f"ifNull(nullIf({value}, ''), {default})"
+
+
+SEVERITY_SQL_DIALECT = SeveritySqlDialect(escape_param)
+
+
+def build_severity_expr(source) -> Optional[str]:
+    return severity.build_sql_expr(source, SEVERITY_SQL_DIALECT)
+
+
+def get_group_by_expr(source, group_by) -> str:
+    # the severity column is grouped by the severity its rules compute
+    if group_by.name == source.severity_column:
+        severity_expr = build_severity_expr(source)
+        if severity_expr is not None:
+            return severity_expr
+    return build_group_by_expr(group_by)
+
+
+def get_group_by_key(source, group_by) -> Optional[str]:
+    """Returns the group by expressions identifying cached graph counts."""
+    if not group_by:
+        return None
+    return ", ".join(get_group_by_expr(source, column) for column in group_by)
+
+
+def get_from_db_table(source) -> str:
+    return f"{source.data['database']}.{source.data['table']}"
+
+
+def get_settings_clause(source) -> str:
+    if source.data.get("settings"):
+        return f" SETTINGS {source.data['settings']}"
+    return ""
+
+
+def build_graph_query(
+    request: GraphDataRequest,
+    filter_clause: str,
+    window: Optional[Tuple[int, int]] = None,
+    fold: bool = True,
+) -> GraphQuery:
+    """
+    Returns the histogram query. When `window` is set, only its part of the
+    requested range is counted, with buckets of the whole range interval.
+
+    With a group limit, groups outside of the top ones are folded by the
+    query unless `fold` is False, e.g. for windows merged by the caller.
+    """
+    source = request.source
+    raw_where_clause = request.raw_query or "true"
+
+    # several columns group by their composite key
+    group_by = get_group_by_columns(request.group_by)
+    group_by_values = [get_group_by_expr(source, column) for column in group_by]
+
+    time_clause = get_window_time_clause(
+        source, request.time_from, request.time_to, window
+    )
+    time_column_type = get_time_column_type(source)
+    to_time_zone = get_utc_time_expr(source)
+
+    stats_interval_seconds = get_graph_interval(request.time_from, request.time_to)
+    stats_time_selector = ""
+    buckets = None
+    if stats_interval_seconds is not None:
+        stats_time_selector = f"toUnixTimestamp(toStartOfInterval({to_time_zone}, toIntervalSecond({stats_interval_seconds}))) * 1000"
+        buckets = get_graph_buckets(
+            *(window or (request.time_from, request.time_to)),
+            stats_interval_seconds,
+        )
+    else:
+        if time_column_type in ["datetime", "timestamp", "uint64"]:
+            stats_time_selector = f"toUnixTimestamp({to_time_zone})*1000"
+        elif time_column_type == "datetime64":
+            stats_time_selector = f"toUnixTimestamp64Milli({to_time_zone})"
+
+    stat_sql = f"SELECT {stats_time_selector} as t, COUNT() as Count"
+    for column, value in zip(group_by, group_by_values):
+        stat_sql += f", {value} as `{column.name}`"
+    stat_sql += f" FROM {get_from_db_table(source)} WHERE {time_clause} AND {filter_clause} AND {raw_where_clause} GROUP BY t"
+    group_limit = None
+    if group_by:
+        group_columns = ", ".join(f"`{column.name}`" for column in group_by)
+        stat_sql += f", {group_columns}"
+        if fold and request.group_limit:
+            group_limit = request.group_limit
+            stat_sql = build_top_groups_sql(
+                stat_sql, [column.name for column in group_by], group_limit
+            )
+            group_columns = "`__group`"
+    # missing buckets are zero in the series build_graph_response allocates
+    stat_sql += " ORDER BY t"
+    stat_sql += get_settings_clause(source)
+    return GraphQuery(
+        sql=stat_sql,
+        grouped=bool(group_by),
+        buckets=buckets,
+        group_limit=group_limit,
+    )
+
+
+def get_time_windows(
+    time_from: int, time_to: int, window_start: int, factor: int
+) -> List[Tuple[int, int]]:
+    """
+    Splits the requested time range into disjoint windows, newest first.
+
+    The first window spans from `window_start` to `time_to`, then every next
+    window is `factor` times wider than the total range covered so far, until
+    `time_from` is reached. Only the first window includes its upper bound,
+    so together the windows cover exactly the BETWEEN range of the request.
+    """
+    windows = []
+    size = max(time_to - window_start, 1)
+    upper = time_to
+    while True:
+        lower = max(time_to - size, time_from)
+        windows.append((lower, upper))
+        if lower <= time_from:
+            break
+        upper = lower
+        size *= factor
+    return windows
+
+
+def get_window_start_from_histogram(
+    histogram: GraphDataResponse, time_from: int, limit: int
+) -> int:
+    """
+    Returns the start of the newest bucket range holding at least `limit` rows.
+    """
+    totals = [0] * len(histogram.timestamps)
+    for series in histogram.data.values():
+        for idx, count in enumerate(series):
+            totals[idx] += count
+    collected = 0
+    for idx in range(len(totals) - 1, -1, -1):
+        collected += totals[idx]
+        if collected >= limit:
+            return max(histogram.timestamps[idx], time_from)
+    return time_from
+
+
+def get_time_precision(source) -> Optional[int]:
+    """Returns the digits of the fractional seconds of a DateTime64 time column."""
+    if get_time_column_type(source) != "datetime64":
+        return None
+    match = re.search(
+        r"datetime64\(\s*(\d+)", source._columns[source.time_column].type.lower()
+    )
+    return int(match.group(1)) if match else 3
+
+
+def get_sort_time_expr(source) -> str:
+    """
+    Returns the time column as rows are ordered by. Cursors hold microseconds,
+    so finer times are ordered and compared truncated to microseconds, or rows
+    of the same microsecond would be skipped by the next page.
+    """
+    precision = get_time_precision(source)
+    if precision is not None and precision > 6:
+        return f"toDateTime64(`{source.time_column}`, 6)"
+    return f"`{source.time_column}`"
+
+
+def get_order_by_clause(source) -> str:
+    # the uniq column makes the order total, which keyset pagination relies on
+    if source.uniq_column:
+        return (
+            f"ORDER BY {get_sort_time_expr(source)} DESC, `{source.uniq_column}` DESC"
+        )
+    return f"ORDER BY `{source.time_column}` DESC"
+
+
+def get_cursor_time(source, micros: int) -> str:
+    """Returns the cursor time as a value of the time column type."""
+    if get_time_column_type(source) in ["timestamp", "uint64", "int64"]:
+        # numeric time columns hold seconds, see get_utc_time_expr
+        return str(micros // 1000000)
+    return f"fromUnixTimestamp64Micro({micros})"
+
+
+def apply_cursor(request: DataRequest, filter_clause: str) -> str:
+    """Returns the filter clause restricted to the rows after the request cursor."""
+    cursor = request.cursor
+    if cursor is None or cursor.time is None:
+        return filter_clause
+    source = request.source
+    last_time = get_cursor_time(source, int(cursor.time))
+    last_uniq = pagination.get_cursor_literal(cursor.uniq, escape_param)
+    clause = f"({get_sort_time_expr(source)}, `{source.uniq_column}`) < ({last_time}, {last_uniq})"
+    return f"{filter_clause} AND {clause}"
+
+
+def build_data_query(
+    request: DataRequest,
+    filter_clause: str,
+    window: Optional[Tuple[int, int]] = None,
+    limit: Optional[int] = None,
+):
+    """
+    Returns the rows query and the names of the selected columns.
+
+    When `window` is set, only rows from [lower, upper) are selected, unless the
+    window ends at the end of the requested range, which is included.
+    """
+    source = request.source
+    order_by_clause = get_order_by_clause(source)
+    raw_where_clause = request.raw_query or "true"
+    limit = limit or request.limit
+
+    time_clause = get_window_time_clause(
+        source, request.time_from, request.time_to, window
+    )
+
+    columns_names = sorted(request.columns or source._columns.keys())
+    columns_to_select = []
+    for column in columns_names:
+        if column == source.time_column:
+            columns_to_select.append(get_utc_time_expr(source))
+        else:
+            columns_to_select.append(f"`{column}`")
+    selected_columns = [source._record_pseudo_id_column] + columns_names
+    severity_expr = build_severity_expr(source)
+    if severity_expr is not None:
+        columns_to_select.append(severity_expr)
+        selected_columns.append(source._record_severity_column)
+    columns_to_select = ", ".join(columns_to_select)
+
+    select_query = f"SELECT generateUUIDv4(),{columns_to_select} FROM {get_from_db_table(source)} WHERE {time_clause} AND {filter_clause} AND {raw_where_clause} {order_by_clause} LIMIT {limit}{get_settings_clause(source)}"
+    return select_query, selected_columns
+
+
+EXPORT_FORMATS = {
+    export.FORMAT_CSV: "CSVWithNames",
+    export.FORMAT_NDJSON: "JSONEachRow",
+    export.FORMAT_PARQUET: "Parquet",
+}
+
+
+def build_export_query(request: DataRequest, filter_clause: str) -> str:
+    source = request.source
+    columns_to_select = []
+    for column in request.columns or sorted(source._columns.keys()):
+        if column == source.time_column:
+            columns_to_select.append(f"{get_utc_time_expr(source)} AS `{column}`")
+        else:
+            columns_to_select.append(f"`{column}`")
+    columns_to_select = ", ".join(columns_to_select)
+    time_clause = build_time_clause(
+        source.time_column, source.date_column, request.time_from, request.time_to
+    )
+    raw_where_clause = request.raw_query or "true"
+    return f"SELECT {columns_to_select} FROM {get_from_db_table(source)} WHERE {time_clause} AND {filter_clause} AND {raw_where_clause} ORDER BY `{source.time_column}` DESC LIMIT {request.limit}{get_settings_clause(source)}"
+
+
+def get_budget_kwargs(source, request_type: str) -> dict:
+    query_settings = budget.get_budget(source, request_type)
+    if not query_settings:
+        return {}
+    return {"settings": query_settings}
+
+
+def get_query_kwargs(request, part: str, shard: Optional[int] = None) -> dict:
+    """
+    Returns client query kwargs carrying the budget of the request type and
+    tagging the query with the id of the request cancel token, so that it can
+    be killed when the request is abandoned. Concurrent shards of a part get
+    query ids of their own.
+    """
+    query_settings = budget.get_budget(request.source, part)
+    if request.cancel_token is not None:
+        query_id = request.cancel_token.get_query_id(part)
+        if shard is not None:
+            query_id = f"{query_id}-{shard}"
+        query_settings["query_id"] = query_id
+    if not query_settings:
+        return {}
+    return {"settings": query_settings}
+
+
+def kill_queries(client, query_id_prefix: str):
+    client.command(
+        f"KILL QUERY WHERE startsWith(query_id, {escape_param(query_id_prefix)}) ASYNC"
+    )
+
+
+def get_shards_stop(client, request, part: str) -> Optional[Callable[[], None]]:
+    """Returns the function killing the running shard queries of the part."""
+    if request.cancel_token is None:
+        return None
+    # shard queries are tagged with the query id of their part
+    query_id_prefix = f"{request.cancel_token.get_query_id(part)}-"
+    return lambda: kill_queries(client, query_id_prefix)
+
+
+def read_graph_shards(
+    client,
+    request: GraphDataRequest,
+    filter_clause: str,
+    shards: List[Tuple[int, int]],
+    stats: QueryStats,
+) -> List[tuple]:
+    """
+    Runs the histogram query of every shard concurrently and returns the rows
+    of all of them. Shards count with the buckets of the whole range and are
+    not folded, so that buckets split between shards add up when merged.
+    """
+
+    def query_shard(idx: int, shard: Tuple[int, int]):
+        shard_stats = QueryStats()
+        with shard_stats.fetching():
+            result = client.query(
+                build_graph_query(request, filter_clause, shard, fold=False).sql,
+                **get_query_kwargs(request, "graph", idx),
+            )
+            result_rows = result.result_rows
+        shard_stats.add_summary(result.summary)
+        shard_stats.result_rows = len(result_rows)
+        return result_rows, shard_stats
+
+    metrics.incr("clickhouse_sharded_queries", len(shards))
+    stats.shards += len(shards)
+    result_rows = []
+    # concurrent queries are measured as a whole
+    with stats.fetching(query=False):
+        for shard_rows, shard_stats in sharding.iter_results(
+            query_shard, shards, stop=get_shards_stop(client, request, "graph")
+        ):
+            result_rows.extend(shard_rows)
+            stats.merge(shard_stats)
+            stats.shards_done += 1
+    return result_rows
+
+
+def read_rows(
+    client,
+    source,
+    select_query,
+    selected_columns,
+    tz,
+    external_data: Optional[ExternalData] = None,
+    query_kwargs: Optional[dict] = None,
+    stats: Optional[QueryStats] = None,
+):
+    stats = stats or QueryStats()
+    kwargs = dict(query_kwargs or {})
+    if external_data is not None:
+        kwargs["external_data"] = external_data
+    if source.data.get("fetch_mode") == CLICKHOUSE_FETCH_MODE_ROWS:
+        with stats.fetching():
+            result = client.query(select_query, **kwargs)
+            items = result.result_rows
+        stats.add_summary(result.summary)
+        with stats.building():
+            return build_rows(source, selected_columns, items, tz)
+
+    return list(
+        iter_block_rows(
+            client, source, select_query, selected_columns, tz, kwargs, stats
+        )
+    )
+
+
+def iter_block_rows(
+    client,
+    source,
+    select_query,
+    selected_columns,
+    tz,
+    query_kwargs,
+    stats: Optional[QueryStats] = None,
+):
+    """Yields rows block by block while the query result is being received."""
+    stats = stats or QueryStats()
+    with stats.fetching():
+        context = client.query_column_block_stream(select_query, **query_kwargs)
+    with context as stream:
+        # the stream source is the query result carrying the summary
+        stats.add_summary(getattr(getattr(stream, "source", None), "summary", None))
+        blocks = iter(stream)
+        while True:
+            with stats.fetching(query=False):
+                block = next(blocks, None)
+            if block is None:
+                break
+            with stats.building():
+                rows = build_rows_from_block(source, selected_columns, block, tz)
+            yield from rows
+
+
+LATE_KEYS_TABLE = "_telescope_row_keys"
+
+
+def get_row_key_columns(source) -> List[Tuple[str, str]]:
+    """
+    Returns (expression, type) pairs identifying a single row: the uniq column
+    when the source has one, the part name and the row offset inside it otherwise.
+    """
+    if source.uniq_column:
+        return [(f"`{source.uniq_column}`", source._columns[source.uniq_column].type)]
+    return [("_part", "String"), ("_part_offset", "UInt64")]
+
+
+def build_keys_query(
+    request: DataRequest,
+    filter_clause: str,
+    window: Optional[Tuple[int, int]] = None,
+    limit: Optional[int] = None,
+) -> str:
+    """
+    Returns the first phase query of a late materialized fetch: the keys and
+    the millisecond timestamps of the latest rows, without reading other columns.
+    """
+    source = request.source
+    key_columns = ", ".join(expr for expr, _ in get_row_key_columns(source))
+    time_clause = get_window_time_clause(
+        source, request.time_from, request.time_to, window
+    )
+    raw_where_clause = request.raw_query or "true"
+    return f"SELECT {key_columns}, toUnixTimestamp64Milli(toDateTime64({get_utc_time_expr(source)}, 3)) FROM {get_from_db_table(source)} WHERE {time_clause} AND {filter_clause} AND {raw_where_clause} {get_order_by_clause(source)} LIMIT {limit or request.limit}{get_settings_clause(source)}"
+
+
+def escape_tsv_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+
+
+def read_rows_late(
+    client,
+    request: DataRequest,
+    filter_clause: str,
+    tz: zoneinfo.ZoneInfo,
+    window: Optional[Tuple[int, int]] = None,
+    limit: Optional[int] = None,
+    stats: Optional[QueryStats] = None,
+    shard: Optional[int] = None,
+) -> Optional[List[Row]]:
+    """
+    Reads the latest rows in two phases: the first one finds keys of the top
+    rows reading only the key and time columns, the second one reads all the
+    selected columns for exactly those rows, passed as external data.
+
+    Returns None when rows found by the first phase are gone (e.g. parts were
+    merged in between), so the caller can fall back to a single phase query.
+    """
+    source = request.source
+    keys_query = build_keys_query(request, filter_clause, window, limit)
+    query_kwargs = get_query_kwargs(request, "data", shard)
+    stats = stats or QueryStats()
+    with stats.fetching():
+        keys_result = client.query(keys_query, **query_kwargs)
+        keys = keys_result.result_rows
+    stats.add_summary(keys_result.summary)
+    if not keys:
+        return []
+
+    key_columns = get_row_key_columns(source)
+    external_data = ExternalData(
+        file_name=LATE_KEYS_TABLE,
+        data="".join(
+            "\t".join(escape_tsv_value(value) for value in item[:-1]) + "\n"
+            for item in keys
+        ).encode(),
+        fmt="TabSeparated",
+        structure=[f"k{idx} {type}" for idx, (_, type) in enumerate(key_columns)],
+    )
+    key_expr = ", ".join(expr for expr, _ in key_columns)
+    timestamps = [item[-1] for item in keys]
+    select_query, selected_columns = build_data_query(
+        request,
+        f"{filter_clause} AND ({key_expr}) IN (SELECT * FROM {LATE_KEYS_TABLE})",
+        # the upper bound is excluded, values are truncated to milliseconds
+        window=(min(timestamps), max(timestamps) + 1),
+        limit=len(keys),
+    )
+    rows = read_rows(
+        client,
+        source,
+        select_query,
+        selected_columns,
+        tz,
+        external_data=external_data,
+        query_kwargs=query_kwargs,
+        stats=stats,
+    )
+    metrics.incr("clickhouse_late_materialization_queries")
+    if len(rows) < len(keys):
+        metrics.incr("clickhouse_late_materialization_fallbacks")
+        return None
+    return rows
+
+
+def build_rows_from_block(
+    source, selected_columns, block, tz: zoneinfo.ZoneInfo = UTC_ZONE
+):
+    """
+    Builds rows from a column-oriented block of the data query.
+
+    Time values are formatted for the whole block at once and the rows of the
+    block share one `BlockBatch` reading values from the block columns, only
+    sources transforming every row need the block transposed to value tuples.
+    """
+    if not block or not block[0]:
+        return []
+    times = format_times(block[selected_columns.index(source.time_column)], tz)
+    if transforms_rows(source, selected_columns):
+        return build_rows(source, selected_columns, list(zip(*block)), tz, times)
+    return BlockBatch(source, selected_columns, block, times).rows()
+
+
 class ConnectionTestResponseNg:
     def __init__(
         self,
@@ -167,14 +905,9 @@ class Fetcher(BaseFetcher):
             return True, None
 
         try:
-            parser = parse(query)
-        except ParserError as err:
+            compile_query(source, query)
+        except (ParserError, FlyqlError) as err:
             return False, err.message
-        else:
-            try:
-                to_sql(parser.root, columns=flyql_clickhouse_columns(source._columns))
-            except FlyqlError as err:
-                return False, err.message
 
         return True, None
 
@@ -206,7 +939,10 @@ class Fetcher(BaseFetcher):
                 try:
                     result = c.client.query(
                         "select name, type from system.columns where database = %(database)s and table = %(table)s",
-                        parameters={"database": data["database"], "table": data["table"]},
+                        parameters={
+                            "database": data["database"],
+                            "table": data["table"],
+                        },
                     )
                 except Exception as err:
                     response.schema["error"] = str(err)
@@ -245,6 +981,18 @@ class Fetcher(BaseFetcher):
     def autocomplete(cls, source, column, time_from, time_to, value):
         if column not in source._columns:
             raise ValueError(f"Invalid column: {column!r}")
+        cached = autocomplete_cache.search(
+            source,
+            column,
+            time_from,
+            value,
+            loader=lambda time_from, time_to, limit: cls.load_autocomplete_values(
+                source, column, time_from, time_to, limit
+            ),
+        )
+        if cached is not None:
+            return cached
+
         incomplete = False
         from_db_table = f"{source.data['database']}.{source.data['table']}"
         time_clause = build_time_clause(
@@ -255,149 +1003,117 @@ class Fetcher(BaseFetcher):
         if source.data.get("settings"):
             query += f" SETTINGS {source.data['settings']}"
 
-        with ClickhouseConnect(source.conn.data) as c:
-            result = c.client.query(query, {"value": f"%{value}%"})
-            items = [str(x[0]) for x in result.result_rows]
+        with budget.enforce(source, budget.REQUEST_TYPE_AUTOCOMPLETE, "clickhouse"):
+            with ClickhouseConnect(source.conn.data, conn_id=source.conn.id) as c:
+                result = c.client.query(
+                    query,
+                    {"value": f"%{value}%"},
+                    **get_budget_kwargs(source, budget.REQUEST_TYPE_AUTOCOMPLETE),
+                )
+                items = [str(x[0]) for x in result.result_rows]
         if len(items) >= 500:
             incomplete = True
         return AutocompleteResponse(items=items, incomplete=incomplete)
 
+    @classmethod
+    def load_autocomplete_values(cls, source, column, time_from, time_to, limit):
+        """Returns the `limit` most frequent values of the column."""
+        from_db_table = f"{source.data['database']}.{source.data['table']}"
+        time_clause = build_time_clause(
+            source.time_column, source.date_column, time_from, time_to
+        )
+        query = f"SELECT {column}, count() AS c FROM {from_db_table} WHERE {time_clause} GROUP BY {column} ORDER BY c DESC LIMIT {int(limit)}"
+        if source.data.get("settings"):
+            query += f" SETTINGS {source.data['settings']}"
+
+        with budget.enforce(source, budget.REQUEST_TYPE_AUTOCOMPLETE, "clickhouse"):
+            with ClickhouseConnect(source.conn.data, conn_id=source.conn.id) as c:
+                result = c.client.query(
+                    query, **get_budget_kwargs(source, budget.REQUEST_TYPE_AUTOCOMPLETE)
+                )
+                return [str(x[0]) for x in result.result_rows]
+
     @classmethod
     def fetch_graph_data(
         cls,
         request: GraphDataRequest,
     ):
-        if request.query:
-            parser = parse(request.query)
-            filter_clause = to_sql(
-                parser.root, columns=flyql_clickhouse_columns(request.source._columns)
-            )
-        else:
-            filter_clause = "true"
-
-        raw_where_clause = request.raw_query or "true"
-
-        group_by_value = ""
-        group_by = request.group_by[0] if request.group_by else None
-        if group_by:
-            if "." in group_by.name:
-                spl = group_by.name.split(".")
-                if group_by.jsonstring:
-                    json_path = spl[1:]
-                    json_path = ", ".join([escape_param(x) for x in json_path])
-                    group_by_value = (
-                        f"JSONExtractString({group_by.root_name}, {json_path})"
-                    )
-                elif group_by.is_map():
-                    map_key = ".".join(spl[1:])
-                    group_by_value = f"{group_by.root_name}['{map_key}']"
-                elif group_by.is_array():
-                    array_index = int(".".join(spl[1]))
-                    group_by_value = f"{group_by.root_name}[{array_index}]"
-                else:
-                    raise ValueError
-            else:
-                group_by_value = f"toString({group_by.root_name})"
+        filter_clause = build_filter_clause(request.source, request.query)
+        return cls._fetch_graph_data(request, filter_clause)
 
-        total = 0
-        time_clause = build_time_clause(
-            request.source.time_column,
-            request.source.date_column,
-            request.time_from,
-            request.time_to,
-        )
-        from_db_table = (
-            f"{request.source.data['database']}.{request.source.data['table']}"
-        )
+    @classmethod
+    def _fetch_graph_data(
+        cls,
+        request: GraphDataRequest,
+        filter_clause: str,
+    ) -> GraphDataResponse:
+        assert request.source.conn
+        stats = QueryStats()
+        with budget.enforce(request.source, budget.REQUEST_TYPE_GRAPH, "clickhouse"):
+            with ClickhouseConnect(
+                request.source.conn.data, conn_id=request.source.conn.id
+            ) as c:
 
-        time_column_type = convert_to_base_ch(
-            request.source._columns[request.source.time_column].type.lower()
-        )
-        to_time_zone = ""
-        if time_column_type in ["datetime", "datetime64"]:
-            to_time_zone = f"toTimeZone(`{request.source.time_column}`, 'UTC')"
-        elif time_column_type in ["timestamp", "uint64", "int64"]:
-            to_time_zone = (
-                f"toTimeZone(toDateTime(`{request.source.time_column}`), 'UTC')"
-            )
+                def query(sql: str):
+                    with stats.fetching():
+                        result = c.client.query(
+                            sql, **get_query_kwargs(request, "graph")
+                        )
+                        result_rows = result.result_rows
+                    stats.add_summary(result.summary)
+                    stats.result_rows += len(result_rows)
+                    return result_rows
 
-        columns_names = sorted(request.source._columns.keys())
-        columns_to_select = []
-        for column in columns_names:
-            if column == request.source.time_column:
-                columns_to_select.append(to_time_zone)
-            else:
-                columns_to_select.append(column)
-
-        stats = {}
-        stats_by_ts = {}
-        unique_ts = {request.time_from, request.time_to}
-        seconds = int(request.time_to - request.time_from) / 1000
-        stats_names = set()
-        stats_time_selector = ""
-        if seconds > 15:
-            max_points = 150
-            stats_interval_seconds = round(seconds / max_points)
-            if stats_interval_seconds == 0:
-                stats_interval_seconds = 1
-            stats_time_selector = f"toUnixTimestamp(toStartOfInterval({to_time_zone}, toIntervalSecond({stats_interval_seconds}))) * 1000"
-        else:
-            if time_column_type in ["datetime", "timestamp", "uint64"]:
-                stats_time_selector = f"toUnixTimestamp({to_time_zone})*1000"
-            elif time_column_type == "datetime64":
-                stats_time_selector = f"toUnixTimestamp64Milli({to_time_zone})"
+                def query_window(window: Tuple[int, int]):
+                    shards = sharding.get_shards(request.source, *window)
+                    if shards:
+                        return read_graph_shards(
+                            c.client, request, filter_clause, shards, stats
+                        )
+                    return query(
+                        build_graph_query(
+                            request, filter_clause, window, fold=False
+                        ).sql
+                    )
 
-        assert request.source.conn
-        with ClickhouseConnect(request.source.conn.data) as c:
-            stat_sql = f"SELECT {stats_time_selector} as t, COUNT() as Count"
-            if group_by_value:
-                assert group_by
-                stat_sql += f", {group_by_value} as `{group_by.name}`"
-            stat_sql += f" FROM {from_db_table} WHERE {time_clause} AND {filter_clause} AND {raw_where_clause} GROUP BY t"
-            if group_by_value:
-                assert group_by
-                stat_sql += f", `{group_by.name}`"
-            stat_sql += " ORDER BY t"
-
-            if request.source.data.get("settings"):
-                stat_sql += f" SETTINGS {request.source.data['settings']}"
-
-            for item in c.client.query(stat_sql).result_rows:
-                if group_by_value:
-                    ts, count, groupper = item
-                    if not groupper:
-                        groupper = "__none__"
-                else:
-                    ts, count = item
-                    groupper = "Rows"
-
-                stats_names.add(groupper)
-                items = stats.get(groupper, [])
-                items.append((ts, count))
-                total += count
-                stats[groupper] = items
-                unique_ts.add(ts)
-                if groupper not in stats_by_ts:
-                    stats_by_ts[groupper] = {ts: count}
+                if graph_cache.is_enabled(request):
+                    group_by = get_group_by_columns(request.group_by)
+                    with stats.building():
+                        response = graph_cache.fetch_graph(
+                            request,
+                            key_parts=[
+                                filter_clause,
+                                get_group_by_key(request.source, group_by),
+                            ],
+                            grouped=bool(group_by),
+                            query_window=query_window,
+                        )
+                    # the cache merge is measured as a whole, queries included
+                    stats.build_ms = max(stats.build_ms - stats.fetch_ms, 0)
+                    response.stats = stats
+                    return response
+
+                shards = sharding.get_shards(
+                    request.source, request.time_from, request.time_to
+                )
+                # shards are folded once merged
+                graph_query = build_graph_query(request, filter_clause, fold=not shards)
+                if shards:
+                    result_rows = read_graph_shards(
+                        c.client, request, filter_clause, shards, stats
+                    )
                 else:
-                    stats_by_ts[groupper][ts] = count
-        stats = {
-            "timestamps": sorted(unique_ts),
-            "data": {},
-        }
-        for name in stats_names:
-            stats["data"][name] = []
-
-        for ts in stats["timestamps"]:
-            for name in stats_names:
-                value = stats_by_ts.get(name, {}).get(ts, 0)
-                stats["data"][name].append(value)
-
-        return GraphDataResponse(
-            timestamps=stats["timestamps"],
-            data=stats["data"],
-            total=total,
-        )
+                    result_rows = query(graph_query.sql)
+        with stats.building():
+            response = build_graph_response(
+                result_rows, request.time_from, request.time_to, graph_query
+            )
+            if shards:
+                response.data, response.other_groups = fold_groups(
+                    response.data, request.group_limit
+                )
+        response.stats = stats
+        return response
 
     @classmethod
     def fetch_data(
@@ -405,62 +1121,333 @@ class Fetcher(BaseFetcher):
         request: DataRequest,
         tz: Optional[zoneinfo.ZoneInfo] = None,
     ):
-        if request.query:
-            parser = parse(request.query)
-            filter_clause = to_sql(
-                parser.root, columns=flyql_clickhouse_columns(request.source._columns)
+        filter_clause = build_filter_clause(request.source, request.query)
+        return cls._fetch_data(request, filter_clause, tz)
+
+    @classmethod
+    def _fetch_data(
+        cls,
+        request: DataRequest,
+        filter_clause: str,
+        tz: Optional[zoneinfo.ZoneInfo] = None,
+    ) -> DataResponse:
+        tz = tz or UTC_ZONE
+        assert request.source.conn
+        filter_clause = apply_cursor(request, filter_clause)
+        with ClickhouseConnect(
+            request.source.conn.data, conn_id=request.source.conn.id
+        ) as c:
+            if request.source.data.get("adaptive_window"):
+                return cls._read_latest_rows(c.client, request, filter_clause, tz)
+            shards = sharding.get_shards(
+                request.source, request.time_from, request.time_to
             )
-        else:
-            filter_clause = "true"
+            if shards:
+                return cls._read_sharded_rows(
+                    c.client, request, filter_clause, tz, shards
+                )
+            stats = QueryStats()
+            with budget.enforce(request.source, budget.REQUEST_TYPE_DATA, "clickhouse"):
+                rows = cls._read_rows(c.client, request, filter_clause, tz, stats=stats)
+        stats.result_rows = len(rows)
+        return DataResponse(rows=rows, stats=stats)
 
-        order_by_clause = f"ORDER BY `{request.source.time_column}` DESC"
-        raw_where_clause = request.raw_query or "true"
+    @classmethod
+    def get_next_cursor(
+        cls, request: DataRequest, response: DataResponse
+    ) -> Optional[str]:
+        return pagination.get_next_cursor(request.source, response.rows, request.limit)
 
-        time_clause = build_time_clause(
-            request.source.time_column,
-            request.source.date_column,
-            request.time_from,
-            request.time_to,
+    @classmethod
+    def stream_data(
+        cls,
+        request: DataRequest,
+        tz: Optional[zoneinfo.ZoneInfo] = None,
+    ) -> DataResponse:
+        source = request.source
+        if (
+            source.data.get("adaptive_window")
+            or source.data.get("late_materialization")
+            or source.data.get("sharded_execution")
+            or source.data.get("fetch_mode") == CLICKHOUSE_FETCH_MODE_ROWS
+        ):
+            # these modes read the rows in several queries or as a whole result
+            return cls.fetch_data(request, tz)
+        filter_clause = apply_cursor(
+            request, build_filter_clause(source, request.query)
         )
-        from_db_table = (
-            f"{request.source.data['database']}.{request.source.data['table']}"
+        return DataResponse(
+            rows=cls._stream_rows(request, filter_clause, tz or UTC_ZONE)
+        )
+
+    @classmethod
+    def export_data(cls, request: DataRequest, fmt: str) -> Iterator[bytes]:
+        filter_clause = build_filter_clause(request.source, request.query)
+        return cls._export_data(
+            build_export_query(request, filter_clause), request.source, fmt
         )
 
-        columns_names = sorted(request.source._columns.keys())
-        columns_to_select = []
-        for column in columns_names:
-            if column == request.source.time_column:
-                time_column_type = convert_to_base_ch(
-                    request.source._columns[request.source.time_column].type.lower()
+    @classmethod
+    def _export_data(cls, query: str, source, fmt: str) -> Iterator[bytes]:
+        assert source.conn
+        query_settings = budget.get_budget(source, budget.REQUEST_TYPE_EXPORT)
+        # the query stops when the export is abandoned and its response closed
+        query_settings["cancel_http_readonly_queries_on_client_close"] = 1
+        chunk_size = export.get_config()["chunk_size"]
+        with budget.enforce(source, budget.REQUEST_TYPE_EXPORT, "clickhouse"):
+            with ClickhouseConnect(source.conn.data, conn_id=source.conn.id) as c:
+                stream = c.client.raw_stream(
+                    query, settings=query_settings, fmt=EXPORT_FORMATS[fmt]
+                )
+                try:
+                    # the output is encoded by the server and passed through
+                    yield from iter(lambda: stream.read(chunk_size), b"")
+                finally:
+                    stream.close()
+
+    @classmethod
+    def _stream_rows(
+        cls,
+        request: DataRequest,
+        filter_clause: str,
+        tz: zoneinfo.ZoneInfo,
+    ) -> Iterator[Row]:
+        assert request.source.conn
+        select_query, selected_columns = build_data_query(request, filter_clause)
+        # the pooled client is held until the last row was consumed
+        with budget.enforce(request.source, budget.REQUEST_TYPE_DATA, "clickhouse"):
+            with ClickhouseConnect(
+                request.source.conn.data, conn_id=request.source.conn.id
+            ) as c:
+                yield from iter_block_rows(
+                    c.client,
+                    request.source,
+                    select_query,
+                    selected_columns,
+                    tz,
+                    get_query_kwargs(request, "data"),
                 )
-                if time_column_type in ["datetime", "datetime64"]:
-                    columns_to_select.append(f"toTimeZone(`{column}`, 'UTC')")
-                elif time_column_type in ["timestamp", "uint64", "int64"]:
-                    columns_to_select.append(
-                        f"toTimeZone(toDateTime(`{column}`), 'UTC')"
+
+    @classmethod
+    def _read_rows(
+        cls,
+        client,
+        request: DataRequest,
+        filter_clause: str,
+        tz: zoneinfo.ZoneInfo,
+        window: Optional[Tuple[int, int]] = None,
+        limit: Optional[int] = None,
+        stats: Optional[QueryStats] = None,
+        shard: Optional[int] = None,
+    ) -> List[Row]:
+        if request.source.data.get("late_materialization"):
+            rows = read_rows_late(
+                client, request, filter_clause, tz, window, limit, stats, shard
+            )
+            if rows is not None:
+                return rows
+        select_query, selected_columns = build_data_query(
+            request, filter_clause, window=window, limit=limit
+        )
+        return read_rows(
+            client,
+            request.source,
+            select_query,
+            selected_columns,
+            tz,
+            query_kwargs=get_query_kwargs(request, "data", shard),
+            stats=stats,
+        )
+
+    @classmethod
+    def _read_latest_rows(
+        cls,
+        client,
+        request: DataRequest,
+        filter_clause: str,
+        tz: zoneinfo.ZoneInfo,
+    ) -> DataResponse:
+        """
+        Reads the latest rows window by window, starting from the most recent
+        one, instead of sorting the whole requested range at once.
+
+        When a window exceeds the data budget, the rows of the previous windows
+        are returned with a message instead of failing the whole request.
+        """
+        config = settings.CONFIG["fetchers"]["adaptive_window"]
+        if request.histogram is not None:
+            window_start = get_window_start_from_histogram(
+                request.histogram, request.time_from, request.limit
+            )
+        else:
+            window_start = request.time_to - config["initial_seconds"] * 1000
+
+        rows = []
+        stats = QueryStats()
+        for window in get_time_windows(
+            request.time_from, request.time_to, window_start, config["factor"]
+        ):
+            if request.cancel_token is not None:
+                request.cancel_token.check()
+            metrics.incr("clickhouse_adaptive_window_queries")
+            try:
+                with budget.enforce(
+                    request.source, budget.REQUEST_TYPE_DATA, "clickhouse"
+                ):
+                    rows.extend(
+                        cls._read_rows(
+                            client,
+                            request,
+                            filter_clause,
+                            tz,
+                            window=window,
+                            limit=request.limit - len(rows),
+                            stats=stats,
+                        )
                     )
-            else:
-                columns_to_select.append(f"`{column}`")
-        columns_to_select = ", ".join(columns_to_select)
+            except budget.BudgetExceeded as err:
+                if not rows:
+                    raise
+                stats.result_rows = len(rows)
+                return DataResponse(
+                    rows=rows,
+                    message=budget.get_partial_message(err, len(rows)),
+                    stats=stats,
+                )
+            if len(rows) >= request.limit:
+                break
+        stats.result_rows = len(rows)
+        return DataResponse(rows=rows, stats=stats)
 
-        settings_clause = ""
-        if request.source.data.get("settings"):
-            settings_clause = f" SETTINGS {request.source.data['settings']}"
+    @classmethod
+    def _read_sharded_rows(
+        cls,
+        client,
+        request: DataRequest,
+        filter_clause: str,
+        tz: zoneinfo.ZoneInfo,
+        shards: List[Tuple[int, int]],
+    ) -> DataResponse:
+        """
+        Reads the latest rows of the shards concurrently and takes them shard
+        by shard, newest first, until the limit is satisfied. Shards not
+        started by then are cancelled, running ones are killed and waited for.
+
+        When a shard exceeds the data budget, the rows of the newer shards are
+        returned with a message instead of failing the whole request.
+        """
 
-        select_query = f"SELECT generateUUIDv4(),{columns_to_select} FROM {from_db_table} WHERE {time_clause} AND {filter_clause} AND {raw_where_clause} {order_by_clause} LIMIT {request.limit}{settings_clause}"
+        def read_shard(idx: int, shard: Tuple[int, int]):
+            shard_stats = QueryStats()
+            shard_rows = cls._read_rows(
+                client,
+                request,
+                filter_clause,
+                tz,
+                window=shard,
+                stats=shard_stats,
+                shard=idx,
+            )
+            return shard_rows, shard_stats
 
+        metrics.incr("clickhouse_sharded_queries", len(shards))
         rows = []
+        stats = QueryStats()
+        stats.shards = len(shards)
+        try:
+            with budget.enforce(
+                request.source, budget.REQUEST_TYPE_DATA, "clickhouse"
+            ), stats.fetching(query=False), closing(
+                sharding.iter_results(
+                    read_shard, shards, stop=get_shards_stop(client, request, "data")
+                )
+            ) as results:
+                for shard_rows, shard_stats in results:
+                    if request.cancel_token is not None:
+                        request.cancel_token.check()
+                    rows.extend(shard_rows)
+                    stats.merge(shard_stats)
+                    stats.shards_done += 1
+                    if len(rows) >= request.limit:
+                        break
+        except budget.BudgetExceeded as err:
+            if not rows:
+                raise
+            stats.result_rows = len(rows)
+            return DataResponse(
+                rows=rows,
+                message=budget.get_partial_message(err, len(rows)),
+                stats=stats,
+            )
+        # every shard reads up to the limit, later shards only fill the rest
+        rows = rows[: request.limit]
+        stats.result_rows = len(rows)
+        return DataResponse(rows=rows, stats=stats)
 
-        assert request.source.conn
-        with ClickhouseConnect(request.source.conn.data) as c:
-            selected_columns = [request.source._record_pseudo_id_column] + columns_names
-            for item in c.client.query(select_query).result_rows:
-                rows.append(
-                    Row(
-                        source=request.source,
-                        selected_columns=selected_columns,
-                        values=item,
-                        tz=tz or UTC_ZONE,
-                    )
+    @classmethod
+    def cancel_query(cls, source, query_id: str) -> bool:
+        assert source.conn
+        with ClickhouseConnect(source.conn.data, conn_id=source.conn.id) as c:
+            # all parts of the request share the query id prefix
+            kill_queries(c.client, query_id)
+        return True
+
+    @classmethod
+    def fetch_data_and_graph(
+        cls,
+        request: DataAndGraphDataRequest,
+        tz: Optional[zoneinfo.ZoneInfo] = None,
+    ) -> DataAndGraphDataResponse:
+        # the filter is compiled once and shared by both queries, which then
+        # run concurrently on the pooled client of the source connection
+        filter_clause = build_filter_clause(request.source, request.query)
+        if request.source.data.get("adaptive_window"):
+            # the graph is cheaper than a full range rows scan and tells where
+            # the latest rows are, so the rows query waits for it
+            graph_response, graph_err = budget.get_within_budget(
+                cls._fetch_graph_data, request.as_graph_request(), filter_clause
+            )
+            data_response, data_err = budget.get_within_budget(
+                cls._fetch_data,
+                request.as_data_request(histogram=graph_response),
+                filter_clause,
+                tz,
+            )
+        else:
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                data_future = executor.submit(
+                    cls._fetch_data, request.as_data_request(), filter_clause, tz
+                )
+                graph_future = executor.submit(
+                    cls._fetch_graph_data, request.as_graph_request(), filter_clause
+                )
+                data_response, data_err = budget.get_within_budget(data_future.result)
+                graph_response, graph_err = budget.get_within_budget(
+                    graph_future.result
                 )
-        return DataResponse(rows=rows)
+
+        # a part over its budget is reported, the other one is still shown
+        if data_err is not None and graph_err is not None:
+            raise data_err
+        messages = []
+        if data_err is not None:
+            data_response = DataResponse(rows=[])
+            messages.append(str(data_err))
+        elif data_response.message:
+            messages.append(data_response.message)
+        if graph_err is not None:
+            graph_response = GraphDataResponse(timestamps=[], data={}, total=0)
+            messages.append(str(graph_err))
+
+        return DataAndGraphDataResponse(
+            rows=data_response.rows,
+            graph_timestamps=graph_response.timestamps,
+            graph_data=graph_response.data,
+            graph_total=graph_response.total,
+            error=data_response.error,
+            message="; ".join(messages) or None,
+            cursor=data_response.cursor,
+            stats=data_response.stats,
+            graph_stats=graph_response.stats,
+            graph_other_groups=graph_response.other_groups,
+        )
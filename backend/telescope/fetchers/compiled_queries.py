@@ -0,0 +1,132 @@
+"""
+Compiled flyql query cache.
+
+A flyql query is parsed and turned into SQL once per source schema instead
+of once in request validation and again in every data and graph fetch. The
+parsed tree, the generated SQL and the flyql columns of the schema are kept
+in a per process LRU keyed by the source, a fingerprint of its columns, the
+SQL dialect and the query text. The fingerprint is computed once per column
+catalog of the source. Entries of a source are dropped when it is saved, the
+fingerprint keeps requests of a changed schema from hitting old entries in
+other processes. The flyql columns of a schema are dropped along with the
+last of its queries leaving the LRU.
+"""
+
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+from django.conf import settings
+from flyql.core.parser import parse
+
+from telescope import metrics
+
+ColumnsBuilder = Callable[[dict], Dict[str, Any]]
+SQLGenerator = Callable[..., str]
+
+
+class CompiledQuery:
+    def __init__(self, root, sql: str, columns: Dict[str, Any]):
+        self.root = root
+        self.sql = sql
+        self.columns = columns
+
+
+class CompiledQueryCache:
+    def __init__(self):
+        self.lock = Lock()
+        self.queries: OrderedDict = OrderedDict()
+        # flyql columns are shared by all queries of the same schema and
+        # kept while the LRU holds queries of it
+        self.columns: Dict[Tuple[Hashable, str, str], Dict[str, Any]] = {}
+        self.schema_queries: Dict[Tuple[Hashable, str, str], int] = {}
+
+    @staticmethod
+    def get_config() -> dict:
+        return settings.CONFIG["fetchers"]["compiled_queries"]
+
+    def compile(
+        self,
+        source,
+        query: str,
+        dialect: str,
+        build_columns: ColumnsBuilder,
+        to_sql: SQLGenerator,
+    ) -> CompiledQuery:
+        """
+        Returns the compiled query, parsing and generating its SQL on a miss.
+        Parser and generator errors are raised and not cached.
+        """
+        schema = (source.id, source.column_catalog.fingerprint, dialect)
+        key = schema + (query,)
+        with self.lock:
+            compiled = self.queries.get(key)
+            if compiled is not None:
+                self.queries.move_to_end(key)
+                metrics.incr("compiled_query_hits")
+                return compiled
+            columns = self.columns.get(schema)
+
+        metrics.incr("compiled_query_misses")
+        if columns is None:
+            columns = build_columns(source._columns)
+        parser = parse(query)
+        compiled = CompiledQuery(
+            root=parser.root,
+            sql=to_sql(parser.root, columns=columns),
+            columns=columns,
+        )
+
+        max_entries = self.get_config()["max_entries"]
+        with self.lock:
+            if key not in self.queries:
+                self.schema_queries[schema] = self.schema_queries.get(schema, 0) + 1
+            self.columns[schema] = columns
+            self.queries[key] = compiled
+            while len(self.queries) > max_entries:
+                evicted, _ = self.queries.popitem(last=False)
+                self._release_schema(evicted[:3])
+        return compiled
+
+    def _release_schema(self, schema: Tuple[Hashable, str, str]):
+        count = self.schema_queries.pop(schema) - 1
+        if count:
+            self.schema_queries[schema] = count
+        else:
+            self.columns.pop(schema, None)
+
+    def invalidate(self, source_id: Hashable):
+        with self.lock:
+            for key in [key for key in self.queries if key[0] == source_id]:
+                del self.queries[key]
+            for key in [key for key in self.columns if key[0] == source_id]:
+                del self.columns[key]
+            for key in [key for key in self.schema_queries if key[0] == source_id]:
+                del self.schema_queries[key]
+
+    def clear(self):
+        with self.lock:
+            self.queries.clear()
+            self.columns.clear()
+            self.schema_queries.clear()
+
+
+_cache = CompiledQueryCache()
+
+
+def compile_query(
+    source,
+    query: str,
+    dialect: str,
+    build_columns: ColumnsBuilder,
+    to_sql: SQLGenerator,
+) -> CompiledQuery:
+    return _cache.compile(source, query, dialect, build_columns, to_sql)
+
+
+def invalidate(source_id: Hashable):
+    _cache.invalidate(source_id)
+
+
+def clear():
+    _cache.clear()
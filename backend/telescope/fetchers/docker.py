@@ -1,5 +1,5 @@
-import json
 import logging
+from typing import List
 
 from dateutil import parser as duparser
 import docker
@@ -24,6 +24,9 @@ from telescope.fetchers.response import (
 )
 from telescope.fetchers.fetcher import BaseFetcher
 from telescope.fetchers.models import Row, UTC_ZONE
+from telescope.fetchers import pagination
+from telescope.fetchers.graph import fold_groups, get_group_by_columns
+from telescope.fetchers.utils import get_group_key_name, get_row_group_value
 
 logger = logging.getLogger("telescope.fetchers.docker")
 
@@ -201,11 +204,9 @@ class Fetcher(BaseFetcher):
         stats_by_ts = {}
         unique_ts = {request.time_from, request.time_to}
         stats_names = set()
-        group_by = request.group_by[0] if request.group_by else None
-        if not group_by:
-            groupper = "Rows"
-        else:
-            groupper = None
+        # several columns group by the tuple of their values
+        group_by = get_group_by_columns(request.group_by)
+        groupper = ("Rows",)
 
         ts = None
         total = 0
@@ -225,6 +226,8 @@ class Fetcher(BaseFetcher):
                 all=True,
                 filters={"name": request.context_columns.get("container", [])},
             ):
+                if request.cancel_token is not None:
+                    request.cancel_token.check()
                 logs = container.logs(
                     timestamps=True, since=since, until=until, **stream_param
                 )
@@ -275,18 +278,9 @@ class Fetcher(BaseFetcher):
             ts_key = int(row.time["unixtime"] / 1000) * 1000
             unique_ts.add(ts_key)
             if group_by:
-                if "." in group_by.name:
-                    spl = group_by.name.split(".")
-                    json_path = spl[1:]
-                    data = json.loads(row.data[spl[0]])
-                    for key in json_path:
-                        data = data.get(key, {})
-                    if not data:
-                        groupper = "__none__"
-                    else:
-                        groupper = str(data)
-                else:
-                    groupper = str(row.data[group_by.name])
+                groupper = tuple(
+                    get_row_group_value(row, column) for column in group_by
+                )
 
             if groupper not in stats_by_ts:
                 stats_by_ts[groupper] = {}
@@ -297,18 +291,15 @@ class Fetcher(BaseFetcher):
 
         timestamps = sorted(unique_ts)
         data = {}
-        for name in stats_by_ts.keys():
-            data[name] = []
-
-        for ts in timestamps:
-            for name in stats_by_ts.keys():
-                value = stats_by_ts.get(name, {}).get(ts, 0)
-                data[name].append(value)
+        for key, counts in stats_by_ts.items():
+            data[get_group_key_name(key)] = [counts.get(ts, 0) for ts in timestamps]
 
+        data, other_groups = fold_groups(data, request.group_limit)
         return GraphDataResponse(
             timestamps=sorted(unique_ts),
             data=data,
             total=total,
+            other_groups=other_groups,
         )
 
     def remove_ansi_escape_codes(text):
@@ -318,11 +309,7 @@ class Fetcher(BaseFetcher):
         return ansi_escape.sub("", text)
 
     @classmethod
-    def fetch_data(
-        cls,
-        request: DataRequest,
-        tz,
-    ):
+    def _read_rows(cls, request, tz) -> List[Row]:
         rows = []
         client = docker.DockerClient(base_url=request.source.conn.data["address"])
         since = request.time_from / 1000
@@ -344,6 +331,8 @@ class Fetcher(BaseFetcher):
                 all=True,
                 filters={"name": request.context_columns.get("container", [])},
             ):
+                if request.cancel_token is not None:
+                    request.cancel_token.check()
                 logs = container.logs(
                     timestamps=True, since=since, until=until, **stream_param
                 )
@@ -388,10 +377,27 @@ class Fetcher(BaseFetcher):
                         else:
                             if evaluator.evaluate(root, Record(data=row.data)):
                                 rows.append(row)
-        rows = sorted(rows, key=lambda r: r.time["unixtime"], reverse=True)[
-            : request.limit
-        ]
-        return DataResponse(rows=rows)
+        return rows
+
+    @classmethod
+    def fetch_data(
+        cls,
+        request: DataRequest,
+        tz,
+    ):
+        # a cursor points into the complete result read for the first page
+        rows = pagination.get_cached_rows(request.cursor)
+        cached = rows is not None
+        if not cached:
+            rows = sorted(
+                cls._read_rows(request, tz),
+                key=lambda r: r.time["unixtime"],
+                reverse=True,
+            )
+        rows, cursor = pagination.paginate(
+            rows, request.limit, request.cursor, cached=cached
+        )
+        return DataResponse(rows=rows, cursor=cursor)
 
     @classmethod
     def fetch_data_and_graph(
@@ -403,88 +409,27 @@ class Fetcher(BaseFetcher):
         from telescope.fetchers.utils import generate_graph_from_rows
         from telescope.fetchers.response import DataAndGraphDataResponse
 
-        rows = []
-        client = docker.DockerClient(base_url=request.source.conn.data["address"])
-        since = request.time_from / 1000
-        until = request.time_to / 1000
-        ts = None
-        root = None
-        evaluator = Evaluator()
-        if request.query:
-            parser = parse(request.query)
-            root = parser.root
-
-        for stream_name in ["stdout", "stderr"]:
-            stream_param = {
-                "stdout": False,
-                "stderr": False,
-            }
-            stream_param[stream_name] = True
-            for container in client.containers.list(
-                all=True,
-                filters={"name": request.context_columns.get("container", [])},
-            ):
-                logs = container.logs(
-                    timestamps=True, since=since, until=until, **stream_param
-                )
-                for line in logs.decode("utf-8").splitlines():
-                    if not line:
-                        continue
-                    spl = line.split(" ")
-                    try:
-                        ts = duparser.isoparse(spl[0])
-                    except Exception:
-                        message = line
-                    else:
-                        message = " ".join(spl[1:])
-                    message = cls.remove_ansi_escape_codes(message)
-                    if ts and message:
-                        row = Row(
-                            source=request.source,
-                            selected_columns=[
-                                "time",
-                                "stream",
-                                "status",
-                                "labels",
-                                "container_id",
-                                "container_short_id",
-                                "container_name",
-                                SOURCE_BODY_COL_NAME,
-                            ],
-                            values=[
-                                ts,
-                                stream_name,
-                                container.status,
-                                container.labels,
-                                container.id,
-                                container.short_id,
-                                container.name,
-                                message,
-                            ],
-                            tz=tz,
-                        )
-                        if not root:
-                            rows.append(row)
-                        else:
-                            if evaluator.evaluate(root, Record(data=row.data)):
-                                rows.append(row)
+        rows = cls._read_rows(request, tz)
 
-        group_by_field = request.group_by[0] if request.group_by else None
-        use_severity_grouping = not group_by_field
+        group_by_fields = request.group_by or []
+        use_severity_grouping = not group_by_fields
         graph_timestamps, graph_data, graph_total = generate_graph_from_rows(
             rows,
             request.time_from,
             request.time_to,
-            group_by_field,
+            group_by_fields,
             group_by_severity=use_severity_grouping,
         )
+        graph_data, graph_other_groups = fold_groups(graph_data, request.group_limit)
 
         rows = sorted(rows, key=lambda r: r.time["unixtime"], reverse=True)
-        limited_rows = rows[: request.limit]
+        limited_rows, cursor = pagination.paginate(rows, request.limit)
 
         return DataAndGraphDataResponse(
             rows=limited_rows,
             graph_timestamps=graph_timestamps,
             graph_data=graph_data,
             graph_total=graph_total,
+            graph_other_groups=graph_other_groups,
+            cursor=cursor,
         )
@@ -0,0 +1,59 @@
+"""
+Large result exports.
+
+Exports stream the selected columns of the matching rows in the requested
+format without building `Row` objects: ClickHouse encodes the output format
+itself and its response body is passed through in chunks, other fetchers
+encode the tuples of a server side cursor batch by batch.
+"""
+
+import csv
+import io
+import json
+from typing import Iterable, Iterator, List, Sequence
+
+from django.conf import settings
+
+FORMAT_CSV = "csv"
+FORMAT_NDJSON = "ndjson"
+FORMAT_PARQUET = "parquet"
+FORMATS = [FORMAT_CSV, FORMAT_NDJSON, FORMAT_PARQUET]
+
+CONTENT_TYPES = {
+    FORMAT_CSV: "text/csv",
+    FORMAT_NDJSON: "application/x-ndjson",
+    FORMAT_PARQUET: "application/vnd.apache.parquet",
+}
+
+
+def get_config() -> dict:
+    return settings.CONFIG["fetchers"]["export"]
+
+
+def get_filename(source, fmt: str) -> str:
+    return f"{source.slug}.{fmt}"
+
+
+def encode_batches(
+    batches: Iterable[Sequence[tuple]], columns: List[str], fmt: str
+) -> Iterator[bytes]:
+    """Encodes batches of row tuples as CSV with a header line or as NDJSON."""
+    if fmt == FORMAT_CSV:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        writer.writerow(columns)
+        for batch in batches:
+            writer.writerows(batch)
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode()
+    elif fmt == FORMAT_NDJSON:
+        for batch in batches:
+            yield "".join(
+                json.dumps(dict(zip(columns, item)), default=str) + "\n"
+                for item in batch
+            ).encode()
+    else:
+        raise ValueError(f"{fmt} export is not supported for this source type")
@@ -1,4 +1,4 @@
-from typing import Any, Optional
+from typing import Any, Iterator, Optional
 import zoneinfo
 from telescope.fetchers.request import (
     AutocompleteRequest,
@@ -31,6 +31,34 @@ class BaseFetcher:
     ) -> DataResponse:
         raise NotImplementedError
 
+    @classmethod
+    def get_next_cursor(
+        cls, request: DataRequest, response: DataResponse
+    ) -> Optional[str]:
+        """
+        Returns the encoded cursor of the page after the rows of the response,
+        None on the last page. Keyset fetchers derive it from the last row.
+        """
+        return response.cursor
+
+    @classmethod
+    def stream_data(
+        cls, request: DataRequest, tz: Optional[zoneinfo.ZoneInfo] = None
+    ) -> DataResponse:
+        """
+        Returns a response whose rows may be an iterator producing them while
+        the query runs. Fetchers without streaming support read all rows first.
+        """
+        return cls.fetch_data(request, tz)
+
+    @classmethod
+    def export_data(cls, request: DataRequest, fmt: str) -> Iterator[bytes]:
+        """
+        Returns chunks of the selected columns of the matching rows encoded
+        in one of the `export.FORMATS`.
+        """
+        raise NotImplementedError("Export not supported for this source type")
+
     @classmethod
     def fetch_graph_data(cls, request: GraphDataRequest) -> GraphDataResponse:
         raise NotImplementedError
@@ -42,3 +70,11 @@ class BaseFetcher:
         tz: Optional[zoneinfo.ZoneInfo] = None,
     ) -> DataAndGraphDataResponse:
         raise NotImplementedError("Combined fetch not supported for this source type")
+
+    @classmethod
+    def cancel_query(cls, source, query_id: str) -> bool:
+        """
+        Kills queries of the source tagged with `query_id` (or ids prefixed by it),
+        returns False when the source kind has nothing to kill on the server side.
+        """
+        return False
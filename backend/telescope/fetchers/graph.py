@@ -0,0 +1,185 @@
+import heapq
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+
+from telescope.fetchers.response import GraphDataResponse
+
+# series of the group by values outside of the top groups
+OTHER_GROUP = "__other__"
+
+# joins the values of a series grouped by several columns into its name
+GROUP_SEPARATOR = " / "
+
+
+class GraphQuery:
+    def __init__(
+        self,
+        sql: str,
+        grouped: bool,
+        buckets: Optional[range] = None,
+        group_limit: Optional[int] = None,
+    ):
+        self.sql = sql
+        self.grouped = grouped
+        self.buckets = buckets
+        # when set, rows of grouped queries also carry the number of groups
+        self.group_limit = group_limit
+
+
+def get_group_by_columns(group_by: Sequence[Any]) -> List[Any]:
+    """Returns the group by columns of a request, without repeated ones."""
+    columns = {}
+    for column in group_by or []:
+        columns.setdefault(column.name, column)
+    return list(columns.values())
+
+
+def get_group_name(values: Sequence[Any]) -> str:
+    """Returns the series name of the group by values of a histogram row."""
+    if len(values) == 1:
+        return values[0] or "__none__"
+    return GROUP_SEPARATOR.join(str(value) if value else "__none__" for value in values)
+
+
+def get_group_limit(value: Optional[int] = None) -> Optional[int]:
+    """
+    Returns the number of group by values shown as separate series, the
+    configured default when the request has none, None for all of them.
+    """
+    limit = value or settings.CONFIG["fetchers"]["graph_groups"]["limit"]
+    return limit or None
+
+
+def build_top_groups_sql(
+    select: str, groups: Sequence[str], limit: int, query_hints: str = ""
+) -> str:
+    """
+    Wraps a grouped histogram query selecting `t`, `Count` and the `groups`
+    columns, so only the `limit` groups with the most rows in the whole range
+    are returned as they are and all others are summed into one group.
+
+    Rows are (t, count, rank, groups, *values): the rank of the group is 0
+    for the summed one and groups is the number of distinct groups, as the
+    rank of the last one is the maximum of all rows.
+    """
+    columns = ", ".join(f"`{group}`" for group in groups)
+    ranked = (
+        f"SELECT t, Count, {columns},"
+        f" dense_rank() OVER (ORDER BY `__total` DESC, {columns}) AS `__rank`"
+        f" FROM (SELECT t, Count, {columns},"
+        f" sum(Count) OVER (PARTITION BY {columns}) AS `__total`"
+        f" FROM ({select}) AS `__counts`) AS `__totals`"
+    )
+    # values are the same for all rows of a top group
+    values = ", ".join(
+        f"max(`{group}`) AS `__value{idx}`" for idx, group in enumerate(groups)
+    )
+    prefix = f"SELECT {query_hints} " if query_hints else "SELECT "
+    return (
+        f"{prefix}t, sum(Count) AS `__count`,"
+        f" if(`__rank` <= {int(limit)}, `__rank`, 0) AS `__group`,"
+        f" max(`__rank`) AS `__groups`, {values} FROM ({ranked}) AS `__ranks`"
+        " GROUP BY t, `__group`"
+    )
+
+
+def fold_groups(
+    data: Dict[str, List[int]], limit: Optional[int]
+) -> Tuple[Dict[str, List[int]], int]:
+    """
+    Keeps the `limit` series with the highest totals and sums the others into
+    the OTHER_GROUP series. Returns the series and the number of folded ones.
+    """
+    if not limit or len(data) <= limit:
+        return data, 0
+    # a bounded heap, the totals of all series are never sorted
+    top = set(heapq.nlargest(limit, data, key=lambda name: sum(data[name])))
+    result = {}
+    other = None
+    folded = 0
+    for name, series in data.items():
+        if name in top:
+            result[name] = series
+            continue
+        if name != OTHER_GROUP:
+            folded += 1
+        if other is None:
+            other = list(series)
+        else:
+            other = [a + b for a, b in zip(other, series)]
+    if OTHER_GROUP in result:
+        other = [a + b for a, b in zip(result.pop(OTHER_GROUP), other)]
+    result[OTHER_GROUP] = other
+    return result, folded
+
+
+def get_graph_interval(time_from: int, time_to: int) -> Optional[int]:
+    """
+    Returns the bucket interval in seconds for the requested time range, or
+    None when the range is short enough to be shown without bucketing.
+    """
+    seconds = int(time_to - time_from) / 1000
+    if seconds <= 15:
+        return None
+    max_points = 150
+    stats_interval_seconds = round(seconds / max_points)
+    if stats_interval_seconds == 0:
+        stats_interval_seconds = 1
+    return stats_interval_seconds
+
+
+def get_graph_buckets(time_from: int, time_to: int, interval_seconds: int) -> range:
+    """
+    Returns the epoch-aligned bucket starts (in milliseconds) covering the
+    requested time range.
+    """
+    step = interval_seconds * 1000
+    return range(time_from // step * step, time_to // step * step + step, step)
+
+
+def build_graph_response(
+    result_rows, time_from: int, time_to: int, graph_query: GraphQuery
+) -> GraphDataResponse:
+    unique_ts = {time_from, time_to}
+    if graph_query.buckets is not None:
+        unique_ts.update(graph_query.buckets)
+    else:
+        result_rows = list(result_rows)
+        unique_ts.update(item[0] for item in result_rows)
+    timestamps = sorted(unique_ts)
+    index_by_ts = {ts: idx for idx, ts in enumerate(timestamps)}
+
+    total = 0
+    groups = 0
+    data = {}
+    for item in result_rows:
+        if graph_query.grouped and graph_query.group_limit:
+            ts, count, rank, item_groups, *values = item
+            groups = max(groups, item_groups or 0)
+            groupper = get_group_name(values) if rank else OTHER_GROUP
+        elif graph_query.grouped:
+            ts, count, *values = item
+            groupper = get_group_name(values)
+        else:
+            ts, count = item
+            groupper = "Rows"
+
+        idx = index_by_ts.get(ts)
+        if idx is None:
+            continue
+        series = data.get(groupper)
+        if series is None:
+            series = [0] * len(timestamps)
+            data[groupper] = series
+        series[idx] += count
+        total += count
+
+    return GraphDataResponse(
+        timestamps=timestamps,
+        data=data,
+        total=total,
+        other_groups=(
+            max(groups - graph_query.group_limit, 0) if graph_query.group_limit else 0
+        ),
+    )
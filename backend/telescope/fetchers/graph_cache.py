@@ -0,0 +1,157 @@
+"""
+Per-bucket cache of graph counts.
+
+Counts of closed buckets (fully inside the requested range and older than
+`closed_after_seconds`) never change, so repeated graph requests for sliding
+ranges like `now-24h` only query the head and tail buckets that are not cached
+yet. Entries are stored in the django cache, shared by all workers.
+"""
+
+import json
+import time
+import hashlib
+import logging
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from telescope import metrics
+from telescope.fetchers.graph import (
+    GraphQuery,
+    build_graph_response,
+    fold_groups,
+    get_graph_buckets,
+    get_graph_interval,
+    get_group_name,
+)
+from telescope.fetchers.request import GraphDataRequest
+from telescope.fetchers.response import GraphDataResponse
+
+logger = logging.getLogger("telescope.fetchers.graph_cache")
+
+Window = Tuple[int, int]
+
+
+def is_enabled(request: GraphDataRequest) -> bool:
+    if not request.use_cache:
+        return False
+    if not settings.CONFIG["fetchers"]["graph_cache"]["enabled"]:
+        return False
+    return get_graph_interval(request.time_from, request.time_to) is not None
+
+
+def get_cache_key(request: GraphDataRequest, key_parts: List[Any]) -> str:
+    source = request.source
+    digest = hashlib.sha256(
+        json.dumps(
+            [
+                source.kind,
+                source.time_column,
+                source.date_column,
+                source.data,
+                request.raw_query or "",
+                get_graph_interval(request.time_from, request.time_to),
+            ]
+            + key_parts,
+            sort_keys=True,
+            default=str,
+        ).encode()
+    ).hexdigest()
+    return f"graph:{source.id}:{digest}"
+
+
+def get_cached_run(cacheable: List[int], cached: Dict[int, Dict]) -> List[int]:
+    """Returns the longest run of consecutive cacheable buckets already cached."""
+    best = []
+    current = []
+    for ts in cacheable:
+        if ts in cached:
+            current.append(ts)
+            if len(current) > len(best):
+                best = current
+        else:
+            current = []
+    return best
+
+
+def fetch_graph(
+    request: GraphDataRequest,
+    key_parts: List[Any],
+    grouped: bool,
+    query_window: Callable[[Window], Iterable[tuple]],
+) -> GraphDataResponse:
+    """
+    Returns the graph for the request, reusing cached closed buckets.
+
+    `key_parts` identify the compiled query (filter and group by expressions),
+    `query_window` runs the histogram query for a (lower, upper) window of the
+    requested range and returns its (ts, count[, *group values]) rows, with
+    groups not folded: they are folded after the windows were merged.
+    """
+    config = settings.CONFIG["fetchers"]["graph_cache"]
+    interval = get_graph_interval(request.time_from, request.time_to)
+    step = interval * 1000
+    buckets = get_graph_buckets(request.time_from, request.time_to, interval)
+    closed_before = int(time.time() * 1000) - config["closed_after_seconds"] * 1000
+    cacheable = [
+        ts
+        for ts in buckets
+        if ts >= request.time_from
+        and ts + step - 1 <= request.time_to
+        and ts + step <= closed_before
+    ]
+
+    key = get_cache_key(request, key_parts)
+    cached = cache.get(key) or {}
+    run = get_cached_run(cacheable, cached)
+
+    if run:
+        windows = []
+        if run[0] > request.time_from:
+            windows.append((request.time_from, run[0]))
+        if run[-1] + step <= request.time_to:
+            windows.append((run[-1] + step, request.time_to))
+    else:
+        windows = [(request.time_from, request.time_to)]
+
+    counts: Dict[int, Dict[Optional[str], int]] = {ts: dict(cached[ts]) for ts in run}
+    for window in windows:
+        for item in query_window(window):
+            if grouped:
+                ts, count, *values = item
+                groupper = get_group_name(values)
+            else:
+                ts, count = item
+                groupper = None
+            if not count:
+                continue
+            series = counts.setdefault(ts, {})
+            series[groupper] = series.get(groupper, 0) + count
+
+    metrics.incr("graph_cache_buckets_hit", len(run))
+    metrics.incr("graph_cache_buckets_miss", len(cacheable) - len(run))
+    if len(run) < len(cacheable):
+        # only buckets of the current range are kept, so entries stay bounded
+        cache.set(
+            key,
+            {ts: counts.get(ts, {}) for ts in cacheable},
+            config["ttl"],
+        )
+
+    result_rows = []
+    for ts, series in counts.items():
+        for groupper, count in series.items():
+            result_rows.append((ts, count, groupper) if grouped else (ts, count))
+    response = build_graph_response(
+        result_rows,
+        request.time_from,
+        request.time_to,
+        GraphQuery(sql="", grouped=grouped, buckets=buckets),
+    )
+    if grouped and request.group_limit:
+        # buckets hold the counts of all groups, the top ones depend on the range
+        response.data, response.other_groups = fold_groups(
+            response.data, request.group_limit
+        )
+    return response
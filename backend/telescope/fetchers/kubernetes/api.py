@@ -25,6 +25,9 @@ from kubernetes import client as kubernetes_client
 
 import yaml
 
+from telescope import metrics
+from telescope.fetchers.cancellation import CancelToken
+
 logger = logging.getLogger("telescope.fetchers.kubernetes.api")
 
 CACHE_TTL = 30
@@ -172,6 +175,7 @@ class KubeHelper:
         pods_flyql_filter: str = "",
         selected_contexts: List[str] = [],
         selected_namespaces: List[str] = [],
+        cancel_token: Optional[CancelToken] = None,
     ):
         self.conn_id = conn_id
         self.source_id = source_id
@@ -186,6 +190,7 @@ class KubeHelper:
         self.pods_flyql_filter = pods_flyql_filter
         self.selected_contexts = set(selected_contexts)
         self.selected_namespaces = set(selected_namespaces)
+        self.cancel_token = cancel_token
 
         self.context_flyql_filter_ast = None
         self.namespace_flyql_filter_ast = None
@@ -482,6 +487,9 @@ class KubeHelper:
 
         return results, errors
 
+    def is_cancelled(self) -> bool:
+        return self.cancel_token is not None and self.cancel_token.is_cancelled()
+
     def get_logs(
         self,
         since_seconds: int,
@@ -522,6 +530,8 @@ class KubeHelper:
                 except Exception as e:
                     errors[ctx] = e
 
+        if self.cancel_token is not None:
+            self.cancel_token.check()
         return all_logs, errors
 
     def _get_logs_for_context(
@@ -546,6 +556,8 @@ class KubeHelper:
         def fetch_container_logs(
             namespace: str, pod_name: str, container: str, pod_data: Dict
         ) -> Tuple[str, str, str, List[LogEntry]]:
+            if self.is_cancelled():
+                return namespace, pod_name, container, []
             entries = self._fetch_single_container_logs(
                 client,
                 context_name,
@@ -570,6 +582,12 @@ class KubeHelper:
                 for ns, pod, cont, pod_data in fetch_tasks
             }
             for future in as_completed(future_to_task):
+                if self.is_cancelled():
+                    # reads which have not started yet are dropped, the
+                    # running ones finish but their results are discarded
+                    skipped = sum(future.cancel() for future in future_to_task)
+                    metrics.incr("kubernetes_log_reads_cancelled", skipped)
+                    break
                 ns, pod, cont = future_to_task[future]
                 try:
                     _, _, _, entries = future.result()
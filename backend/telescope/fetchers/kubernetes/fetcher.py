@@ -11,6 +11,8 @@ from telescope.utils import get_telescope_column
 from telescope.fetchers.fetcher import BaseFetcher
 import json
 from telescope.fetchers.models import Row
+from telescope.fetchers import pagination
+from telescope.fetchers.graph import fold_groups
 from telescope.fetchers.request import DataRequest, GraphDataRequest
 from telescope.fetchers.response import (
     AutocompleteResponse,
@@ -263,6 +265,11 @@ class Fetcher(BaseFetcher):
 
     @classmethod
     def fetch_data(cls, request: DataRequest, tz):
+        # a cursor points into the complete result read for the first page
+        cached_rows = pagination.get_cached_rows(request.cursor)
+        if cached_rows is not None:
+            return cls._get_page(request, cached_rows, cached=True)
+
         conn_data = request.source.conn.data
         source_data = request.source.data
 
@@ -297,6 +304,7 @@ class Fetcher(BaseFetcher):
             selected_namespaces=ensure_list(
                 request.context_columns.get("namespaces", [])
             ),
+            cancel_token=request.cancel_token,
         )
 
         try:
@@ -386,14 +394,17 @@ class Fetcher(BaseFetcher):
                 rows.append(row)
 
         rows = sorted(rows, key=lambda r: r.time["unixtime"], reverse=True)
-        total_rows = len(rows)
-        rows = rows[: request.limit]
+        return cls._get_page(request, rows)
 
+    @classmethod
+    def _get_page(cls, request, rows, cached=False) -> DataResponse:
+        page, cursor = pagination.paginate(
+            rows, request.limit, request.cursor, cached=cached
+        )
         message = None
-        if total_rows > request.limit:
-            message = f"Displaying limited results: Only {request.limit} out of {total_rows} matching entries are shown."
-
-        return DataResponse(rows=rows, message=message)
+        if len(rows) > request.limit:
+            message = f"Displaying limited results: Only {request.limit} out of {len(rows)} matching entries are shown."
+        return DataResponse(rows=page, message=message, cursor=cursor)
 
     @classmethod
     def fetch_graph_data(cls, request: GraphDataRequest):
@@ -443,6 +454,7 @@ class Fetcher(BaseFetcher):
             selected_namespaces=ensure_list(
                 request.context_columns.get("namespaces", [])
             ),
+            cancel_token=request.cancel_token,
         )
 
         try:
@@ -553,22 +565,25 @@ class Fetcher(BaseFetcher):
             else:
                 all_rows.append(row)
 
-        group_by_field = request.group_by[0] if request.group_by else None
-        use_severity_grouping = not group_by_field
+        group_by_fields = request.group_by or []
+        use_severity_grouping = not group_by_fields
         graph_timestamps, graph_data, graph_total = generate_graph_from_rows(
             all_rows,
             request.time_from,
             request.time_to,
-            group_by_field,
+            group_by_fields,
             group_by_severity=use_severity_grouping,
         )
+        graph_data, graph_other_groups = fold_groups(graph_data, request.group_limit)
 
         all_rows = sorted(all_rows, key=lambda r: r.time["unixtime"], reverse=True)
-        limited_rows = all_rows[: request.limit]
+        limited_rows, cursor = pagination.paginate(all_rows, request.limit)
 
         return DataAndGraphDataResponse(
             rows=limited_rows,
             graph_timestamps=graph_timestamps,
             graph_data=graph_data,
             graph_total=graph_total,
+            graph_other_groups=graph_other_groups,
+            cursor=cursor,
         )
@@ -1,5 +1,6 @@
 import json
-from typing import List, Dict, Any, Sequence
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Sequence, Tuple, Union
 from zoneinfo import ZoneInfo
 
 from telescope.models import Source
@@ -10,13 +11,76 @@ from telescope.constants import (
     SOURCE_BODY_COL_NAME,
     SOURCE_SEVERITY_COL_NAME,
 )
-from telescope.fetchers.utils import extract_severity_with_rules, normalize_body_to_dict
+from telescope.fetchers import severity as severity_rules
 
 import logging
 
 logger = logging.getLogger("telescope.models")
 
 
+def format_time(dt: datetime, tz: ZoneInfo = UTC_ZONE) -> Dict[str, Any]:
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=tz)
+    return {
+        "unixtime": int(dt.timestamp() * 1000),
+        "datetime": dt.strftime("%Y-%m-%d %H:%M:%S"),
+        "microseconds": dt.strftime("%f"),
+    }
+
+
+def format_times(
+    values: Sequence[datetime], tz: ZoneInfo = UTC_ZONE
+) -> List[Dict[str, Any]]:
+    """
+    Bulk version of format_time for a whole time column.
+
+    Values of a column share the same timezone, so the formatted datetime
+    string is computed once per distinct second.
+    """
+    result = []
+    datetimes_by_second = {}
+    for dt in values:
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=tz)
+        unixtime = int(dt.timestamp() * 1000)
+        second = unixtime // 1000
+        formatted = datetimes_by_second.get(second)
+        if formatted is None:
+            formatted = dt.strftime("%Y-%m-%d %H:%M:%S")
+            datetimes_by_second[second] = formatted
+        result.append(
+            {
+                "unixtime": unixtime,
+                "datetime": formatted,
+                "microseconds": f"{dt.microsecond:06d}",
+            }
+        )
+    return result
+
+
+def is_propbably_jsonstring(value) -> bool:
+    if not isinstance(value, str):
+        return False
+    if value.startswith("{") and value.endswith("}"):
+        return True
+    if value.startswith("[") and value.endswith("["):
+        return True
+
+    return False
+
+
+def load_jsonstring(name: str, value: str) -> Any:
+    try:
+        return json.loads(value)
+    except Exception:
+        logger.error(
+            "Failed to json.loads(value) for JSON-treated column '%s', %s",
+            name,
+            type(value),
+        )
+        return value
+
+
 class Row:
     def __init__(
         self,
@@ -25,6 +89,7 @@ class Row:
         values: Sequence[Any],
         tz: ZoneInfo = UTC_ZONE,
         severity: str = None,
+        time: Optional[Dict[str, Any]] = None,
     ):
         self.source = source
 
@@ -32,13 +97,15 @@ class Row:
         for key, value in zip(selected_columns, values):
             self.data[key] = value
 
+        # severity rules and body normalization share one parse of the body
+        parsed = severity_rules.NOT_PARSED
         if (
             source.has_capability(SOURCE_CAPABILITY_SEVERITY_RULES)
             and SOURCE_BODY_COL_NAME in self.data
             and source.severity_rules
         ):
-            severity = extract_severity_with_rules(
-                self.data[SOURCE_BODY_COL_NAME], source.severity_rules
+            severity, parsed = severity_rules.get_program(source).extract(
+                self.data[SOURCE_BODY_COL_NAME]
             )
 
         if (
@@ -46,21 +113,19 @@ class Row:
             and SOURCE_BODY_COL_NAME in self.data
             and isinstance(self.data[SOURCE_BODY_COL_NAME], str)
         ):
-            self.data[SOURCE_BODY_COL_NAME] = normalize_body_to_dict(
-                self.data[SOURCE_BODY_COL_NAME]
+            body = self.data[SOURCE_BODY_COL_NAME]
+            if parsed is severity_rules.NOT_PARSED:
+                parsed = severity_rules.parse_object(body)
+            self.data[SOURCE_BODY_COL_NAME] = (
+                parsed if parsed is not None else {"message": body}
             )
 
         self.record_id = self.data.get(source.uniq_column) or self.data.get(
             source._record_pseudo_id_column
         )
-        dt = self.data[source.time_column]
-        if dt.tzinfo is None:
-            dt = dt.replace(tzinfo=tz)
-        self.time = {
-            "unixtime": int(dt.timestamp() * 1000),
-            "datetime": dt.strftime("%Y-%m-%d %H:%M:%S"),
-            "microseconds": dt.strftime("%f"),
-        }
+        if time is None:
+            time = format_time(self.data[source.time_column], tz)
+        self.time = time
         if (
             source.has_capability(SOURCE_CAPABILITY_SEVERITY_RULES)
             and SOURCE_BODY_COL_NAME in self.data
@@ -72,6 +137,8 @@ class Row:
         self.severity = severity if severity is not None else self.calculate_severity()
 
     def calculate_severity(self) -> str:
+        if self.source._record_severity_column in self.data:
+            return self.data[self.source._record_severity_column]
         if self.source.severity_column:
             return self.data.get(self.source.severity_column, "")
         return ""
@@ -81,35 +148,234 @@ class Row:
         return json.dumps(self.as_dict(), default=str)
 
     def is_propbably_jsonstring(self, value):
-        if not isinstance(value, str):
-            return False
-        if value.startswith("{") and value.endswith("}"):
-            return True
-        if value.startswith("[") and value.endswith("["):
-            return True
-
-        return False
+        return is_propbably_jsonstring(value)
 
     def as_dict(self) -> Dict:
         data = {}
-        for name, source_column in self.source._columns.items():
-            if source_column.jsonstring and self.is_propbably_jsonstring(
-                self.data[name]
-            ):
-                try:
-                    value = json.loads(self.data[name])
-                except Exception:
-                    value = self.data[name]
-                    logger.error(
-                        "Failed to json.loads(value) for JSON-treated column '%s', %s",
-                        name,
-                        type(self.data[name]),
+        catalog = self.source.column_catalog
+        jsonstring_columns = catalog.jsonstring_columns
+        for name in catalog.columns:
+            if name not in self.data:
+                # column was not selected by the fetcher
+                continue
+            value = self.data[name]
+            if name in jsonstring_columns and is_propbably_jsonstring(value):
+                value = load_jsonstring(name, value)
+            data[name] = value
+        return {
+            "time": self.time,
+            SOURCE_SEVERITY_COL_NAME: self.severity,
+            "data": data,
+        }
+
+
+class RowBatch:
+    """
+    Rows of one query result sharing the selected columns, their index and
+    the facts about the source, instead of a data dict per row. Values are
+    kept as the tuples received from the database and the times of the
+    whole batch are formatted at once.
+    """
+
+    __slots__ = (
+        "source",
+        "columns",
+        "index",
+        "values",
+        "times",
+        "uniq_position",
+        "pseudo_id_position",
+        "severity_position",
+        "output_columns",
+    )
+
+    def __init__(
+        self,
+        source: Source,
+        selected_columns: Sequence[str],
+        values: Sequence[Sequence[Any]],
+        times: List[Dict[str, Any]],
+    ):
+        self.source = source
+        self.columns = tuple(selected_columns)
+        self.index = {name: idx for idx, name in enumerate(self.columns)}
+        self.values = values
+        self.times = times
+        self.uniq_position = self.index.get(source.uniq_column)
+        self.pseudo_id_position = self.index.get(source._record_pseudo_id_column)
+        self.severity_position = self.index.get(source._record_severity_column)
+        if self.severity_position is None and source.severity_column:
+            self.severity_position = self.index.get(source.severity_column)
+        # resolved on the first as_dict, rows are not always rendered
+        self.output_columns: Optional[Tuple[Tuple[str, int, bool], ...]] = None
+
+    def get_output_columns(self) -> Tuple[Tuple[str, int, bool], ...]:
+        """Returns (name, position, jsonstring) of the columns rows render."""
+        if self.output_columns is None:
+            catalog = self.source.column_catalog
+            self.output_columns = tuple(
+                (name, self.index[name], name in catalog.jsonstring_columns)
+                for name in catalog.columns
+                if name in self.index
+            )
+        return self.output_columns
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def row(self, position: int) -> Sequence[Any]:
+        return self.values[position]
+
+    def value(self, position: int, idx: int) -> Any:
+        return self.values[position][idx]
+
+    def column(self, idx: int, start: int, stop: int) -> List[Any]:
+        return [item[idx] for item in self.values[start:stop]]
+
+    def get_columns(
+        self, start: int, stop: int
+    ) -> Tuple[List[Dict[str, Any]], List[Any], Dict[str, List[Any]]]:
+        """
+        Returns the times, the severities and the rendered data columns of
+        the rows from start to stop, the columnar counterpart of `as_dict`.
+        """
+        if self.severity_position is None:
+            severities = [""] * (stop - start)
+        else:
+            severities = self.column(self.severity_position, start, stop)
+        data = {}
+        for name, idx, jsonstring in self.get_output_columns():
+            values = self.column(idx, start, stop)
+            if jsonstring:
+                values = [
+                    (
+                        load_jsonstring(name, value)
+                        if is_propbably_jsonstring(value)
+                        else value
                     )
-            else:
-                value = self.data[name]
+                    for value in values
+                ]
+            data[name] = values
+        return self.times[start:stop], severities, data
+
+    def rows(self) -> List["BatchRow"]:
+        return [BatchRow(self, position) for position in range(len(self))]
+
+
+class BlockBatch(RowBatch):
+    """
+    A `RowBatch` over a column block as received from the database: `values`
+    holds a sequence per selected column and rows are never transposed.
+    """
+
+    __slots__ = ()
+
+    def __len__(self) -> int:
+        return len(self.values[0]) if self.values else 0
+
+    def row(self, position: int) -> Sequence[Any]:
+        return tuple(column[position] for column in self.values)
+
+    def value(self, position: int, idx: int) -> Any:
+        return self.values[idx][position]
+
+    def column(self, idx: int, start: int, stop: int) -> List[Any]:
+        return list(self.values[idx][start:stop])
+
+
+class BatchRow:
+    """A row of a `RowBatch`, with the same interface as `Row`."""
+
+    __slots__ = ("batch", "position")
+
+    def __init__(self, batch: RowBatch, position: int):
+        self.batch = batch
+        self.position = position
+
+    @property
+    def source(self) -> Source:
+        return self.batch.source
+
+    @property
+    def data(self) -> Dict[str, Any]:
+        return dict(zip(self.batch.columns, self.batch.row(self.position)))
+
+    @property
+    def time(self) -> Dict[str, Any]:
+        return self.batch.times[self.position]
+
+    @property
+    def record_id(self) -> Any:
+        batch = self.batch
+        if batch.uniq_position is not None:
+            record_id = batch.value(self.position, batch.uniq_position)
+            if record_id:
+                return record_id
+        if batch.pseudo_id_position is not None:
+            return batch.value(self.position, batch.pseudo_id_position)
+        return None
+
+    @property
+    def severity(self) -> Any:
+        if self.batch.severity_position is None:
+            return ""
+        return self.batch.value(self.position, self.batch.severity_position)
+
+    @property
+    def as_json(self) -> str:
+        return json.dumps(self.as_dict(), default=str)
+
+    def as_dict(self) -> Dict:
+        values = self.batch.row(self.position)
+        data = {}
+        for name, idx, jsonstring in self.batch.get_output_columns():
+            value = values[idx]
+            if jsonstring and is_propbably_jsonstring(value):
+                value = load_jsonstring(name, value)
             data[name] = value
         return {
             "time": self.time,
             SOURCE_SEVERITY_COL_NAME: self.severity,
             "data": data,
         }
+
+
+def transforms_rows(source: Source, selected_columns: Sequence[str]) -> bool:
+    """
+    Returns True when the source extracts severities from or normalizes the
+    body of every row, which needs a `Row` per value tuple.
+    """
+    return SOURCE_BODY_COL_NAME in selected_columns and (
+        source.has_capability(SOURCE_CAPABILITY_SEVERITY_RULES)
+        or source.has_capability(SOURCE_CAPABILITY_NORMALIZE_BODY)
+    )
+
+
+def build_rows(
+    source: Source,
+    selected_columns: Sequence[str],
+    values: Sequence[Sequence[Any]],
+    tz: ZoneInfo = UTC_ZONE,
+    times: Optional[List[Dict[str, Any]]] = None,
+) -> List[Union[Row, BatchRow]]:
+    """
+    Builds the rows of a query result, as a `RowBatch` unless the source
+    transforms every row, see `transforms_rows`.
+    """
+    if not values:
+        return []
+    if times is None:
+        time_idx = list(selected_columns).index(source.time_column)
+        times = format_times([item[time_idx] for item in values], tz)
+    if transforms_rows(source, selected_columns):
+        return [
+            Row(
+                source=source,
+                selected_columns=selected_columns,
+                values=item,
+                tz=tz,
+                time=time,
+            )
+            for item, time in zip(values, times)
+        ]
+    return RowBatch(source, selected_columns, values, times).rows()
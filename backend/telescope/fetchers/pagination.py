@@ -0,0 +1,213 @@
+"""
+Cursor pagination of data requests.
+
+A cursor is an opaque token returned with a full page of rows, passing it
+back fetches the next page only.
+
+Database fetchers use keyset cursors: the time and uniq column values of the
+last row, the next page is selected with `(time, uniq) < (last_time,
+last_uniq)`. Sources without a uniq column get no cursor, rows sharing a time
+value have no stable order a next page could continue from.
+
+Fetchers reading logs into memory (Docker, Kubernetes) keep the complete
+sorted result of the first page in a per-process cache and their cursor points
+into it, so next pages do not read the logs again. When the result is gone
+(expired, or served by another worker) the cursor is rejected as expired: the
+offset of a cursor is only meaningful in its own result, the logs read again
+would be paged from the first page.
+"""
+
+import json
+import math
+import time
+import uuid
+import base64
+import binascii
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from threading import Lock
+from typing import Any, Callable, List, Optional, Tuple
+
+from django.conf import settings
+
+from telescope import metrics
+from telescope.constants import UTC_ZONE
+
+EPOCH = datetime(1970, 1, 1, tzinfo=UTC_ZONE)
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def is_cursor_value(value: Any) -> bool:
+    """Tells whether the value can be the uniq column value of a cursor."""
+    if value is None or isinstance(value, str):
+        return True
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return False
+    return math.isfinite(value)
+
+
+class Cursor:
+    def __init__(
+        self,
+        time: Optional[int] = None,
+        uniq: Any = None,
+        offset: int = 0,
+        result_id: Optional[str] = None,
+    ):
+        # microseconds since the epoch of the last returned row
+        self.time = time
+        self.uniq = uniq
+        # the position in the result set when it is cached
+        self.offset = offset
+        self.result_id = result_id
+
+    def encode(self) -> str:
+        data = {"t": self.time, "u": self.uniq, "o": self.offset, "r": self.result_id}
+        payload = json.dumps(
+            {key: value for key, value in data.items() if value is not None},
+            separators=(",", ":"),
+        )
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+    @classmethod
+    def decode(cls, value: str) -> "Cursor":
+        try:
+            payload = base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+            data = json.loads(payload)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise InvalidCursor("invalid cursor")
+        if not isinstance(data, dict):
+            raise InvalidCursor("invalid cursor")
+        time_value = data.get("t")
+        uniq = data.get("u")
+        offset = data.get("o", 0)
+        result_id = data.get("r")
+        if (
+            (time_value is not None and not isinstance(time_value, int))
+            or isinstance(time_value, bool)
+            or not is_cursor_value(uniq)
+            or not isinstance(offset, int)
+            or isinstance(offset, bool)
+            or offset < 0
+            or (result_id is not None and not isinstance(result_id, str))
+            or (time_value is None and result_id is None)
+        ):
+            raise InvalidCursor("invalid cursor")
+        return cls(time=time_value, uniq=uniq, offset=offset, result_id=result_id)
+
+
+def get_time_micros(value: datetime) -> int:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=UTC_ZONE)
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+
+def get_cursor_value(value: Any) -> Any:
+    """Returns the uniq column value as stored in the cursor."""
+    if isinstance(value, bool):
+        return int(value)
+    if is_cursor_value(value):
+        return value
+    # UUIDs, decimals and other values are compared as string literals
+    return str(value)
+
+
+def get_cursor_literal(value: Any, escape: Callable[[str], str]) -> str:
+    """Returns the uniq column value of a cursor as an SQL literal."""
+    if not is_cursor_value(value):
+        raise InvalidCursor("invalid cursor")
+    if value is None or isinstance(value, str):
+        return escape(value)
+    # numbers are formatted here, never passed to `escape` as they are
+    return repr(value)
+
+
+def get_next_cursor(source, rows: List, limit: int) -> Optional[str]:
+    """
+    Returns the keyset cursor of the page after `rows`, None on the last page
+    and for sources without a uniq column.
+    """
+    if not rows or len(rows) < limit or not source.uniq_column:
+        return None
+    return Cursor(
+        time=get_time_micros(rows[-1].data[source.time_column]),
+        uniq=get_cursor_value(rows[-1].data[source.uniq_column]),
+    ).encode()
+
+
+class ResultSetCache:
+    """Bounded LRU of complete sorted results, expired after `ttl` seconds."""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.items = OrderedDict()
+
+    @staticmethod
+    def get_config() -> dict:
+        return settings.CONFIG["fetchers"]["cursor"]
+
+    def put(self, rows: List) -> str:
+        result_id = uuid.uuid4().hex
+        config = self.get_config()
+        with self.lock:
+            self.items[result_id] = (time.monotonic() + config["result_ttl"], rows)
+            while len(self.items) > config["max_result_sets"]:
+                self.items.popitem(last=False)
+        return result_id
+
+    def has(self, result_id: str) -> bool:
+        with self.lock:
+            item = self.items.get(result_id)
+            return item is not None and item[0] >= time.monotonic()
+
+    def get(self, result_id: str) -> Optional[List]:
+        with self.lock:
+            item = self.items.get(result_id)
+            if item is None:
+                metrics.incr("cursor_result_set_misses")
+                return None
+            expires, rows = item
+            if expires < time.monotonic():
+                del self.items[result_id]
+                metrics.incr("cursor_result_set_misses")
+                return None
+            self.items.move_to_end(result_id)
+        metrics.incr("cursor_result_set_hits")
+        return rows
+
+
+result_sets = ResultSetCache()
+
+
+def get_cached_rows(cursor: Optional[Cursor]) -> Optional[List]:
+    if cursor is None or cursor.result_id is None:
+        return None
+    return result_sets.get(cursor.result_id)
+
+
+def is_expired(cursor: Cursor) -> bool:
+    """Tells whether the cursor points into a result which is not cached anymore."""
+    return cursor.result_id is not None and not result_sets.has(cursor.result_id)
+
+
+def paginate(
+    rows: List, limit: int, cursor: Optional[Cursor] = None, cached: bool = False
+) -> Tuple[List, Optional[str]]:
+    """
+    Returns the page of the complete sorted `rows` the cursor points to and
+    the cursor of the next page. The rows are cached when there is one,
+    `cached` tells they already are, under the result id of the cursor.
+
+    The offset of the cursor is applied to the rows of its cached result only,
+    rows read again, when the result expired after the cursor was validated,
+    are paged from the first page.
+    """
+    offset = cursor.offset if cursor is not None and cached else 0
+    page = rows[offset : offset + limit]
+    if offset + limit >= len(rows):
+        return page, None
+    result_id = cursor.result_id if cached else result_sets.put(rows)
+    return page, Cursor(offset=offset + limit, result_id=result_id).encode()
@@ -0,0 +1,194 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import tempfile
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from telescope import metrics
+
+logger = logging.getLogger("telescope.fetchers.pool")
+
+
+def get_data_hash(data: dict) -> str:
+    return hashlib.sha256(
+        json.dumps(data, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+class CertFiles:
+    """PEM files materialized once per connection data hash."""
+
+    def __init__(self, data_hash: str, data: dict, params: Dict[str, str]):
+        self.path = None
+        self.files = {}
+        for name, key in params.items():
+            if not data.get(name):
+                continue
+            if self.path is None:
+                self.path = tempfile.mkdtemp(prefix=f"telescope-{data_hash[:12]}-")
+            path = os.path.join(self.path, f"{name}.pem")
+            with open(path, "w") as fd:
+                fd.write(data[name])
+            os.chmod(path, 0o600)
+            self.files[key] = path
+
+    def cleanup(self):
+        if self.path:
+            shutil.rmtree(self.path, ignore_errors=True)
+            self.path = None
+
+
+class PooledClient:
+    def __init__(self, client: Any, cert_files: CertFiles):
+        self.client = client
+        self.cert_files = cert_files
+        self.last_used = time.monotonic()
+        # checkouts not released yet
+        self.users = 0
+        # evicted from the pool, closed once the last user released it
+        self.retired = False
+
+    def close(self):
+        try:
+            close = getattr(self.client, "close", None)
+            if close is not None:
+                close()
+        except Exception as err:
+            logger.exception("error while closing pooled client (ignoring): %s", err)
+        finally:
+            self.cert_files.cleanup()
+
+
+class ClientPool:
+    """
+    Per-process pool of long-lived clients.
+
+    Clients are keyed by connection id plus a hash of the connection data, so an
+    updated Connection never reuses a client built from stale settings.
+    The pool is bounded by `max_size` (least recently used clients are evicted
+    first) and clients unused for `idle_timeout` seconds are evicted.
+
+    Clients are checked out with `acquire` and given back with `release`.
+    An evicted or invalidated client still running queries of other threads
+    is closed when the last of them releases it.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        factory: Callable[[dict, Dict[str, str]], Any],
+        cert_params: Dict[str, str],
+        max_size: int = 32,
+        idle_timeout: int = 300,
+    ):
+        self.name = name
+        self.factory = factory
+        self.cert_params = cert_params
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self._clients: "OrderedDict[Tuple[Hashable, str], PooledClient]" = OrderedDict()
+        self._lock = Lock()
+
+    def _metric(self, name: str) -> str:
+        return f"{self.name}_pool_{name}"
+
+    def acquire(self, conn_id: Hashable, data: dict) -> PooledClient:
+        """Checks out the client of the connection, `release` gives it back."""
+        key = (conn_id, get_data_hash(data))
+        with self._lock:
+            closed = self._pop_idle()
+            pooled = self._clients.get(key)
+            if pooled is not None:
+                self._clients.move_to_end(key)
+                self._checkout(pooled)
+                metrics.incr(self._metric("hits"))
+        self._close_all(closed)
+        if pooled is not None:
+            return pooled
+
+        metrics.incr(self._metric("misses"))
+        cert_files = CertFiles(key[1], data, self.cert_params)
+        try:
+            client = self.factory(data, cert_files.files)
+        except Exception:
+            cert_files.cleanup()
+            raise
+        pooled = PooledClient(client, cert_files)
+
+        closed = []
+        with self._lock:
+            existing = self._clients.get(key)
+            if existing is not None:
+                # another thread won the race, keep its client
+                closed.append(pooled)
+                pooled = existing
+            else:
+                self._clients[key] = pooled
+                while len(self._clients) > self.max_size:
+                    _, oldest = self._clients.popitem(last=False)
+                    closed.extend(self._retire(oldest))
+            self._checkout(pooled)
+            metrics.set_gauge(self._metric("size"), len(self._clients))
+        self._close_all(closed)
+        return pooled
+
+    def release(self, pooled: PooledClient):
+        with self._lock:
+            pooled.users -= 1
+            pooled.last_used = time.monotonic()
+            closed = pooled.retired and pooled.users == 0
+        if closed:
+            pooled.close()
+
+    def invalidate(self, conn_id: Optional[Hashable] = None):
+        closed = []
+        with self._lock:
+            keys = [
+                key
+                for key in self._clients.keys()
+                if conn_id is None or key[0] == conn_id
+            ]
+            for key in keys:
+                closed.extend(self._retire(self._clients.pop(key)))
+            metrics.set_gauge(self._metric("size"), len(self._clients))
+        self._close_all(closed)
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = len(self._clients)
+        return {
+            "size": size,
+            "max_size": self.max_size,
+            "hits": metrics.get_counter(self._metric("hits")),
+            "misses": metrics.get_counter(self._metric("misses")),
+            "evictions": metrics.get_counter(self._metric("evictions")),
+        }
+
+    def _checkout(self, pooled: PooledClient):
+        pooled.users += 1
+        pooled.last_used = time.monotonic()
+
+    def _retire(self, pooled: PooledClient) -> List[PooledClient]:
+        """Marks an evicted client, returns it when nobody uses it anymore."""
+        metrics.incr(self._metric("evictions"))
+        pooled.retired = True
+        return [pooled] if pooled.users == 0 else []
+
+    def _pop_idle(self) -> List[PooledClient]:
+        now = time.monotonic()
+        closed = []
+        for key, pooled in list(self._clients.items()):
+            if not pooled.users and now - pooled.last_used > self.idle_timeout:
+                closed.extend(self._retire(self._clients.pop(key)))
+        if closed:
+            metrics.set_gauge(self._metric("size"), len(self._clients))
+        return closed
+
+    def _close_all(self, closed: List[PooledClient]):
+        for pooled in closed:
+            pooled.close()
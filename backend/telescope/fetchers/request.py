@@ -1,5 +1,8 @@
-from typing import List, Dict
+from typing import List, Dict, Optional
 from telescope.models import Source
+from telescope.fetchers.response import GraphDataResponse
+from telescope.fetchers.cancellation import CancelToken
+from telescope.fetchers.pagination import Cursor
 from flyql.columns import ParsedColumn
 
 
@@ -29,6 +32,10 @@ class DataRequest:
         time_to: int,
         limit: int,
         context_columns: Dict,
+        histogram: Optional[GraphDataResponse] = None,
+        columns: Optional[List[str]] = None,
+        cancel_token: Optional[CancelToken] = None,
+        cursor: Optional[Cursor] = None,
     ):
         self.source = source
         self.query = query
@@ -37,6 +44,14 @@ class DataRequest:
         self.time_to = time_to
         self.limit = limit
         self.context_columns = context_columns
+        # graph of the same query, when known it is used as a hint
+        # for the time window holding the latest rows
+        self.histogram = histogram
+        # names of the source columns to read, all of them when not set
+        self.columns = columns
+        self.cancel_token = cancel_token
+        # position after the last row of the previous page
+        self.cursor = cursor
 
 
 class GraphDataRequest:
@@ -49,6 +64,9 @@ class GraphDataRequest:
         time_to: int,
         group_by: List[ParsedColumn],
         context_columns: Dict,
+        use_cache: bool = True,
+        cancel_token: Optional[CancelToken] = None,
+        group_limit: Optional[int] = None,
     ):
         self.source = source
         self.query = query
@@ -57,6 +75,10 @@ class GraphDataRequest:
         self.time_to = time_to
         self.group_by = group_by
         self.context_columns = context_columns
+        self.use_cache = use_cache
+        self.cancel_token = cancel_token
+        # group by values shown as separate series, the rest are folded
+        self.group_limit = group_limit
 
 
 class DataAndGraphDataRequest:
@@ -70,6 +92,10 @@ class DataAndGraphDataRequest:
         limit: int,
         group_by: List[ParsedColumn],
         context_columns: Dict,
+        use_cache: bool = True,
+        columns: Optional[List[str]] = None,
+        cancel_token: Optional[CancelToken] = None,
+        group_limit: Optional[int] = None,
     ):
         self.source = source
         self.query = query
@@ -79,3 +105,37 @@ class DataAndGraphDataRequest:
         self.limit = limit
         self.group_by = group_by
         self.context_columns = context_columns
+        self.use_cache = use_cache
+        self.columns = columns
+        self.cancel_token = cancel_token
+        self.group_limit = group_limit
+
+    def as_data_request(
+        self, histogram: Optional[GraphDataResponse] = None
+    ) -> DataRequest:
+        return DataRequest(
+            source=self.source,
+            query=self.query,
+            raw_query=self.raw_query,
+            time_from=self.time_from,
+            time_to=self.time_to,
+            limit=self.limit,
+            context_columns=self.context_columns,
+            histogram=histogram,
+            columns=self.columns,
+            cancel_token=self.cancel_token,
+        )
+
+    def as_graph_request(self) -> GraphDataRequest:
+        return GraphDataRequest(
+            source=self.source,
+            query=self.query,
+            raw_query=self.raw_query,
+            time_from=self.time_from,
+            time_to=self.time_to,
+            group_by=self.group_by,
+            context_columns=self.context_columns,
+            use_cache=self.use_cache,
+            cancel_token=self.cancel_token,
+            group_limit=self.group_limit,
+        )
@@ -1,5 +1,6 @@
 from typing import List, Dict, Optional
 from telescope.fetchers.models import Row
+from telescope.fetchers.stats import QueryStats
 
 
 class AutocompleteResponse:
@@ -18,10 +19,15 @@ class DataResponse:
         rows: List[Row],
         error: Optional[str] = None,
         message: Optional[str] = None,
+        cursor: Optional[str] = None,
+        stats: Optional[QueryStats] = None,
     ):
         self.rows = rows
         self.error = error
         self.message = message
+        # encoded cursor of the next page, None on the last one
+        self.cursor = cursor
+        self.stats = stats
 
 
 class GraphDataResponse:
@@ -30,10 +36,15 @@ class GraphDataResponse:
         timestamps: List[int],
         data: Dict[str, List[int]],
         total: int,
+        stats: Optional[QueryStats] = None,
+        other_groups: int = 0,
     ):
         self.timestamps = timestamps
         self.data = data
         self.total = total
+        self.stats = stats
+        # number of group by values folded into the __other__ series
+        self.other_groups = other_groups
 
 
 class DataAndGraphDataResponse:
@@ -45,6 +56,10 @@ class DataAndGraphDataResponse:
         graph_total: int,
         error: Optional[str] = None,
         message: Optional[str] = None,
+        cursor: Optional[str] = None,
+        stats: Optional[QueryStats] = None,
+        graph_stats: Optional[QueryStats] = None,
+        graph_other_groups: int = 0,
     ):
         self.rows = rows
         self.graph_timestamps = graph_timestamps
@@ -52,3 +67,7 @@ class DataAndGraphDataResponse:
         self.graph_total = graph_total
         self.error = error
         self.message = message
+        self.cursor = cursor
+        self.stats = stats
+        self.graph_stats = graph_stats
+        self.graph_other_groups = graph_other_groups
@@ -0,0 +1,357 @@
+"""
+Compiled severity rules.
+
+`extract_severity_with_rules` interprets the rules for every log line: it
+compiles regexes by pattern string, parses the body once per JSON rule and
+matches every remap pattern against every extracted value. A
+`SeverityProgram` does that work once per version of the rules of a
+source: regexes are compiled, JSON rules read one shared parse of the body,
+which is also the normalized body, and remapped values are memoized.
+Unlike `extract_severity_with_rules`, a rule extracting an empty value does
+not match, as a rule whose regex group took no part in the match.
+
+ClickHouse and StarRocks sources apply the rules to their severity column
+inside the query instead: `build_sql_expr` compiles them into one
+conditional expression, so severities are computed per row by the database
+and graphs grouped by the severity column are grouped by computed severity.
+The extracted value is computed once per row and bound to a name the remap
+rules read. JSON scalars are rendered as the program renders them, `None`,
+`True` and `False`, nested JSON values keep the rendering of the database.
+"""
+
+import json
+import re
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from telescope.constants import SOURCE_CAPABILITY_SQL_SEVERITY_RULES
+from telescope.models import Source
+
+UNKNOWN_SEVERITY = "UNKNOWN"
+
+# body not parsed yet
+NOT_PARSED = object()
+
+# distinct extracted values remembered with their remapped value
+MAX_REMAPPED_VALUES = 4096
+
+
+def parse_object(body: Any) -> Optional[dict]:
+    """Returns the body parsed as a JSON object, None if it is not one."""
+    if isinstance(body, str):
+        # skip json.loads for the usual plain text line
+        first = body[:1]
+        if first != "{" and not (first.isspace() and body.lstrip()[:1] == "{"):
+            return None
+    try:
+        parsed = json.loads(body)
+    except Exception:
+        return None
+    if isinstance(parsed, dict):
+        return parsed
+    return None
+
+
+class JsonRule:
+    __slots__ = ("path",)
+
+    def __init__(self, path: List[Any]):
+        self.path = tuple(path)
+
+    def apply(self, message: Any, parsed: Optional[dict]) -> Optional[str]:
+        current = parsed
+        if current is None:
+            return None
+        try:
+            for key in self.path:
+                if isinstance(current, dict) and key in current:
+                    current = current[key]
+                else:
+                    return None
+        except TypeError:
+            # unhashable key in the path
+            return None
+        return str(current) or None
+
+
+class RegexRule:
+    __slots__ = ("regex", "group")
+
+    def __init__(self, regex: re.Pattern, group: Any):
+        self.regex = regex
+        self.group = group
+
+    def apply(self, message: Any, parsed: Optional[dict]) -> Optional[str]:
+        try:
+            match = self.regex.search(message)
+            if match:
+                return match.group(self.group) or None
+        except (IndexError, TypeError):
+            return None
+        return None
+
+
+class SeverityProgram:
+    """
+    Severity rules compiled from the `severity_rules` of a source. Rules
+    which can never match, like invalid regexes or empty JSON paths, are
+    dropped while compiling.
+    """
+
+    def __init__(self, severity_rules: Any):
+        self.extract_rules: List[Any] = []
+        self.remap_rules: List[Tuple[Optional[str], Optional[re.Pattern], str]] = []
+        self.remapped: Dict[str, str] = {}
+        if not severity_rules or not isinstance(severity_rules, dict):
+            return
+        for rule in severity_rules.get("extract") or []:
+            compiled = compile_extract_rule(rule)
+            if compiled is not None:
+                self.extract_rules.append(compiled)
+        for rule in severity_rules.get("remap") or []:
+            compiled = compile_remap_rule(rule)
+            if compiled is not None:
+                self.remap_rules.append(compiled)
+
+    def extract(self, message: Any, parsed: Any = NOT_PARSED) -> Tuple[str, Any]:
+        """
+        Returns the severity of the message and its body parsed as a JSON
+        object, which stays NOT_PARSED if no JSON rule needed it.
+        """
+        for rule in self.extract_rules:
+            if parsed is NOT_PARSED and rule.__class__ is JsonRule:
+                parsed = parse_object(message)
+            extracted = rule.apply(message, parsed)
+            if extracted is not None:
+                return self.remap(extracted), parsed
+        return UNKNOWN_SEVERITY, parsed
+
+    def remap(self, value: str) -> str:
+        if not self.remap_rules:
+            return value
+        result = self.remapped.get(value)
+        if result is None:
+            result = self._remap(value)
+            if len(self.remapped) < MAX_REMAPPED_VALUES:
+                self.remapped[value] = result
+        return result
+
+    def _remap(self, value: str) -> str:
+        for literal, regex, target in self.remap_rules:
+            if literal is not None:
+                if value == literal:
+                    return target
+            elif regex.fullmatch(value):
+                return target
+        return value
+
+
+def compile_extract_rule(rule: Any) -> Optional[Any]:
+    if not isinstance(rule, dict):
+        return None
+    rule_type = rule.get("type")
+    if rule_type == "json":
+        path = rule.get("path", [])
+        if not isinstance(path, list) or not path:
+            return None
+        return JsonRule(path)
+    if rule_type == "regex":
+        flags = re.IGNORECASE if rule.get("case_insensitive", False) else 0
+        try:
+            regex = re.compile(rule.get("pattern"), flags)
+        except (re.error, TypeError):
+            return None
+        return RegexRule(regex, rule.get("group", 0))
+    return None
+
+
+def compile_remap_rule(
+    rule: Any,
+) -> Optional[Tuple[Optional[str], Optional[re.Pattern], str]]:
+    if not isinstance(rule, dict):
+        return None
+    pattern = rule.get("pattern")
+    target = rule.get("value")
+    if not pattern or not target:
+        return None
+    case_insensitive = rule.get("case_insensitive", False)
+    if (
+        not case_insensitive
+        and isinstance(pattern, str)
+        and re.escape(pattern) == pattern
+    ):
+        # a pattern without special characters fully matches itself only
+        return pattern, None, target
+    try:
+        regex = re.compile(pattern, re.IGNORECASE if case_insensitive else 0)
+    except (re.error, TypeError):
+        return None
+    return None, regex, target
+
+
+def get_program(source: Source) -> SeverityProgram:
+    """
+    Returns the compiled severity rules of the source, compiled again when
+    `severity_rules` is assigned a new value.
+    """
+    rules = source.severity_rules
+    cached = getattr(source, "_severity_program", None)
+    if not isinstance(cached, tuple) or cached[0] is not rules:
+        cached = (rules, SeverityProgram(rules))
+        source._severity_program = cached
+    return cached[1]
+
+
+class SqlDialect:
+    """
+    Builds the parts of the severity expression of a database. Patterns are
+    passed to the regex functions of the database as they are, which use
+    RE2 syntax instead of the syntax of Python regexes.
+    """
+
+    def __init__(self, escape: Callable[[str], str]):
+        self.escape = escape
+
+    def get_value(self, column: str) -> str:
+        return f"`{column}`"
+
+    def get_regex(self, pattern: str, case_insensitive: bool) -> str:
+        return self.escape(f"(?i){pattern}" if case_insensitive else pattern)
+
+    def json_value(self, value: str, path: Sequence[str]) -> str:
+        """
+        Returns the value at the path of a JSON object, strings unquoted and
+        other scalars rendered like Python does, empty when there is none.
+        """
+        raise NotImplementedError
+
+    def regex_value(self, value: str, regex: str, group: int) -> str:
+        """Returns the group of the first match, empty when there is none."""
+        raise NotImplementedError
+
+    def first_non_empty(self, values: List[str]) -> str:
+        """Returns the first value which is not empty, NULL if all are."""
+        raise NotImplementedError
+
+    def regex_match(self, value: str, regex: str) -> str:
+        raise NotImplementedError
+
+    def conditional(self, branches: List[Tuple[str, str]], default: str) -> str:
+        raise NotImplementedError
+
+    def remap_literals(
+        self, value: str, literals: List[Tuple[str, str]], default: str
+    ) -> str:
+        """Returns the target of the literal equal to the value, or default."""
+        return self.conditional(
+            [(f"{value} = {literal}", target) for literal, target in literals],
+            default,
+        )
+
+    def bind(self, value: str, build: Callable[[str, str], str]) -> str:
+        """
+        Returns the expression `build` makes of a value evaluated once.
+        `build` is given a reference to the value and the definition of the
+        value, which it uses exactly once, the reference anywhere else.
+        """
+        raise NotImplementedError
+
+    def if_empty(self, value: str, default: str) -> str:
+        raise NotImplementedError
+
+
+def get_sql_rules(source: Source) -> Optional[Dict[str, Any]]:
+    """Returns the severity rules the queries of the source apply, if any."""
+    rules = source.severity_rules
+    if (
+        not isinstance(rules, dict)
+        or not source.severity_column
+        or not source.has_capability(SOURCE_CAPABILITY_SQL_SEVERITY_RULES)
+    ):
+        return None
+    return rules
+
+
+def build_sql_expr(source: Source, dialect: SqlDialect) -> Optional[str]:
+    """
+    Returns the expression computing the severity of a row from the severity
+    column with the same rules as `SeverityProgram`, None without rules.
+    """
+    rules = get_sql_rules(source)
+    if rules is None:
+        return None
+    value = dialect.get_value(source.severity_column)
+    unknown = dialect.escape(UNKNOWN_SEVERITY)
+
+    extract_values = []
+    for rule in rules.get("extract") or []:
+        compiled = compile_extract_rule(rule)
+        if isinstance(compiled, JsonRule):
+            # keys of JSON objects are strings, other path items never match
+            if all(isinstance(key, str) for key in compiled.path):
+                extract_values.append(dialect.json_value(value, compiled.path))
+        elif (
+            isinstance(compiled, RegexRule)
+            and isinstance(compiled.group, int)
+            # databases reject groups the regex does not have, they never match
+            and 0 <= compiled.group <= compiled.regex.groups
+        ):
+            regex = dialect.get_regex(
+                compiled.regex.pattern, bool(compiled.regex.flags & re.IGNORECASE)
+            )
+            extract_values.append(dialect.regex_value(value, regex, compiled.group))
+    if not extract_values:
+        return unknown
+    # rules extracting an empty value do not match, as in `SeverityProgram`
+    extracted = dialect.first_non_empty(extract_values)
+
+    remap_rules = [
+        compiled
+        for compiled in map(compile_remap_rule, rules.get("remap") or [])
+        if compiled is not None
+    ]
+    if remap_rules:
+        extracted = dialect.bind(
+            extracted,
+            lambda value, definition: build_sql_remap(
+                dialect, remap_rules, value, definition
+            ),
+        )
+
+    # rows without severity show UNKNOWN, as rows of Docker and Kubernetes
+    return dialect.if_empty(extracted, unknown)
+
+
+def build_sql_remap(
+    dialect: SqlDialect,
+    remap_rules: List[Tuple[Optional[str], Optional[re.Pattern], str]],
+    value: str,
+    definition: str,
+) -> str:
+    """
+    Returns the expression remapping the extracted value, which is kept when
+    no rule matches. Rules are applied in order: consecutive literal rules
+    are looked up at once, the first of equal literals wins.
+    """
+    # runs of consecutive rules of the same kind, literals by their value
+    runs: List[Tuple[bool, Any]] = []
+    for literal, regex, target in remap_rules:
+        is_literal = literal is not None
+        if not runs or runs[-1][0] != is_literal:
+            runs.append((is_literal, {} if is_literal else []))
+        target = dialect.escape(str(target))
+        if is_literal:
+            runs[-1][1].setdefault(dialect.escape(literal), target)
+        else:
+            regex = dialect.get_regex(
+                f"^(?:{regex.pattern})$", bool(regex.flags & re.IGNORECASE)
+            )
+            runs[-1][1].append((dialect.regex_match(value, regex), target))
+
+    # the last run falls back to the value itself, which is defined there
+    expr = definition
+    for is_literal, run in reversed(runs):
+        if is_literal:
+            expr = dialect.remap_literals(value, list(run.items()), expr)
+        else:
+            expr = dialect.conditional(run, expr)
+    return expr
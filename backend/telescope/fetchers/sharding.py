@@ -0,0 +1,110 @@
+"""
+Time-sharded execution of long-range queries.
+
+A single query over a long range is bounded by what one query can read
+before its `max_execution_time`. With `sharded_execution` enabled on a
+source, ranges spanning several shards are split into time windows aligned
+to multiples of `shard_seconds`, days by default to match daily partitions,
+and the query of every shard runs concurrently on the pooled client of the
+connection, at most `max_workers` of them at a time.
+
+Shards are ordered newest first, so that the latest rows can be taken from
+the first shards and the remaining ones cancelled once enough were read.
+Shards still running then are stopped and waited for, so that no query of
+the request outlives its admission slot and its budget.
+"""
+
+import math
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+
+logger = logging.getLogger("telescope.fetchers.sharding")
+
+Window = Tuple[int, int]
+
+
+def get_config() -> dict:
+    return settings.CONFIG["fetchers"]["sharded_execution"]
+
+
+def split_range(
+    time_from: int, time_to: int, shard_ms: int, max_shards: int
+) -> List[Window]:
+    """
+    Returns windows covering the range, newest first, with bounds aligned to
+    multiples of the shard size. When the range spans more than `max_shards`
+    of them, shards are widened to several multiples instead.
+
+    As the windows of `get_time_windows`, only the first one includes its
+    upper bound, other ones end where the next newer one starts.
+    """
+    count = time_to // shard_ms - time_from // shard_ms + 1
+    if count > max_shards:
+        shard_ms *= math.ceil(count / max_shards)
+    lower = time_to // shard_ms * shard_ms
+    if lower == time_to and time_to > time_from:
+        # no shard holding only rows of the last millisecond
+        lower -= shard_ms
+    shards = []
+    upper = time_to
+    while True:
+        lower = max(lower, time_from)
+        shards.append((lower, upper))
+        if lower <= time_from:
+            return shards
+        upper = lower
+        lower -= shard_ms
+
+
+def get_shards(source, time_from: int, time_to: int) -> List[Window]:
+    """
+    Returns the shards of the range when the source runs sharded queries,
+    an empty list when the range is queried at once.
+    """
+    if not source.data.get("sharded_execution"):
+        return []
+    config = get_config()
+    shards = split_range(
+        time_from, time_to, config["shard_seconds"] * 1000, config["max_shards"]
+    )
+    if len(shards) < 2:
+        return []
+    return shards
+
+
+def iter_results(
+    func: Callable[[int, Window], Any],
+    shards: List[Window],
+    stop: Optional[Callable[[], Any]] = None,
+) -> Iterator[Any]:
+    """
+    Runs `func(idx, shard)` for every shard concurrently and yields the
+    results in the order of the shards, newest first.
+
+    When the consumer stops early or a shard fails, shards not started yet
+    are cancelled and `stop` is called to interrupt the running ones, which
+    are waited for before returning. Their results and errors are dropped.
+    """
+    executor = ThreadPoolExecutor(
+        max_workers=min(get_config()["max_workers"], len(shards)),
+        thread_name_prefix="shard",
+    )
+    futures = []
+    try:
+        futures = [
+            executor.submit(func, idx, shard) for idx, shard in enumerate(shards)
+        ]
+        for future in futures:
+            yield future.result()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        running = [future for future in futures if not future.done()]
+        if running and stop is not None:
+            try:
+                stop()
+            except Exception:
+                logger.exception("failed to stop running shards")
+        wait(running)
@@ -2,12 +2,14 @@ import csv
 import os
 import logging
 import tempfile
-from typing import Any, Dict, Optional
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
 import zoneinfo
 
 import mysql.connector
 
-from flyql.core.parser import parse, ParserError
+
+from flyql.core.parser import ParserError
 from flyql.core.exceptions import FlyqlError
 from flyql.generators.starrocks.generator import to_sql, Column
 
@@ -25,7 +27,26 @@ from telescope.fetchers.response import (
     GraphDataResponse,
 )
 from telescope.fetchers.fetcher import BaseFetcher
-from telescope.fetchers.models import Row
+from telescope.fetchers.models import build_rows
+from telescope.fetchers.stats import QueryStats
+from telescope.fetchers.graph import (
+    GraphQuery,
+    build_graph_response,
+    build_top_groups_sql,
+    get_graph_buckets,
+    get_group_by_columns,
+    get_graph_interval,
+)
+from telescope.fetchers import (
+    autocomplete_cache,
+    budget,
+    cancellation,
+    compiled_queries,
+    export,
+    graph_cache,
+    pagination,
+    severity,
+)
 
 from telescope.utils import convert_to_base_sr, get_telescope_column
 
@@ -69,6 +90,271 @@ def build_time_clause(time_column, date_column, time_from, time_to):
     return f"{date_clause}`{time_column}` BETWEEN to_datetime_ntz({time_from}, 3) and to_datetime_ntz({time_to}, 3)"
 
 
+def build_window_time_clause(time_column, date_column, time_from, time_to):
+    """Same as build_time_clause, but the upper bound is excluded."""
+    date_clause = ""
+    if date_column:
+        date_clause = f"`{date_column}` BETWEEN date(to_datetime_ntz({time_from}, 3)) and date(to_datetime_ntz({time_to}, 3))  AND "
+    return f"{date_clause}`{time_column}` >= to_datetime_ntz({time_from}, 3) and `{time_column}` < to_datetime_ntz({time_to}, 3)"
+
+
+def get_window_time_clause(source, time_from, time_to, window=None):
+    if window is None or window[1] == time_to:
+        return build_time_clause(
+            source.time_column,
+            source.date_column,
+            window[0] if window else time_from,
+            time_to,
+        )
+    return build_window_time_clause(
+        source.time_column,
+        source.date_column,
+        window[0],
+        window[1],
+    )
+
+
+def compile_query(source, query: str) -> compiled_queries.CompiledQuery:
+    return compiled_queries.compile_query(
+        source, query, "starrocks", flyql_starrocks_columns, to_sql
+    )
+
+
+def build_filter_clause(source, query: str) -> str:
+    if not query:
+        return "true"
+    return compile_query(source, query).sql
+
+
+def build_group_by_expr(group_by: ParsedColumn) -> str:
+    # If the name is the root name, ignore the presence of dots as we
+    # should assume the intent is to group by the identified column rather
+    # than a nested field.
+    if "." in group_by.name and group_by.root_name != group_by.name:
+        # Use the csv module to split respecting quotes
+        spl = list(csv.reader([group_by.name], delimiter=".", quotechar="'"))[0]
+        if group_by.is_map():
+            map_key = "']['".join(spl[1:])
+            return f"{group_by.root_name}['{map_key}']"
+        elif group_by.is_array():
+            array_index = int(".".join(spl[1]))
+            return f"{group_by.root_name}[{array_index}]"
+        elif group_by.is_json():
+            json_path = spl[1:]
+            # Starrocks documents that you double quote any json path elements
+            # that contain dots. Let's just do it unconditionally.
+            json_path = [f'"{x}"' for x in json_path]
+            json_path_str = "->".join([escape_param(x) for x in json_path])
+            return f"cast(`{group_by.root_name}`->{json_path_str} as string)"
+        elif group_by.jsonstring:
+            json_path = spl[1:]
+            # Starrocks documents that you double quote any json path elements
+            # that contain dots. Let's just do it unconditionally.
+            json_path = [f'"{x}"' for x in json_path]
+            json_path_str = "->".join([escape_param(x) for x in json_path])
+            return (
+                f"cast(parse_json(`{group_by.root_name}`)->{json_path_str} as string)"
+            )
+        else:
+            raise ValueError
+    return f"`{group_by.root_name}`"
+
+
+class SeveritySqlDialect(severity.SqlDialect):
+    def json_value(self, value: str, path: Sequence[str]) -> str:
+        # keys are double quoted, as they may contain dots
+        json_path = self.escape("$." + ".".join(f'"{key}"' for key in path))
+        # strings are quoted in the JSON text of a value, null and booleans not
+        return (
+            f"CASE json_string(json_query(parse_json({value}), {json_path})) "
+            "WHEN 'null' THEN 'None' WHEN 'true' THEN 'True' WHEN 'false' THEN 'False' "
+            f"ELSE get_json_string({value}, {json_path}) END"
+        )
+
+    def regex_value(self, value: str, regex: str, group: int) -> str:
+        return f"regexp_extract({value}, {regex}, {group})"
+
+    def first_non_empty(self, values: List[str]) -> str:
+        args = ", ".join(f"nullif({value}, '')" for value in values)
+        return f"coalesce({args})"
+
+    def regex_match(self, value: str, regex: str) -> str:
+        return f"{value} REGEXP {regex}"
+
+    def conditional(self, branches: List[Tuple[str, str]], default: str) -> str:
+        cases = " ".join(
+            f"WHEN {condition} THEN {value}" for condition, value in branches
+        )
+        return f"CASE {cases} ELSE {default} END"
+
+    def remap_literals(
+        self, value: str, literals: List[Tuple[str, str]], default: str
+    ) -> str:
+        cases = " ".join(
+            f"WHEN {literal} THEN {target}" for literal, target in literals
+        )
+        return f"CASE {value} {cases} ELSE {default} END"
+
+    def bind(self, value: str, build: Callable[[str, str], str]) -> str:
+        # expressions have no aliases, the value is passed to a lambda instead
+        return f"array_map(x -> {build('x', 'x')}, [{value}])[1]"
+
+    def if_empty(self, value: str, default: str) -> str:
+        return f"coalesce(nullif({value}, ''), {default})"
+
+
+SEVERITY_SQL_DIALECT = SeveritySqlDialect(escape_param)
+
+
+def build_severity_expr(source) -> Optional[str]:
+    return severity.build_sql_expr(source, SEVERITY_SQL_DIALECT)
+
+
+def get_group_by_expr(source, group_by: ParsedColumn) -> str:
+    # the severity column is grouped by the severity its rules compute
+    if group_by.name == source.severity_column:
+        severity_expr = build_severity_expr(source)
+        if severity_expr is not None:
+            return severity_expr
+    return build_group_by_expr(group_by)
+
+
+def get_group_by_key(source, group_by: List[ParsedColumn]) -> Optional[str]:
+    """Returns the group by expressions identifying cached graph counts."""
+    if not group_by:
+        return None
+    return ", ".join(get_group_by_expr(source, column) for column in group_by)
+
+
+def get_order_by_clause(source) -> str:
+    # the uniq column makes the order total, which keyset pagination relies on
+    if source.uniq_column:
+        return f"ORDER BY `{source.time_column}` DESC, `{source.uniq_column}` DESC"
+    return f"ORDER BY `{source.time_column}` DESC"
+
+
+def get_cursor_time(source, micros: int) -> str:
+    """Returns the cursor time as a value of the time column type."""
+    time_column_type = convert_to_base_sr(
+        source._columns[source.time_column].type.lower()
+    )
+    if time_column_type in ["int", "bigint", "largeint"]:
+        # numeric time columns hold milliseconds, see build_graph_query
+        return str(micros // 1000)
+    return f"to_datetime_ntz({micros}, 6)"
+
+
+def build_cursor_clause(source, cursor: pagination.Cursor) -> str:
+    last_time = get_cursor_time(source, int(cursor.time))
+    last_uniq = pagination.get_cursor_literal(cursor.uniq, escape_param)
+    return f"(`{source.time_column}` < {last_time} OR (`{source.time_column}` = {last_time} AND `{source.uniq_column}` < {last_uniq}))"
+
+
+def get_query_hints(source, request_type: str) -> str:
+    """
+    Returns the SET_VAR hint of the source settings and of the budget of the
+    request type, variables set in the source settings take precedence.
+    """
+    source_settings = source.data.get("settings") or ""
+    variables = [source_settings] if source_settings else []
+    names = {item.split("=", 1)[0].strip() for item in source_settings.split(",")}
+    for item in budget.get_starrocks_variables(budget.get_budget(source, request_type)):
+        if item.split("=", 1)[0] not in names:
+            variables.append(item)
+    if not variables:
+        return ""
+    return f"/*+ SET_VAR({', '.join(variables)}) */"
+
+
+def build_graph_query(
+    request: GraphDataRequest,
+    filter_clause: str,
+    window: Optional[Tuple[int, int]] = None,
+    fold: bool = True,
+) -> GraphQuery:
+    """
+    Returns the histogram query. When `window` is set, only its part of the
+    requested range is counted, with buckets of the whole range interval.
+
+    With a group limit, groups outside of the top ones are folded by the
+    query unless `fold` is False, e.g. for windows merged by the caller.
+    """
+    source = request.source
+    raw_where_clause = request.raw_query or "true"
+
+    # several columns group by their composite key
+    group_by = get_group_by_columns(request.group_by)
+    assert all(isinstance(column, ParsedColumn) for column in group_by)
+    group_by_values = [get_group_by_expr(source, column) for column in group_by]
+
+    time_clause = get_window_time_clause(
+        source, request.time_from, request.time_to, window
+    )
+    from_db_table = (
+        f"{source.data['catalog']}.{source.data['database']}.{source.data['table']}"
+    )
+
+    time_column_type = convert_to_base_sr(
+        source._columns[source.time_column].type.lower()
+    )
+    to_time_zone = ""
+    # TODO: Understand what timezone handling is required
+    # if time_column_type in ["datetime", "datetime64"]:
+    #     to_time_zone = f"toTimeZone({source.time_column}, 'UTC')"
+    # elif time_column_type in ["timestamp", "uint64", "int64"]:
+    #     to_time_zone = f"toTimeZone(to_datetime_ntz({source.time_column}, 3), 'UTC')"
+    if time_column_type in ["datetime", "datetime64"]:
+        to_time_zone = f"`{source.time_column}`"
+    elif time_column_type in ["timestamp", "uint64", "int64"]:
+        to_time_zone = f"toTimeZone(to_datetime_ntz({source.time_column}, 3), 'UTC')"
+
+    stats_interval_seconds = get_graph_interval(request.time_from, request.time_to)
+    stats_time_selector = ""
+    buckets = None
+    if stats_interval_seconds is not None:
+        # time_slice aligns buckets to 0001-01-01, buckets are aligned to the
+        # unix epoch instead, so they line up with cached and in-memory graphs
+        stats_time_selector = f"floor(unix_timestamp({to_time_zone}) / {stats_interval_seconds}) * {stats_interval_seconds * 1000}"
+        buckets = get_graph_buckets(
+            *(window or (request.time_from, request.time_to)),
+            stats_interval_seconds,
+        )
+    else:
+        if time_column_type in ["datetime", "timestamp", "uint64"]:
+            stats_time_selector = f"unix_timestamp({to_time_zone})*1000"
+        elif time_column_type == "datetime64":
+            stats_time_selector = f"unix_timestamp({to_time_zone})"
+
+    query_hints = get_query_hints(source, budget.REQUEST_TYPE_GRAPH)
+
+    stat_sql = f"{stats_time_selector} as t, COUNT() as Count"
+    for column, value in zip(group_by, group_by_values):
+        stat_sql += f", {value} as `{column.name}`"
+    stat_sql += f" FROM {from_db_table} WHERE {time_clause} AND {filter_clause} AND {raw_where_clause} GROUP BY t"
+    group_limit = None
+    if group_by:
+        stat_sql += ", " + ", ".join(f"`{column.name}`" for column in group_by)
+        if fold and request.group_limit:
+            group_limit = request.group_limit
+    if group_limit:
+        # hints apply to the outermost query
+        stat_sql = build_top_groups_sql(
+            f"SELECT {stat_sql}",
+            [column.name for column in group_by],
+            group_limit,
+            query_hints,
+        )
+    else:
+        stat_sql = f"SELECT {query_hints} {stat_sql}"
+    stat_sql += " ORDER BY t"
+    return GraphQuery(
+        sql=stat_sql,
+        grouped=bool(group_by),
+        buckets=buckets,
+        group_limit=group_limit,
+    )
+
+
 class StarrocksConnect:
     def __init__(self, data: dict):
         self.data = data
@@ -114,6 +400,28 @@ class StarrocksConnect:
             logger.exception("error while tempdir cleanup (ignoring): %s", err)
 
 
+def get_connection_key(query_id: str) -> str:
+    return f"query:starrocks:{query_id}"
+
+
+@contextmanager
+def tracked_connection(request, client, part: str):
+    """
+    Remembers the id of the connection running a part of the request, StarRocks
+    kills queries by connection id instead of query id.
+    """
+    if request.cancel_token is None:
+        yield
+        return
+    key = get_connection_key(request.cancel_token.get_query_id(part))
+    cache = cancellation.get_cache()
+    cache.set(key, client.connection_id, cancellation.ACTIVE_TTL)
+    try:
+        yield
+    finally:
+        cache.delete(key)
+
+
 def flyql_starrocks_columns(source_columns: Dict[str, SourceColumn]):
     return {
         column.name: Column(
@@ -169,15 +477,9 @@ class Fetcher(BaseFetcher):
             return True, None
 
         try:
-            parser = parse(query)
-        except ParserError as err:
+            compile_query(source, query)
+        except (ParserError, FlyqlError) as err:
             return False, err.message
-        else:
-            try:
-                assert parser.root
-                to_sql(parser.root, columns=flyql_starrocks_columns(source._columns))
-            except FlyqlError as err:
-                return False, err.message
 
         return True, None
 
@@ -257,186 +559,159 @@ class Fetcher(BaseFetcher):
     def autocomplete(
         cls, source: Source, column: str, time_from, time_to, value: str
     ) -> AutocompleteResponse:
+        cached = autocomplete_cache.search(
+            source,
+            column,
+            time_from,
+            value,
+            loader=lambda time_from, time_to, limit: cls.load_autocomplete_values(
+                source, column, time_from, time_to, limit
+            ),
+        )
+        if cached is not None:
+            return cached
+
         incomplete = False
         from_db_table = f"{source.data['database']}.{source.data['table']}"
         time_clause = build_time_clause(
             source.time_column, source.date_column, time_from, time_to
         )
-        query_hints = ""
-        if source.data.get("settings"):
-            query_hints = f"/*+ SET_VAR({source.data['settings']}) */"
+        query_hints = get_query_hints(source, budget.REQUEST_TYPE_AUTOCOMPLETE)
         query = f"SELECT {query_hints} DISTINCT `{column}` FROM {from_db_table} WHERE {time_clause} and CAST(`{column}` AS STRING) LIKE %(value)s ORDER BY `{column}` LIMIT 500"
 
         assert source.conn
-        with StarrocksConnect(source.conn.data) as c:
-            cur = c.client.cursor()
-            cur.execute(query, {"value": f"%{value}%"})
-            result = cur.fetchall()
-            items = [str(x[0]) for x in result]
+        with budget.enforce(source, budget.REQUEST_TYPE_AUTOCOMPLETE, "starrocks"):
+            with StarrocksConnect(source.conn.data) as c:
+                cur = c.client.cursor()
+                cur.execute(query, {"value": f"%{value}%"})
+                result = cur.fetchall()
+                items = [str(x[0]) for x in result]
         if len(items) >= 500:
             incomplete = True
         return AutocompleteResponse(items=items, incomplete=incomplete)
 
+    @classmethod
+    def load_autocomplete_values(
+        cls, source: Source, column: str, time_from, time_to, limit: int
+    ):
+        """Returns the `limit` most frequent values of the column."""
+        from_db_table = f"{source.data['database']}.{source.data['table']}"
+        time_clause = build_time_clause(
+            source.time_column, source.date_column, time_from, time_to
+        )
+        query_hints = get_query_hints(source, budget.REQUEST_TYPE_AUTOCOMPLETE)
+        query = f"SELECT {query_hints} `{column}`, COUNT() AS c FROM {from_db_table} WHERE {time_clause} GROUP BY `{column}` ORDER BY c DESC LIMIT {int(limit)}"
+
+        assert source.conn
+        with budget.enforce(source, budget.REQUEST_TYPE_AUTOCOMPLETE, "starrocks"):
+            with StarrocksConnect(source.conn.data) as c:
+                cur = c.client.cursor()
+                cur.execute(query)
+                return [str(x[0]) for x in cur.fetchall()]
+
+    @classmethod
+    def cancel_query(cls, source, query_id: str) -> bool:
+        cache = cancellation.get_cache()
+        connection_ids = [
+            cache.get(get_connection_key(f"{query_id}-{part}"))
+            for part in ("data", "graph")
+        ]
+        connection_ids = [item for item in connection_ids if item is not None]
+        if not connection_ids:
+            return False
+        assert source.conn
+        with StarrocksConnect(source.conn.data) as c:
+            cur = c.client.cursor()
+            for connection_id in connection_ids:
+                cur.execute(f"KILL QUERY {int(connection_id)}")
+        return True
+
     @classmethod
     def fetch_graph_data(
         cls,
         request: GraphDataRequest,
     ) -> GraphDataResponse:
-        if request.query:
-            parser = parse(request.query)
-            assert parser.root
-            filter_clause = to_sql(
-                parser.root, columns=flyql_starrocks_columns(request.source._columns)
-            )
-        else:
-            filter_clause = "true"
+        filter_clause = build_filter_clause(request.source, request.query)
 
-        raw_where_clause = request.raw_query or "true"
+        assert request.source.conn
+        stats = QueryStats()
+        with StarrocksConnect(request.source.conn.data) as c:
 
-        group_by_value = ""
-        group_by = request.group_by[0] if request.group_by else None
-        if group_by:
-            assert isinstance(group_by, ParsedColumn)
-            # If the name is the root name, ignore the presence of dots as we
-            # should assume the intent is to group by the identified column rather
-            # than a nested field.
-            if "." in group_by.name and group_by.root_name != group_by.name:
-                # Use the csv module to split respecting quotes
-                spl = list(csv.reader([group_by.name], delimiter=".", quotechar="'"))[0]
-                if group_by.is_map():
-                    map_key = "']['".join(spl[1:])
-                    group_by_value = f"{group_by.root_name}['{map_key}']"
-                elif group_by.is_array():
-                    array_index = int(".".join(spl[1]))
-                    group_by_value = f"{group_by.root_name}[{array_index}]"
-                elif group_by.is_json():
-                    json_path = spl[1:]
-                    # Starrocks documents that you double quote any json path elements
-                    # that contain dots. Let's just do it unconditionally.
-                    json_path = [f'"{x}"' for x in json_path]
-                    json_path_str = "->".join([escape_param(x) for x in json_path])
-                    group_by_value = (
-                        f"cast(`{group_by.root_name}`->{json_path_str} as string)"
+            def query_window(window=None):
+                with budget.enforce(
+                    request.source, budget.REQUEST_TYPE_GRAPH, "starrocks"
+                ), tracked_connection(request, c.client, "graph"), stats.fetching():
+                    cur = c.client.cursor()
+                    # windows of the graph cache are merged before folding
+                    cur.execute(
+                        build_graph_query(
+                            request, filter_clause, window, fold=window is None
+                        ).sql
                     )
-                elif group_by.jsonstring:
-                    json_path = spl[1:]
-                    # Starrocks documents that you double quote any json path elements
-                    # that contain dots. Let's just do it unconditionally.
-                    json_path = [f'"{x}"' for x in json_path]
-                    json_path_str = "->".join([escape_param(x) for x in json_path])
-                    group_by_value = f"cast(parse_json(`{group_by.root_name}`)->{json_path_str} as string)"
-                else:
-                    raise ValueError
-            else:
-                group_by_value = f"`{group_by.root_name}`"
+                    result_rows = cur.fetchall()
+                stats.result_rows += len(result_rows)
+                return result_rows
+
+            if graph_cache.is_enabled(request):
+                group_by = get_group_by_columns(request.group_by)
+                with stats.building():
+                    response = graph_cache.fetch_graph(
+                        request,
+                        key_parts=[
+                            filter_clause,
+                            get_group_by_key(request.source, group_by),
+                        ],
+                        grouped=bool(group_by),
+                        query_window=query_window,
+                    )
+                # the cache merge is measured as a whole, queries included
+                stats.build_ms = max(stats.build_ms - stats.fetch_ms, 0)
+                response.stats = stats
+                return response
+
+            graph_query = build_graph_query(request, filter_clause)
+            result_rows = query_window()
+        with stats.building():
+            response = build_graph_response(
+                result_rows, request.time_from, request.time_to, graph_query
+            )
+        response.stats = stats
+        return response
 
-        total = 0
+    @classmethod
+    def export_data(cls, request: DataRequest, fmt: str) -> Iterator[bytes]:
+        if fmt == export.FORMAT_PARQUET:
+            raise ValueError("parquet export is not supported for StarRocks sources")
+        source = request.source
+        filter_clause = build_filter_clause(source, request.query)
+        columns = request.columns or sorted(source._columns.keys())
+        columns_to_select = ", ".join(f"`{column}`" for column in columns)
         time_clause = build_time_clause(
-            request.source.time_column,
-            request.source.date_column,
-            request.time_from,
-            request.time_to,
+            source.time_column, source.date_column, request.time_from, request.time_to
         )
-        from_db_table = f"{request.source.data['catalog']}.{request.source.data['database']}.{request.source.data['table']}"
-
-        time_column_type = convert_to_base_sr(
-            request.source._columns[request.source.time_column].type.lower()
+        raw_where_clause = request.raw_query or "true"
+        query_hints = get_query_hints(source, budget.REQUEST_TYPE_EXPORT)
+        from_db_table = (
+            f"{source.data['catalog']}.{source.data['database']}.{source.data['table']}"
         )
-        to_time_zone = ""
-        # TODO: Understand what timezone handling is required
-        # if time_column_type in ["datetime", "datetime64"]:
-        #     to_time_zone = f"toTimeZone({request.source.time_column}, 'UTC')"
-        # elif time_column_type in ["timestamp", "uint64", "int64"]:
-        #     to_time_zone = f"toTimeZone(to_datetime_ntz({request.source.time_column}, 3), 'UTC')"
-        if time_column_type in ["datetime", "datetime64"]:
-            to_time_zone = f"`{request.source.time_column}`"
-        elif time_column_type in ["timestamp", "uint64", "int64"]:
-            to_time_zone = (
-                f"toTimeZone(to_datetime_ntz({request.source.time_column}, 3), 'UTC')"
-            )
+        query = f"SELECT {query_hints} {columns_to_select} FROM {from_db_table} WHERE {time_clause} AND {filter_clause} AND {raw_where_clause} ORDER BY `{source.time_column}` DESC LIMIT {request.limit}"
+        return cls._export_data(query, source, columns, fmt)
 
-        columns_names = sorted(request.source._columns.keys())
-        columns_to_select = []
-        for column in columns_names:
-            if column == request.source.time_column:
-                columns_to_select.append(to_time_zone)
-            else:
-                columns_to_select.append(column)
-
-        stats = {}
-        stats_by_ts = {}
-        unique_ts = {request.time_from, request.time_to}
-        seconds = int(request.time_to - request.time_from) / 1000
-        stats_names = set()
-        stats_time_selector = ""
-        if seconds > 15:
-            max_points = 150
-            stats_interval_seconds = round(seconds / max_points)
-            if stats_interval_seconds == 0:
-                stats_interval_seconds = 1
-            stats_time_selector = f"unix_timestamp(time_slice({to_time_zone}, INTERVAL {stats_interval_seconds} SECOND)) * 1000"
-        else:
-            if time_column_type in ["datetime", "timestamp", "uint64"]:
-                stats_time_selector = f"unix_timestamp({to_time_zone})*1000"
-            elif time_column_type == "datetime64":
-                stats_time_selector = f"unix_timestamp({to_time_zone})"
-
-        assert request.source.conn
-        with StarrocksConnect(request.source.conn.data) as c:
-            query_hints = ""
-            if request.source.data.get("settings"):
-                query_hints = f"/*+ SET_VAR({request.source.data['settings']}) */"
-
-            stat_sql = (
-                f"SELECT {query_hints} {stats_time_selector} as t, COUNT() as Count"
-            )
-            if group_by_value:
-                assert group_by
-                stat_sql += f", {group_by_value} as `{group_by.name}`"
-            stat_sql += f" FROM {from_db_table} WHERE {time_clause} AND {filter_clause} AND {raw_where_clause} GROUP BY t"
-            if group_by_value:
-                assert group_by
-                stat_sql += f", `{group_by.name}`"
-            stat_sql += " ORDER BY t"
-
-            cur = c.client.cursor()
-            cur.execute(stat_sql)
-            for item in cur.fetchall():
-                if group_by_value:
-                    ts, count, groupper = item
-                    if not groupper:
-                        groupper = "__none__"
-                else:
-                    ts, count = item
-                    groupper = "Rows"
-
-                stats_names.add(groupper)
-                items = stats.get(groupper, [])
-                items.append((ts, count))
-                total += count
-                stats[groupper] = items
-                unique_ts.add(ts)
-                if groupper not in stats_by_ts:
-                    stats_by_ts[groupper] = {ts: count}
-                else:
-                    stats_by_ts[groupper][ts] = count
-        stats = {
-            "timestamps": sorted(unique_ts),
-            "data": {},
-        }
-        for name in stats_names:
-            stats["data"][name] = []
-
-        for ts in stats["timestamps"]:
-            for name in stats_names:
-                value = stats_by_ts.get(name, {}).get(ts, 0)
-                stats["data"][name].append(value)
-
-        return GraphDataResponse(
-            timestamps=stats["timestamps"],
-            data=stats["data"],
-            total=total,
-        )
+    @classmethod
+    def _export_data(cls, query: str, source, columns, fmt: str) -> Iterator[bytes]:
+        assert source.conn
+        batch_size = export.get_config()["batch_rows"]
+        with budget.enforce(source, budget.REQUEST_TYPE_EXPORT, "starrocks"):
+            with StarrocksConnect(source.conn.data) as c:
+                # an unbuffered cursor reads the result as the batches are sent
+                cur = c.client.cursor(buffered=False)
+                try:
+                    cur.execute(query)
+                    yield from export.encode_batches(
+                        iter(lambda: cur.fetchmany(batch_size), []), columns, fmt
+                    )
+                finally:
+                    cur.close()
 
     @classmethod
     def fetch_data(
@@ -444,17 +719,14 @@ class Fetcher(BaseFetcher):
         request: DataRequest,
         tz: Optional[zoneinfo.ZoneInfo] = None,
     ):
-        if request.query:
-            parser = parse(request.query)
-            assert parser.root
-            filter_clause = to_sql(
-                parser.root, columns=flyql_starrocks_columns(request.source._columns)
-            )
-        else:
-            filter_clause = "true"
+        filter_clause = build_filter_clause(request.source, request.query)
 
-        order_by_clause = f"ORDER BY `{request.source.time_column}` DESC"
+        order_by_clause = get_order_by_clause(request.source)
         raw_where_clause = request.raw_query or "true"
+        limit_clause = f"LIMIT {request.limit}"
+        if request.cursor is not None and request.cursor.time is not None:
+            cursor_clause = build_cursor_clause(request.source, request.cursor)
+            filter_clause = f"{filter_clause} AND {cursor_clause}"
 
         time_clause = build_time_clause(
             request.source.time_column,
@@ -464,7 +736,7 @@ class Fetcher(BaseFetcher):
         )
         from_db_table = f"{request.source.data['catalog']}.{request.source.data['database']}.{request.source.data['table']}"
 
-        columns_names = sorted(request.source._columns.keys())
+        columns_names = sorted(request.columns or request.source._columns.keys())
         columns_to_select = []
         for column in columns_names:
             # TODO: Understand what timezone handling is required
@@ -478,28 +750,37 @@ class Fetcher(BaseFetcher):
             #         columns_to_select.append(f"toTimeZone(toDateTime({column}), 'UTC')")
             # else:
             columns_to_select.append(f"`{column}`")
+        selected_columns = [request.source._record_pseudo_id_column] + columns_names
+        severity_expr = build_severity_expr(request.source)
+        if severity_expr is not None:
+            columns_to_select.append(severity_expr)
+            selected_columns.append(request.source._record_severity_column)
         columns_to_select = ", ".join(columns_to_select)
 
-        query_hints = ""
-        if request.source.data.get("settings"):
-            query_hints = f"/*+ SET_VAR({request.source.data['settings']}) */"
+        query_hints = get_query_hints(request.source, budget.REQUEST_TYPE_DATA)
 
-        select_query = f"SELECT {query_hints} uuid_numeric(),{columns_to_select} FROM {from_db_table} WHERE {time_clause} AND {filter_clause} AND {raw_where_clause} {order_by_clause} LIMIT {request.limit}"
+        select_query = f"SELECT {query_hints} uuid_numeric(),{columns_to_select} FROM {from_db_table} WHERE {time_clause} AND {filter_clause} AND {raw_where_clause} {order_by_clause} {limit_clause}"
 
-        rows = []
+        # StarRocks reports no read statistics over the MySQL protocol
+        stats = QueryStats()
 
         assert request.source.conn
         with StarrocksConnect(request.source.conn.data) as c:
-            selected_columns = [request.source._record_pseudo_id_column] + columns_names
-            cur = c.client.cursor()
-            cur.execute(select_query)
-            for item in cur.fetchall():
-                rows.append(
-                    Row(
-                        source=request.source,
-                        selected_columns=selected_columns,
-                        values=item,
-                        tz=tz or UTC_ZONE,
-                    )
+            with budget.enforce(
+                request.source, budget.REQUEST_TYPE_DATA, "starrocks"
+            ), tracked_connection(request, c.client, "data"), stats.fetching():
+                cur = c.client.cursor()
+                cur.execute(select_query)
+                items = cur.fetchall()
+            with stats.building():
+                rows = build_rows(
+                    request.source, selected_columns, items, tz or UTC_ZONE
                 )
-        return DataResponse(rows=rows)
+        stats.result_rows = len(rows)
+        return DataResponse(rows=rows, stats=stats)
+
+    @classmethod
+    def get_next_cursor(
+        cls, request: DataRequest, response: DataResponse
+    ) -> Optional[str]:
+        return pagination.get_next_cursor(request.source, response.rows, request.limit)
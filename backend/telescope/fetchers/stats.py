@@ -0,0 +1,118 @@
+"""
+Backend query statistics.
+
+Fetchers collect what the database reports about the queries of a response,
+rows and bytes read and the server side elapsed time, along with the time
+the client spent waiting for and decoding the result and building rows from
+it. Comparing them tells whether a slow request spent its time in the
+database, on the network or in our own row building.
+"""
+
+import logging
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+logger = logging.getLogger("telescope.fetchers.stats")
+
+
+def add_optional(total: Optional[float], value) -> Optional[float]:
+    if value is None:
+        return total
+    return (total or 0) + value
+
+
+class QueryStats:
+    def __init__(self):
+        self.queries = 0
+        # None when the database does not report them
+        self.read_rows: Optional[int] = None
+        self.read_bytes: Optional[int] = None
+        self.server_elapsed_ms: Optional[float] = None
+        self.result_rows = 0
+        # receiving and decoding the result in the driver, includes the server time
+        self.fetch_ms = 0.0
+        self.build_ms = 0.0
+        # time shards of sharded execution, and how many of them were read
+        self.shards = 0
+        self.shards_done = 0
+
+    def add_summary(self, summary) -> None:
+        """
+        Adds the ClickHouse summary of a query result. The summary header is
+        sent with the first block, streamed queries may report less than
+        what they eventually read.
+        """
+        if not isinstance(summary, dict):
+            return
+        for key in ("read_rows", "read_bytes"):
+            if summary.get(key) is not None:
+                setattr(self, key, add_optional(getattr(self, key), int(summary[key])))
+        if summary.get("elapsed_ns") is not None:
+            self.server_elapsed_ms = add_optional(
+                self.server_elapsed_ms, int(summary["elapsed_ns"]) / 1_000_000
+            )
+
+    def merge(self, other: "QueryStats") -> None:
+        """
+        Adds the counters of queries measured separately, like the queries of
+        a shard running in another thread. Their times are not added, the
+        caller measures the time of concurrent queries as a whole.
+        """
+        self.queries += other.queries
+        for key in ("read_rows", "read_bytes", "server_elapsed_ms"):
+            setattr(self, key, add_optional(getattr(self, key), getattr(other, key)))
+        self.result_rows += other.result_rows
+
+    @contextmanager
+    def fetching(self, query: bool = True):
+        """Measures a query, or with `query=False` reading more of its result."""
+        if query:
+            self.queries += 1
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.fetch_ms += (time.perf_counter() - started) * 1000
+
+    @contextmanager
+    def building(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.build_ms += (time.perf_counter() - started) * 1000
+
+    def as_dict(self) -> dict:
+        return {
+            "queries": self.queries,
+            "read_rows": self.read_rows,
+            "read_bytes": self.read_bytes,
+            "result_rows": self.result_rows,
+            "server_elapsed_ms": (
+                round(self.server_elapsed_ms, 3)
+                if self.server_elapsed_ms is not None
+                else None
+            ),
+            "fetch_ms": round(self.fetch_ms, 3),
+            "build_ms": round(self.build_ms, 3),
+            "shards": self.shards,
+            "shards_done": self.shards_done,
+        }
+
+
+def get_stats_dict(stats: Optional[QueryStats]) -> Optional[dict]:
+    return stats.as_dict() if stats is not None else None
+
+
+def log_stats(source, request_type: str, stats: Optional[QueryStats]) -> None:
+    if stats is None:
+        return
+    # a dict argument becomes the `rest` of the json log format
+    logger.info(
+        "query stats: source=%(source)s type=%(request_type)s queries=%(queries)s "
+        "read_rows=%(read_rows)s read_bytes=%(read_bytes)s "
+        "result_rows=%(result_rows)s server_elapsed_ms=%(server_elapsed_ms)s "
+        "fetch_ms=%(fetch_ms)s build_ms=%(build_ms)s",
+        {"source": source.slug, "request_type": request_type, **stats.as_dict()},
+    )
@@ -3,6 +3,8 @@ import json
 import logging
 from typing import Optional, Dict, Any, List, Tuple
 
+from telescope.fetchers.graph import GROUP_SEPARATOR, get_group_by_columns
+
 logger = logging.getLogger("telescope.fetchers.utils")
 
 
@@ -99,6 +101,30 @@ def apply_remap(extracted_value: str, remap_rules: List[Dict[str, Any]]) -> str:
     return extracted_value
 
 
+def get_row_group_value(row, group_by) -> str:
+    """Returns the value of the group by column of an in-memory row."""
+    if "." in group_by.name:
+        spl = group_by.name.split(".")
+        json_path = spl[1:]
+        try:
+            data = json.loads(row.data[spl[0]])
+            for key in json_path:
+                data = data.get(key, {})
+            if not data:
+                return "__none__"
+            return str(data)
+        except (json.JSONDecodeError, KeyError, TypeError):
+            return "__none__"
+    return str(row.data.get(group_by.name, "__none__"))
+
+
+def get_group_key_name(key: Tuple[str, ...]) -> str:
+    """Returns the series name of a tuple of group by values."""
+    if len(key) == 1:
+        return key[0]
+    return GROUP_SEPARATOR.join(key)
+
+
 def generate_graph_from_rows(
     rows: List,
     time_from: int,
@@ -106,6 +132,10 @@ def generate_graph_from_rows(
     group_by: Optional = None,
     group_by_severity: bool = False,
 ) -> Tuple[List[int], Dict[str, List[int]], int]:
+    """
+    Counts rows per bucket and group. `group_by` is a column or a list of
+    columns, rows grouped by several columns are counted per tuple of values.
+    """
     stats_by_ts = {}
     unique_ts = {time_from, time_to}
     total = len(rows)
@@ -120,7 +150,10 @@ def generate_graph_from_rows(
     else:
         bucket_interval_ms = 1000
 
-    groupper_name = "Rows" if not group_by and not group_by_severity else None
+    if group_by is not None and not isinstance(group_by, (list, tuple)):
+        group_by = [group_by]
+    group_by = get_group_by_columns(group_by) if group_by else []
+    groupper_key = ("Rows",) if not group_by and not group_by_severity else None
 
     for row in rows:
         ts_ms = row.time["unixtime"]
@@ -131,41 +164,24 @@ def generate_graph_from_rows(
         unique_ts.add(ts_key)
 
         if group_by_severity:
-            groupper_name = row.severity if row.severity else "__none__"
+            groupper_key = (row.severity if row.severity else "__none__",)
         elif group_by:
-            if "." in group_by.name:
-                spl = group_by.name.split(".")
-                json_path = spl[1:]
-                try:
-                    data = json.loads(row.data[spl[0]])
-                    for key in json_path:
-                        data = data.get(key, {})
-                    if not data:
-                        groupper_name = "__none__"
-                    else:
-                        groupper_name = str(data)
-                except (json.JSONDecodeError, KeyError, TypeError):
-                    groupper_name = "__none__"
-            else:
-                groupper_name = str(row.data.get(group_by.name, "__none__"))
+            groupper_key = tuple(
+                get_row_group_value(row, column) for column in group_by
+            )
 
-        if groupper_name not in stats_by_ts:
-            stats_by_ts[groupper_name] = {}
+        if groupper_key not in stats_by_ts:
+            stats_by_ts[groupper_key] = {}
 
-        if ts_key not in stats_by_ts[groupper_name]:
-            stats_by_ts[groupper_name][ts_key] = 1
+        if ts_key not in stats_by_ts[groupper_key]:
+            stats_by_ts[groupper_key][ts_key] = 1
         else:
-            stats_by_ts[groupper_name][ts_key] += 1
+            stats_by_ts[groupper_key][ts_key] += 1
 
     timestamps = sorted(unique_ts)
     data = {}
 
-    for name in stats_by_ts.keys():
-        data[name] = []
-
-    for ts in timestamps:
-        for name in stats_by_ts.keys():
-            value = stats_by_ts.get(name, {}).get(ts, 0)
-            data[name].append(value)
+    for key, counts in stats_by_ts.items():
+        data[get_group_key_name(key)] = [counts.get(ts, 0) for ts in timestamps]
 
     return timestamps, data, total
@@ -0,0 +1,63 @@
+"""
+Lightweight in-process metrics registry.
+
+Values are kept per worker process, every gunicorn worker exposes its own
+counters through the `metrics` endpoint.
+"""
+
+from collections import defaultdict
+from threading import Lock
+from typing import Dict
+
+_lock = Lock()
+_counters: Dict[str, int] = defaultdict(int)
+_gauges: Dict[str, float] = {}
+_timings: Dict[str, Dict[str, float]] = {}
+
+
+def incr(name: str, value: int = 1):
+    with _lock:
+        _counters[name] += value
+
+
+def set_gauge(name: str, value: float):
+    with _lock:
+        _gauges[name] = value
+
+
+def add_gauge(name: str, value: float):
+    with _lock:
+        _gauges[name] = _gauges.get(name, 0) + value
+
+
+def observe(name: str, value: float):
+    with _lock:
+        timing = _timings.get(name)
+        if timing is None:
+            timing = {"count": 0, "sum": 0.0, "max": 0.0}
+            _timings[name] = timing
+        timing["count"] += 1
+        timing["sum"] += value
+        if value > timing["max"]:
+            timing["max"] = value
+
+
+def get_counter(name: str) -> int:
+    with _lock:
+        return _counters.get(name, 0)
+
+
+def snapshot() -> dict:
+    with _lock:
+        return {
+            "counters": dict(_counters),
+            "gauges": dict(_gauges),
+            "timings": {name: dict(value) for name, value in _timings.items()},
+        }
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _timings.clear()
@@ -1,6 +1,8 @@
+import hashlib
 import logging
 import secrets
-from typing import List, Dict
+from types import MappingProxyType
+from typing import FrozenSet, List, Dict, Mapping, Optional
 
 from django.db import models
 from django.contrib.auth.models import User, Group
@@ -40,6 +42,48 @@ class SourceColumn:
         self.values = values
 
 
+class ColumnCatalog:
+    """
+    Read only source columns parsed from the `columns` field, along with the
+    names of JSON string columns which rows check for every value and the
+    fingerprint of the schema compiled queries depend on.
+    """
+
+    __slots__ = ("columns", "jsonstring_columns", "_fingerprint")
+
+    def __init__(self, columns: Dict[str, dict]):
+        self.columns: Mapping[str, SourceColumn] = MappingProxyType(
+            {
+                key: SourceColumn(
+                    name=key,
+                    display_name=value["display_name"],
+                    type=value["type"],
+                    jsonstring=value["jsonstring"],
+                    autocomplete=value["autocomplete"],
+                    suggest=value["suggest"],
+                    group_by=value["group_by"],
+                    values=value["values"],
+                )
+                for key, value in columns.items()
+            }
+        )
+        self.jsonstring_columns: FrozenSet[str] = frozenset(
+            name for name, column in self.columns.items() if column.jsonstring
+        )
+        self._fingerprint: Optional[str] = None
+
+    @property
+    def fingerprint(self) -> str:
+        """Returns a digest of the column attributes generated SQL depends on."""
+        if self._fingerprint is None:
+            parts = [
+                repr((name, column.type, column.jsonstring, column.values))
+                for name, column in sorted(self.columns.items())
+            ]
+            self._fingerprint = hashlib.sha1("\n".join(parts).encode()).hexdigest()
+        return self._fingerprint
+
+
 class Connection(models.Model):
     kind = models.CharField(max_length=32)
     name = models.CharField(max_length=64)
@@ -86,6 +130,20 @@ class Source(models.Model):
     def __init__(self, *args, **kwargs):
         super(Source, self).__init__(*args, **kwargs)
         self.permissions = set()
+        self._column_catalog = None
+        self._severity_program = None
+
+    def save(self, *args, **kwargs):
+        self._column_catalog = None
+        self._severity_program = None
+        super(Source, self).save(*args, **kwargs)
+
+    def __getstate__(self):
+        state = super(Source, self).__getstate__()
+        # the catalog holds mapping proxies which cannot be pickled
+        state["_column_catalog"] = None
+        state["_severity_program"] = None
+        return state
 
     def __str__(self):
         return self.slug
@@ -110,7 +168,7 @@ class Source(models.Model):
     def create(cls, kind, data):
         data["context_columns"] = {}
         data["support_raw_query"] = True
-        query_mode = SOURCE_QUERY_MODE_SEPARATE
+        query_mode = data.pop("query_mode", None) or SOURCE_QUERY_MODE_SEPARATE
 
         if kind == "docker":
             data["support_raw_query"] = False
@@ -155,20 +213,22 @@ class Source(models.Model):
         return "_____record_pseudo_id"
 
     @property
-    def _columns(self) -> Dict[str, SourceColumn]:
-        columns = {}
-        for key, value in self.columns.items():
-            columns[key] = SourceColumn(
-                name=key,
-                display_name=value["display_name"],
-                type=value["type"],
-                jsonstring=value["jsonstring"],
-                autocomplete=value["autocomplete"],
-                suggest=value["suggest"],
-                group_by=value["group_by"],
-                values=value["values"],
-            )
-        return columns
+    def _record_severity_column(self):
+        # severity computed by the query from the severity rules
+        return "_____record_severity"
+
+    @property
+    def column_catalog(self) -> ColumnCatalog:
+        # rebuilt on save and when the columns field is assigned a new value
+        cached = self._column_catalog
+        if cached is None or cached[0] is not self.columns:
+            cached = (self.columns, ColumnCatalog(self.columns))
+            self._column_catalog = cached
+        return cached[1]
+
+    @property
+    def _columns(self) -> Mapping[str, SourceColumn]:
+        return self.column_catalog.columns
 
     def add_perms(self, perms):
         for perm in perms:
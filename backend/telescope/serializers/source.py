@@ -10,7 +10,7 @@ from rest_framework import serializers
 from telescope.models import Source, SavedView, SourceRoleBinding
 from telescope.utils import parse_time
 from telescope.columns import ParsedColumn, parse_columns, ColumnsParserError
-from telescope.fetchers import get_fetchers
+from telescope.fetchers import get_fetchers, export, pagination
 from telescope.rbac.manager import RBACManager
 
 rbac_manager = RBACManager()
@@ -19,6 +19,12 @@ from telescope.constants import (
     VIEW_SCOPE_SOURCE,
     VIEW_SCOPE_PERSONAL,
     SOURCE_CAPABILITIES,
+    SOURCE_CAPABILITY_SEVERITY_RULES,
+    SOURCE_CAPABILITY_SQL_SEVERITY_RULES,
+    SOURCE_QUERY_MODE_SEPARATE,
+    SOURCE_QUERY_MODE_COMBINED,
+    CLICKHOUSE_FETCH_MODE_COLUMNAR,
+    CLICKHOUSE_FETCH_MODE_ROWS,
 )
 
 
@@ -46,7 +52,11 @@ class SerializeErrorMsg:
     RAW_QUERIES_PERMISSIONS = "Insufficient permissions to use source raw queries"
     RAW_QUERIES_NOT_SUPPORTED = "This source does not support raw queries"
     SEVERITY_RULES_NOT_SUPPORTED = (
-        "Severity rules are only supported for docker and kubernetes sources"
+        "Severity rules are not supported for this kind of source"
+    )
+    SEVERITY_RULES_REQUIRE_SEVERITY_COLUMN = (
+        "Severity rules of ClickHouse and StarRocks sources are applied to the "
+        "severity column, which must be set"
     )
 
 
@@ -445,11 +455,20 @@ class NewBaseSourceSerializer(serializers.Serializer):
             return errors
 
         capabilities = SOURCE_CAPABILITIES.get(source_kind, {})
-        if not capabilities.get("severity_rules", False):
+        sql_rules = capabilities.get(SOURCE_CAPABILITY_SQL_SEVERITY_RULES, False)
+        if (
+            not capabilities.get(SOURCE_CAPABILITY_SEVERITY_RULES, False)
+            and not sql_rules
+        ):
             errors[self.SEVERITY_RULES_NAME] = (
                 SerializeErrorMsg.SEVERITY_RULES_NOT_SUPPORTED
             )
             return errors
+        if sql_rules and not data.get(self.SEVERITY_COLUMN_NAME):
+            errors[self.SEVERITY_RULES_NAME] = (
+                SerializeErrorMsg.SEVERITY_RULES_REQUIRE_SEVERITY_COLUMN
+            )
+            return errors
 
         validation_errors = self.validate_severity_rules_structure(severity_rules)
         if validation_errors:
@@ -480,10 +499,60 @@ class NewBaseSourceSerializer(serializers.Serializer):
         return value
 
 
+class QueryBudgetSerializer(serializers.Serializer):
+    max_execution_time = serializers.IntegerField(
+        required=False, allow_null=True, min_value=0
+    )
+    max_rows_to_read = serializers.IntegerField(
+        required=False, allow_null=True, min_value=0
+    )
+    max_bytes_to_read = serializers.IntegerField(
+        required=False, allow_null=True, min_value=0
+    )
+    max_memory_usage = serializers.IntegerField(
+        required=False, allow_null=True, min_value=0
+    )
+    timeout_before_checking_execution_speed = serializers.IntegerField(
+        required=False, allow_null=True, min_value=0
+    )
+
+
+class QueryBudgetsSerializer(serializers.Serializer):
+    data = QueryBudgetSerializer(required=False)
+    graph = QueryBudgetSerializer(required=False)
+    autocomplete = QueryBudgetSerializer(required=False)
+    export = QueryBudgetSerializer(required=False)
+
+
 class ClickhouseSourceDataSerializer(serializers.Serializer):
     database = serializers.CharField(required=True)
     table = serializers.CharField(required=True)
     settings = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+    fetch_mode = serializers.ChoiceField(
+        choices=[CLICKHOUSE_FETCH_MODE_COLUMNAR, CLICKHOUSE_FETCH_MODE_ROWS],
+        required=False,
+        help_text="Read data rows as column blocks (default) or as row tuples",
+    )
+    adaptive_window = serializers.BooleanField(
+        required=False,
+        help_text="Look for the latest rows in progressively wider time windows",
+    )
+    late_materialization = serializers.BooleanField(
+        required=False,
+        help_text="Find the latest rows by key first, then read their columns",
+    )
+    sharded_execution = serializers.BooleanField(
+        required=False,
+        help_text="Run long range queries as concurrent time shards",
+    )
+    autocomplete_cache = serializers.BooleanField(
+        required=False,
+        help_text="Serve autocomplete from an in-memory index of recent values",
+    )
+    budgets = QueryBudgetsSerializer(
+        required=False,
+        help_text="Per request type limits overriding the default query budgets",
+    )
 
 
 class StarrocksSourceDataSerializer(serializers.Serializer):
@@ -491,6 +560,14 @@ class StarrocksSourceDataSerializer(serializers.Serializer):
     database = serializers.CharField(required=True)
     table = serializers.CharField(required=True)
     settings = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+    autocomplete_cache = serializers.BooleanField(
+        required=False,
+        help_text="Serve autocomplete from an in-memory index of recent values",
+    )
+    budgets = QueryBudgetsSerializer(
+        required=False,
+        help_text="Per request type limits overriding the default query budgets",
+    )
 
 
 class DockerSourceDataSerializer(serializers.Serializer):
@@ -575,6 +652,11 @@ class UpdateKubernetesSourceSerializer(NewKubernetesSourceSerializer):
 
 class NewClickhouseSourceSerializer(NewBaseSourceSerializer):
     data = ClickhouseSourceDataSerializer(required=True)
+    query_mode = serializers.ChoiceField(
+        choices=[SOURCE_QUERY_MODE_SEPARATE, SOURCE_QUERY_MODE_COMBINED],
+        required=False,
+        help_text="Fetch rows and graph with one combined request",
+    )
 
     def validate(self, data):
         errors = {}
@@ -582,12 +664,7 @@ class NewClickhouseSourceSerializer(NewBaseSourceSerializer):
         errors.update(self.type_validate_time_column(data))
         errors.update(self.type_validate_date_column(data))
         errors.update(self.type_validate_default_chosen_columns(data))
-
-        # Explicitly reject severity_rules for ClickHouse
-        if data.get(self.SEVERITY_RULES_NAME):
-            errors[self.SEVERITY_RULES_NAME] = (
-                SerializeErrorMsg.SEVERITY_RULES_NOT_SUPPORTED
-            )
+        errors.update(self.type_validate_severity_rules(data, "clickhouse"))
 
         if errors:
             raise serializers.ValidationError(errors)
@@ -608,6 +685,13 @@ class UpdateClickhouseSourceSerializer(NewClickhouseSourceSerializer):
 class NewStarrocksSourceSerializer(NewBaseSourceSerializer):
     data = StarrocksSourceDataSerializer(required=True)
 
+    def validate(self, data):
+        data = super().validate(data)
+        errors = self.type_validate_severity_rules(data, "starrocks")
+        if errors:
+            raise serializers.ValidationError(errors)
+        return data
+
 
 class UpdateStarrocksSourceSerializer(NewStarrocksSourceSerializer):
     def __init__(self, *args, **kwargs):
@@ -660,6 +744,27 @@ class SourceDataRequestSerializer(serializers.Serializer):
     to = serializers.CharField()
     limit = serializers.IntegerField()
     context_columns = serializers.JSONField(allow_null=True, required=False)
+    project_columns = serializers.BooleanField(
+        default=False,
+        required=False,
+        help_text="Read only the requested columns instead of all source columns",
+    )
+    stream = serializers.BooleanField(
+        default=False,
+        required=False,
+        help_text="Stream rows as newline delimited JSON while they are read",
+    )
+    cursor = serializers.CharField(
+        allow_blank=True,
+        allow_null=True,
+        required=False,
+        help_text="Cursor of a previous response, to read the next page only",
+    )
+    columnar = serializers.BooleanField(
+        default=False,
+        required=False,
+        help_text="Return rows as column arrays, not used by streamed responses",
+    )
 
     def get_fields(self):
         fields = super().get_fields()
@@ -695,6 +800,23 @@ class SourceDataRequestSerializer(serializers.Serializer):
             raise serializers.ValidationError(help_text)
         return value
 
+    def validate_cursor(self, value):
+        if not value:
+            return None
+        try:
+            cursor = pagination.Cursor.decode(value)
+        except pagination.InvalidCursor as err:
+            raise serializers.ValidationError(str(err))
+        if cursor.time is not None and not self.context["source"].uniq_column:
+            raise serializers.ValidationError(
+                "source without uniq column can not be paged by cursor"
+            )
+        if pagination.is_expired(cursor):
+            raise serializers.ValidationError(
+                "cursor expired, request the first page again"
+            )
+        return cursor
+
     def validate_context_columns(self, value):
         source = self.context["source"]
         if source.context_columns:
@@ -724,11 +846,22 @@ class SourceDataRequestSerializer(serializers.Serializer):
 
 class SourceGraphDataRequestSerializer(SourceDataRequestSerializer):
     group_by = serializers.CharField(allow_blank=True, required=False)
+    no_cache = serializers.BooleanField(default=False, required=False)
+    group_limit = serializers.IntegerField(
+        min_value=1,
+        allow_null=True,
+        required=False,
+        help_text="Number of series, other group by values are summed into __other__",
+    )
 
     def __init__(self, *args, **kwargs):
         super(SourceGraphDataRequestSerializer, self).__init__(*args, **kwargs)
         self.fields.pop("columns", None)
         self.fields.pop("limit", None)
+        self.fields.pop("project_columns", None)
+        self.fields.pop("stream", None)
+        self.fields.pop("cursor", None)
+        self.fields.pop("columnar", None)
 
     def validate_group_by(self, value: str) -> List[ParsedColumn]:
         try:
@@ -738,6 +871,27 @@ class SourceGraphDataRequestSerializer(SourceDataRequestSerializer):
         return result
 
 
+class SourceExportRequestSerializer(SourceDataRequestSerializer):
+    format = serializers.ChoiceField(
+        choices=export.FORMATS, default=export.FORMAT_CSV, required=False
+    )
+
+    def __init__(self, *args, **kwargs):
+        super(SourceExportRequestSerializer, self).__init__(*args, **kwargs)
+        # exports always read only the requested columns
+        self.fields.pop("context_columns", None)
+        self.fields.pop("project_columns", None)
+        self.fields.pop("stream", None)
+        self.fields.pop("cursor", None)
+        self.fields.pop("columnar", None)
+
+    def validate_limit(self, value: int) -> int:
+        max_rows = export.get_config()["max_rows"]
+        if not 1 <= value <= max_rows:
+            raise serializers.ValidationError(f"limit must be between 1 and {max_rows}")
+        return value
+
+
 class SourceDataAndGraphDataRequestSerializer(serializers.Serializer):
     """Serializer for combined data and graph data requests"""
 
@@ -748,7 +902,24 @@ class SourceDataAndGraphDataRequestSerializer(serializers.Serializer):
     to = serializers.CharField()
     limit = serializers.IntegerField()
     group_by = serializers.CharField(allow_blank=True, required=False)
+    group_limit = serializers.IntegerField(
+        min_value=1,
+        allow_null=True,
+        required=False,
+        help_text="Number of series, other group by values are summed into __other__",
+    )
     context_columns = serializers.JSONField(allow_null=True, required=False)
+    no_cache = serializers.BooleanField(default=False, required=False)
+    project_columns = serializers.BooleanField(
+        default=False,
+        required=False,
+        help_text="Read only the requested columns instead of all source columns",
+    )
+    columnar = serializers.BooleanField(
+        default=False,
+        required=False,
+        help_text="Return rows as column arrays",
+    )
 
     def get_fields(self):
         fields = super().get_fields()
@@ -1,5 +1,6 @@
 from django.conf import settings
 from django.dispatch import receiver
+from django.db.models.signals import post_save, post_delete
 from django.core.exceptions import PermissionDenied
 from django.contrib.auth.models import User, Group
 from django.db import transaction
@@ -9,6 +10,9 @@ from allauth.socialaccount.signals import pre_social_login
 
 import requests
 
+from telescope.models import Connection, Source
+from telescope.fetchers import autocomplete_cache, clickhouse, compiled_queries
+
 
 @receiver([pre_social_login])
 def check_github_organization_membership(request, sociallogin, **kwargs):
@@ -65,3 +69,15 @@ def add_okta_user_to_default_group(request, user, **kwargs):
     if user.socialaccount_set.filter(provider="okta").exists():
         default_group, created = Group.objects.get_or_create(name=default_group_name)
         user.groups.add(default_group)
+
+
+@receiver([post_save, post_delete], sender=Connection)
+def invalidate_connection_clients(sender, instance, **kwargs):
+    clickhouse.invalidate_connection(instance.id)
+    autocomplete_cache.clear()
+
+
+@receiver([post_save, post_delete], sender=Source)
+def invalidate_source_caches(sender, instance, **kwargs):
+    autocomplete_cache.invalidate(instance.id)
+    compiled_queries.invalidate(instance.id)
@@ -0,0 +1,55 @@
+"""
+Streaming responses.
+
+Rows are serialized one by one while the fetcher produces them and sent in
+chunks of newline delimited JSON, so neither the list of row dicts nor the
+whole JSON document is held in memory.
+"""
+
+import json
+from typing import Callable, Iterable, Iterator
+
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+CHUNK_SIZE = 64 * 1024
+
+
+def dumps_line(data) -> bytes:
+    # default=str as in DefaultJSONRenderer, for datetimes and decimals
+    return json.dumps(data, separators=(",", ":"), default=str).encode() + b"\n"
+
+
+def chunked(items: Iterable[bytes], size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Joins small items into chunks of about `size` bytes."""
+    buffer = []
+    buffered = 0
+    for item in items:
+        buffer.append(item)
+        buffered += len(item)
+        if buffered >= size:
+            yield b"".join(buffer)
+            buffer = []
+            buffered = 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+class ClosingIterable:
+    """
+    Streaming response content running `on_close` when the response is
+    closed, which also happens when the client went away before the first
+    chunk and a generator would never reach its `finally`.
+    """
+
+    def __init__(self, iterable: Iterable[bytes], on_close: Callable[[], None]):
+        self.iterable = iterable
+        self.on_close = on_close
+
+    def __iter__(self):
+        return iter(self.iterable)
+
+    def close(self):
+        try:
+            if hasattr(self.iterable, "close"):
+                self.iterable.close()
+        finally:
+            self.on_close()
@@ -22,6 +22,7 @@ urlpatterns = [
     path("api/v1/sources/", source_api.SourceView.as_view()),
     path("api/v1/sources/<slug:slug>", source_api.SourceView.as_view()),
     path("api/v1/sources/<slug:slug>/", source_api.SourceView.as_view()),
+    path("api/v1/sources/<slug:slug>/export", source_api.SourceExportView.as_view()),
     path("ui/v1/config", index.ConfigView.as_view()),
     path("ui/v1/auth/whoami", auth.WhoAmIView.as_view()),
     path("ui/v1/auth/api_tokens", auth.UserAPITokenView.as_view()),
@@ -79,6 +80,10 @@ urlpatterns = [
         "ui/v1/sources/<slug:slug>/dataAndGraph",
         source.SourceDataAndGraphDataView.as_view(),
     ),
+    path(
+        "ui/v1/sources/<slug:slug>/cancel",
+        source.SourceCancelQueriesView.as_view(),
+    ),
     path(
         "ui/v1/sources/<slug:slug>/contextColumnData",
         source.SourceContextColumnDataView.as_view(),
@@ -99,6 +104,7 @@ urlpatterns = [
     path("ui/v1/sources/<slug:slug>", source.SourceView.as_view()),
     path("liveness", index.liveness, name="liveness"),
     path("readiness", index.readiness, name="readiness"),
+    path("metrics", index.metrics, name="metrics"),
     re_path("^api.*$", stub_api.ApiStubView.as_view()),
     re_path("^.*$", index.index),
 ]
@@ -9,6 +9,11 @@ from typing import List
 from rest_framework.renderers import JSONRenderer
 from rest_framework.compat import INDENT_SEPARATORS, LONG_SEPARATORS, SHORT_SEPARATORS
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
 CLICKHOUSE_TYPES: List[str] = [
     "aggregatefunction",
     "array",
@@ -225,6 +230,40 @@ class DefaultJSONRenderer(JSONRenderer):
         return ret.encode()
 
 
+class FastJSONRenderer(DefaultJSONRenderer):
+    """
+    Renders with orjson when it is installed, with the output of
+    DefaultJSONRenderer: datetimes, decimals and other unknown types are
+    passed to str(), non string keys are converted and \\u2028 and \\u2029
+    are escaped. NaN and infinity are rendered as null instead of failing.
+
+    Indented, spaced or ASCII only output and data orjson cannot serialize, such as
+    integers wider than 64 bits, are rendered by DefaultJSONRenderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if (
+            orjson is None
+            or self.ensure_ascii
+            or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(
+                data,
+                default=str,
+                option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS,
+            )
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        return ret.replace("\u2028".encode(), b"\\u2028").replace(
+            "\u2029".encode(), b"\\u2029"
+        )
+
+
 HUMAN_RELATED_TIME_REGEX = re.compile(r"^now(?:-(?P<value>[0-9]+)(?P<unit>[dhms]))?$")
 UNIT_TO_SECONDS = {
     "d": 24 * 60 * 60,
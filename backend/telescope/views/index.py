@@ -1,14 +1,17 @@
+import hmac
+
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
 from django.utils.decorators import method_decorator
 from django.conf import settings
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse
 
 from rest_framework.views import APIView
 from rest_framework.response import Response
 
 from telescope.response import UIResponse
 from telescope.models import HealthCheck
+from telescope import metrics as telescope_metrics
 
 
 @login_required
@@ -36,3 +39,15 @@ def readiness(request):
         return HttpResponse("ok", content_type="text/plain")
     except Exception:
         return HttpResponse("error", status=503, content_type="text/plain")
+
+
+def metrics(request):
+    config = settings.CONFIG["metrics"]
+    if not config["enabled"]:
+        return HttpResponse("not found", status=404, content_type="text/plain")
+    token = config["token"]
+    if token and not hmac.compare_digest(
+        request.headers.get("Authorization", ""), f"Bearer {token}"
+    ):
+        return HttpResponse("forbidden", status=403, content_type="text/plain")
+    return JsonResponse(telescope_metrics.snapshot())
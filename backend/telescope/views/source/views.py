@@ -1,7 +1,10 @@
 import logging
+from contextlib import ExitStack, contextmanager
+from typing import Optional
 
 from telescope.constants import UTC_ZONE, SOURCE_QUERY_MODE_COMBINED
 
+from django.http import StreamingHttpResponse
 from django.utils.decorators import method_decorator
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User, Group
@@ -13,7 +16,9 @@ from telescope.rbac.manager import RBACManager
 
 from telescope.services.source import SourceService, SourceSavedViewService
 from telescope.services.exceptions import SerializerValidationError
-from telescope.fetchers import get_fetchers
+from telescope.fetchers import get_fetchers, admission, budget, cancellation, stats
+from telescope.columns import get_required_column_names
+from telescope.fetchers.graph import get_group_limit
 from telescope.fetchers.request import (
     DataRequest,
     GraphDataRequest,
@@ -21,6 +26,7 @@ from telescope.fetchers.request import (
 )
 from telescope.rbac import permissions
 from telescope.response import UIResponse
+from telescope import columnar, streaming
 from telescope.models import Source, SavedView, Connection
 from telescope.serializers.source import (
     SourceRoleSerializer,
@@ -58,6 +64,9 @@ SCHEMA_KIND_TO_SERIALIZER = {
 source_srv = SourceService()
 rbac_manager = RBACManager()
 
+TAB_ID_HEADER = "X-Telescope-Tab"
+QUERY_CANCELLED_MSG = "query has been cancelled"
+
 
 class SourceRoleBindingView(APIView):
     @method_decorator(login_required)
@@ -292,14 +301,17 @@ class SourceDataAutocompleteView(APIView):
             return Response(response.as_dict())
         fetcher = get_fetchers()[source.kind]
         try:
-            autocomplete_response = fetcher.autocomplete(
-                source=source,
-                column=serializer.validated_data["column"],
-                time_from=serializer.validated_data["from"],
-                time_to=serializer.validated_data["to"],
-                value=serializer.validated_data["value"],
-            )
-        except ValueError as err:
+            with admission.admit(source, admission.LANE_CHEAP):
+                autocomplete_response = fetcher.autocomplete(
+                    source=source,
+                    column=serializer.validated_data["column"],
+                    time_from=serializer.validated_data["from"],
+                    time_to=serializer.validated_data["to"],
+                    value=serializer.validated_data["value"],
+                )
+        except admission.AdmissionRejected as err:
+            return get_busy_response(response, err)
+        except (ValueError, budget.BudgetExceeded) as err:
             response.mark_failed(str(err))
             return Response(response.as_dict())
         response.data["items"] = autocomplete_response.items
@@ -307,6 +319,130 @@ class SourceDataAutocompleteView(APIView):
         return Response(response.as_dict())
 
 
+def get_projected_columns(source, validated_data):
+    if not validated_data.get("project_columns"):
+        return None
+    return get_required_column_names(source, validated_data["columns"])
+
+
+def get_rows_data(rows, validated_data) -> dict:
+    if validated_data.get("columnar"):
+        return {"columnar": columnar.encode_fetched_rows(rows)}
+    return {"rows": [row.as_dict() for row in rows]}
+
+
+def get_cancellation_scope(request) -> Optional[str]:
+    tab_id = request.headers.get(TAB_ID_HEADER)
+    if not tab_id:
+        return None
+    session_key = request.session.session_key or f"user:{request.user.pk}"
+    return cancellation.make_scope(session_key, tab_id)
+
+
+@contextmanager
+def cancellable(request, source, kind: str):
+    """
+    Yields the cancel token of the request, a newer request of the same kind
+    from the same tab cancels it. Yields None for requests without a tab id
+    or when cancellation is disabled.
+    """
+    scope = get_cancellation_scope(request) if cancellation.is_enabled() else None
+    if scope is None:
+        yield None
+        return
+    token = cancellation.begin(scope, kind, source_id=source.id)
+    try:
+        yield token
+    finally:
+        cancellation.finish(token)
+
+
+def get_busy_response(response, err: admission.AdmissionRejected) -> Response:
+    response.mark_failed(str(err))
+    return Response(
+        response.as_dict(),
+        status=429,
+        headers={"Retry-After": str(err.retry_after)},
+    )
+
+
+def mark_fetch_failed(response, err, cancel_token):
+    if cancel_token is not None and cancel_token.is_cancelled():
+        response.mark_failed(QUERY_CANCELLED_MSG)
+    elif isinstance(err, budget.BudgetExceeded):
+        response.mark_failed(str(err))
+    else:
+        logger.exception(f"unhandled exception: {err}")
+        response.mark_failed(str(err))
+
+
+def get_data_stream_response(request, source, validated_data):
+    """
+    Returns the rows as newline delimited JSON: a `columns` line, a `row` line
+    per row sent as soon as the fetcher produced it, and an `end` line with
+    the result, messages and errors of the request.
+    """
+    response = UIResponse()
+    stack = ExitStack()
+    token = None
+    try:
+        token = stack.enter_context(
+            cancellable(request, source, cancellation.QUERY_KIND_DATA)
+        )
+        fetcher = get_fetchers()[source.kind]
+        data_request = DataRequest(
+            source=source,
+            query=validated_data.get("query", ""),
+            raw_query=validated_data.get("raw_query", ""),
+            time_from=validated_data["from"],
+            time_to=validated_data["to"],
+            limit=validated_data["limit"],
+            context_columns=validated_data["context_columns"],
+            columns=get_projected_columns(source, validated_data),
+            cancel_token=token,
+            cursor=validated_data.get("cursor"),
+        )
+        lane = admission.get_lane(data_request.time_from, data_request.time_to)
+        stack.enter_context(admission.admit(source, lane, cancel_token=token))
+        data_response = fetcher.stream_data(data_request, tz=UTC_ZONE)
+    except admission.AdmissionRejected as err:
+        stack.close()
+        return get_busy_response(response, err)
+    except Exception as err:
+        stack.close()
+        mark_fetch_failed(response, err, token)
+        return Response(response.as_dict())
+
+    columns = [f.as_dict() for f in validated_data["columns"]]
+
+    def lines():
+        yield streaming.dumps_line({"type": "columns", "columns": columns})
+        try:
+            for row in data_response.rows:
+                yield streaming.dumps_line({"type": "row", "row": row.as_dict()})
+        except Exception as err:
+            mark_fetch_failed(response, err, token)
+        else:
+            if data_response.error:
+                response.mark_failed(data_response.error)
+            else:
+                response.add_msg(data_response.message)
+        yield streaming.dumps_line(
+            {
+                "type": "end",
+                "result": response.result,
+                "messages": response.messages,
+                "errors": response.errors,
+            }
+        )
+
+    # the query slot and the cancel token are held until the stream is closed
+    return StreamingHttpResponse(
+        streaming.ClosingIterable(streaming.chunked(lines()), stack.close),
+        content_type=streaming.NDJSON_CONTENT_TYPE,
+    )
+
+
 class SourceDataView(APIView):
     @method_decorator(login_required)
     def post(self, request, slug):
@@ -327,35 +463,47 @@ class SourceDataView(APIView):
             response.validation["columns"] = serializer.errors
             return Response(response.as_dict())
 
-        try:
-            fetcher = get_fetchers()[source.kind]
-            data_request = DataRequest(
-                source=source,
-                query=serializer.validated_data.get("query", ""),
-                raw_query=serializer.validated_data.get("raw_query", ""),
-                time_from=serializer.validated_data["from"],
-                time_to=serializer.validated_data["to"],
-                limit=serializer.validated_data["limit"],
-                context_columns=serializer.validated_data["context_columns"],
-            )
-            data_response = fetcher.fetch_data(
-                data_request,
-                tz=UTC_ZONE,
-            )
-        except Exception as err:
-            logger.exception(f"unhandled exception: {err}")
-            response.mark_failed(str(err))
+        if serializer.validated_data["stream"]:
+            return get_data_stream_response(request, source, serializer.validated_data)
+
+        with cancellable(request, source, cancellation.QUERY_KIND_DATA) as token:
+            try:
+                fetcher = get_fetchers()[source.kind]
+                data_request = DataRequest(
+                    source=source,
+                    query=serializer.validated_data.get("query", ""),
+                    raw_query=serializer.validated_data.get("raw_query", ""),
+                    time_from=serializer.validated_data["from"],
+                    time_to=serializer.validated_data["to"],
+                    limit=serializer.validated_data["limit"],
+                    context_columns=serializer.validated_data["context_columns"],
+                    columns=get_projected_columns(source, serializer.validated_data),
+                    cancel_token=token,
+                    cursor=serializer.validated_data.get("cursor"),
+                )
+                lane = admission.get_lane(data_request.time_from, data_request.time_to)
+                with admission.admit(source, lane, cancel_token=token):
+                    data_response = fetcher.fetch_data(
+                        data_request,
+                        tz=UTC_ZONE,
+                    )
+            except admission.AdmissionRejected as err:
+                return get_busy_response(response, err)
+            except Exception as err:
+                mark_fetch_failed(response, err, token)
+                return Response(response.as_dict())
+
+        stats.log_stats(source, budget.REQUEST_TYPE_DATA, data_response.stats)
+        if data_response.error:
+            response.mark_failed(data_response.error)
         else:
-            if data_response.error:
-                response.mark_failed(data_response.error)
-            else:
-                response.data = {
-                    "columns": [
-                        f.as_dict() for f in serializer.validated_data["columns"]
-                    ],
-                    "rows": [row.as_dict() for row in data_response.rows],
-                    "message": data_response.message,
-                }
+            response.data = {
+                "columns": [f.as_dict() for f in serializer.validated_data["columns"]],
+                **get_rows_data(data_response.rows, serializer.validated_data),
+                "message": data_response.message,
+                "cursor": fetcher.get_next_cursor(data_request, data_response),
+                "stats": stats.get_stats_dict(data_response.stats),
+            }
         return Response(response.as_dict())
 
 
@@ -437,28 +585,43 @@ class SourceGraphDataView(APIView):
             response.validation["columns"] = serializer.errors
             return Response(response.as_dict())
 
-        try:
-            fetcher = get_fetchers()[source.kind]
-            graph_data_request = GraphDataRequest(
-                source=source,
-                query=serializer.validated_data.get("query", ""),
-                raw_query=serializer.validated_data.get("raw_query", ""),
-                time_from=serializer.validated_data["from"],
-                time_to=serializer.validated_data["to"],
-                group_by=serializer.validated_data["group_by"],
-                context_columns=serializer.validated_data["context_columns"],
-            )
-            logger.info("Fetching graph data with request: %s", graph_data_request)
-            graph_data_response = fetcher.fetch_graph_data(graph_data_request)
-        except Exception as err:
-            logger.exception("Unhandled error: %s", err)
-            response.mark_failed(str(err))
-        else:
-            response.data = {
-                "timestamps": graph_data_response.timestamps,
-                "data": graph_data_response.data,
-                "total": graph_data_response.total,
-            }
+        with cancellable(request, source, cancellation.QUERY_KIND_GRAPH) as token:
+            try:
+                fetcher = get_fetchers()[source.kind]
+                graph_data_request = GraphDataRequest(
+                    source=source,
+                    query=serializer.validated_data.get("query", ""),
+                    raw_query=serializer.validated_data.get("raw_query", ""),
+                    time_from=serializer.validated_data["from"],
+                    time_to=serializer.validated_data["to"],
+                    group_by=serializer.validated_data["group_by"],
+                    context_columns=serializer.validated_data["context_columns"],
+                    use_cache=not serializer.validated_data["no_cache"],
+                    cancel_token=token,
+                    group_limit=get_group_limit(
+                        serializer.validated_data.get("group_limit")
+                    ),
+                )
+                logger.info("Fetching graph data with request: %s", graph_data_request)
+                lane = admission.get_lane(
+                    graph_data_request.time_from, graph_data_request.time_to
+                )
+                with admission.admit(source, lane, cancel_token=token):
+                    graph_data_response = fetcher.fetch_graph_data(graph_data_request)
+            except admission.AdmissionRejected as err:
+                return get_busy_response(response, err)
+            except Exception as err:
+                mark_fetch_failed(response, err, token)
+                return Response(response.as_dict())
+
+        stats.log_stats(source, budget.REQUEST_TYPE_GRAPH, graph_data_response.stats)
+        response.data = {
+            "timestamps": graph_data_response.timestamps,
+            "data": graph_data_response.data,
+            "total": graph_data_response.total,
+            "other_groups": graph_data_response.other_groups,
+            "stats": stats.get_stats_dict(graph_data_response.stats),
+        }
         return Response(response.as_dict())
 
 
@@ -490,43 +653,98 @@ class SourceDataAndGraphDataView(APIView):
             response.validation["columns"] = serializer.errors
             return Response(response.as_dict())
 
+        with cancellable(
+            request, source, cancellation.QUERY_KIND_DATA_AND_GRAPH
+        ) as token:
+            try:
+                fetcher = get_fetchers()[source.kind]
+                combined_request = DataAndGraphDataRequest(
+                    source=source,
+                    query=serializer.validated_data.get("query", ""),
+                    raw_query=serializer.validated_data.get("raw_query", ""),
+                    time_from=serializer.validated_data["from"],
+                    time_to=serializer.validated_data["to"],
+                    limit=serializer.validated_data["limit"],
+                    group_by=serializer.validated_data["group_by"],
+                    context_columns=serializer.validated_data["context_columns"],
+                    use_cache=not serializer.validated_data["no_cache"],
+                    columns=get_projected_columns(source, serializer.validated_data),
+                    cancel_token=token,
+                    group_limit=get_group_limit(
+                        serializer.validated_data.get("group_limit")
+                    ),
+                )
+                lane = admission.get_lane(
+                    combined_request.time_from, combined_request.time_to
+                )
+                with admission.admit(source, lane, cancel_token=token):
+                    combined_response = fetcher.fetch_data_and_graph(
+                        combined_request,
+                        tz=UTC_ZONE,
+                    )
+            except admission.AdmissionRejected as err:
+                return get_busy_response(response, err)
+            except NotImplementedError:
+                response.mark_failed(
+                    "Combined fetch not supported for this source type"
+                )
+                return Response(response.as_dict())
+            except Exception as err:
+                mark_fetch_failed(response, err, token)
+                return Response(response.as_dict())
+
+        stats.log_stats(source, budget.REQUEST_TYPE_DATA, combined_response.stats)
+        stats.log_stats(
+            source, budget.REQUEST_TYPE_GRAPH, combined_response.graph_stats
+        )
+        if combined_response.error:
+            response.mark_failed(combined_response.error)
+        else:
+            response.data = {
+                "columns": [f.as_dict() for f in serializer.validated_data["columns"]],
+                **get_rows_data(combined_response.rows, serializer.validated_data),
+                "message": combined_response.message,
+                "cursor": fetcher.get_next_cursor(
+                    combined_request.as_data_request(), combined_response
+                ),
+                "stats": stats.get_stats_dict(combined_response.stats),
+                "graph": {
+                    "timestamps": combined_response.graph_timestamps,
+                    "data": combined_response.graph_data,
+                    "total": combined_response.graph_total,
+                    "other_groups": combined_response.graph_other_groups,
+                    "stats": stats.get_stats_dict(combined_response.graph_stats),
+                },
+            }
+        return Response(response.as_dict())
+
+
+class SourceCancelQueriesView(APIView):
+    """Cancels running data and graph queries of the source issued by the tab."""
+
+    @method_decorator(login_required)
+    def post(self, request, slug):
+        response = UIResponse()
+
+        source = rbac_manager.get_source(
+            user=request.user,
+            source_slug=slug,
+            required_permissions=[permissions.Source.USE.value],
+        )
+        if not cancellation.is_enabled():
+            response.data = {"cancelled": []}
+            return Response(response.as_dict())
+        scope = get_cancellation_scope(request)
+        if scope is None:
+            response.mark_failed(f"{TAB_ID_HEADER} header is required")
+            return Response(response.as_dict())
         try:
-            fetcher = get_fetchers()[source.kind]
-            combined_request = DataAndGraphDataRequest(
-                source=source,
-                query=serializer.validated_data.get("query", ""),
-                raw_query=serializer.validated_data.get("raw_query", ""),
-                time_from=serializer.validated_data["from"],
-                time_to=serializer.validated_data["to"],
-                limit=serializer.validated_data["limit"],
-                group_by=serializer.validated_data["group_by"],
-                context_columns=serializer.validated_data["context_columns"],
-            )
-            combined_response = fetcher.fetch_data_and_graph(
-                combined_request,
-                tz=UTC_ZONE,
-            )
-        except NotImplementedError:
-            response.mark_failed("Combined fetch not supported for this source type")
+            response.data = {
+                "cancelled": cancellation.cancel_scope(scope, source_id=source.id)
+            }
         except Exception as err:
-            logger.exception(f"unhandled exception: {err}")
-            response.mark_failed(str(err))
-        else:
-            if combined_response.error:
-                response.mark_failed(combined_response.error)
-            else:
-                response.data = {
-                    "columns": [
-                        f.as_dict() for f in serializer.validated_data["columns"]
-                    ],
-                    "rows": [row.as_dict() for row in combined_response.rows],
-                    "message": combined_response.message,
-                    "graph": {
-                        "timestamps": combined_response.graph_timestamps,
-                        "data": combined_response.graph_data,
-                        "total": combined_response.graph_total,
-                    },
-                }
+            logger.exception(err)
+            response.mark_failed(f"failed to cancel queries: {err}")
         return Response(response.as_dict())
 
 
@@ -1 +1,134 @@
+from unittest.mock import MagicMock, Mock, patch
+
+import pytest
+
+from telescope.fetchers.request import (
+    DataAndGraphDataRequest,
+    DataRequest,
+    GraphDataRequest,
+)
+from telescope.models import Source
+
 from tests.fixtures import *
+
+TIME_FROM = 1000000000000
+TIME_TO = 1000086400000
+
+
+@pytest.fixture
+def make_clickhouse_source():
+    """Builds mock ClickHouse sources, keyword arguments are added to `data`."""
+
+    def make(time_type="DateTime", **data):
+        source = Mock(spec=Source)
+        source.id = 1
+        source.data = {"database": "test_db", "table": "test_table", **data}
+        source.time_column = "timestamp"
+        source.date_column = None
+        source.uniq_column = None
+        source.severity_column = None
+        source.severity_rules = None
+        source.has_capability.return_value = False
+        source._record_pseudo_id_column = "_____record_pseudo_id"
+        source._record_severity_column = "_____record_severity"
+        source._columns = {
+            "timestamp": Mock(type=time_type),
+            "message": Mock(type="String"),
+        }
+        source.conn = Mock(id=1, data={"host": "localhost"})
+        return source
+
+    return make
+
+
+@pytest.fixture
+def mock_clickhouse_source(make_clickhouse_source):
+    return make_clickhouse_source()
+
+
+@pytest.fixture
+def clickhouse_connect():
+    with patch("telescope.fetchers.clickhouse.ClickhouseConnect") as connect:
+        yield connect
+
+
+@pytest.fixture
+def clickhouse_client(clickhouse_connect):
+    """The mock client of every ClickhouseConnect context."""
+    client = MagicMock()
+    clickhouse_connect.return_value.__enter__.return_value.client = client
+    return client
+
+
+@pytest.fixture
+def block_counts(clickhouse_client):
+    """
+    Sets the row counts of the blocks streamed to the queries of the client,
+    one count per query. Blocks hold ids only and are returned as rows as is.
+    """
+
+    def set_counts(rows_per_query):
+        streams = []
+        for count in rows_per_query:
+            stream = MagicMock()
+            stream.__enter__.return_value = iter([[["id"] * count]] if count else [])
+            streams.append(stream)
+        clickhouse_client.query_column_block_stream.side_effect = streams
+
+    with patch(
+        "telescope.fetchers.clickhouse.build_rows_from_block",
+        side_effect=lambda source, columns, block, tz: block[0],
+    ):
+        yield set_counts
+
+
+@pytest.fixture
+def make_data_request():
+    def make(source, **kwargs):
+        params = {
+            "query": None,
+            "raw_query": None,
+            "time_from": TIME_FROM,
+            "time_to": TIME_TO,
+            "limit": 100,
+            "context_columns": {},
+        }
+        params.update(kwargs)
+        return DataRequest(source=source, **params)
+
+    return make
+
+
+@pytest.fixture
+def make_graph_request():
+    def make(source, **kwargs):
+        params = {
+            "query": None,
+            "raw_query": None,
+            "time_from": TIME_FROM,
+            "time_to": TIME_TO,
+            "group_by": [],
+            "context_columns": {},
+        }
+        params.update(kwargs)
+        return GraphDataRequest(source=source, **params)
+
+    return make
+
+
+@pytest.fixture
+def make_data_and_graph_request():
+    def make(source, **kwargs):
+        params = {
+            "query": None,
+            "raw_query": None,
+            "time_from": TIME_FROM,
+            "time_to": TIME_TO,
+            "limit": 100,
+            "group_by": [],
+            "context_columns": {},
+        }
+        params.update(kwargs)
+        return DataAndGraphDataRequest(source=source, **params)
+
+    return make
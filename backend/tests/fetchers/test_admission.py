@@ -0,0 +1,96 @@
+import pytest
+from contextlib import ExitStack
+from unittest.mock import Mock, patch
+
+from django.conf import settings
+
+from telescope import metrics
+from telescope.fetchers import admission
+from telescope.fetchers.admission import (
+    AdmissionRejected,
+    LANE_CHEAP,
+    LANE_EXPENSIVE,
+)
+from telescope.fetchers.cancellation import CancelToken, QueryCancelled
+
+
+@pytest.fixture(autouse=True)
+def admission_config(tmp_path):
+    config = {
+        "enabled": True,
+        "lock_dir": str(tmp_path),
+        "wait_timeout": 0.1,
+        "retry_after": 3,
+        "expensive_range_seconds": 3600,
+        "lanes": {
+            "cheap": {"per_source": 2, "per_connection": 3},
+            "expensive": {"per_source": 1, "per_connection": 1},
+        },
+    }
+    with patch.dict(settings.CONFIG["fetchers"], {"admission": config}):
+        yield config
+
+
+def make_source(source_id, conn_id=1):
+    return Mock(id=source_id, conn=Mock(id=conn_id))
+
+
+def test_get_lane():
+    assert admission.get_lane(0, 3600 * 1000) == LANE_CHEAP
+    assert admission.get_lane(0, 3601 * 1000) == LANE_EXPENSIVE
+
+
+def test_source_slots_are_limited():
+    source = make_source(1)
+    before = metrics.get_counter("admission_rejected_cheap")
+    with ExitStack() as stack:
+        stack.enter_context(admission.admit(source, LANE_CHEAP))
+        stack.enter_context(admission.admit(source, LANE_CHEAP))
+        with pytest.raises(AdmissionRejected) as err:
+            stack.enter_context(admission.admit(source, LANE_CHEAP))
+
+    assert err.value.retry_after == 3
+    assert metrics.get_counter("admission_rejected_cheap") == before + 1
+    # slots are released when the blocks exit
+    with admission.admit(source, LANE_CHEAP):
+        pass
+
+
+def test_connection_slots_are_shared_by_sources():
+    with ExitStack() as stack:
+        stack.enter_context(admission.admit(make_source(1), LANE_CHEAP))
+        stack.enter_context(admission.admit(make_source(2), LANE_CHEAP))
+        stack.enter_context(admission.admit(make_source(3), LANE_CHEAP))
+        with pytest.raises(AdmissionRejected):
+            stack.enter_context(admission.admit(make_source(4), LANE_CHEAP))
+        # another connection is not affected
+        with admission.admit(make_source(4, conn_id=2), LANE_CHEAP):
+            pass
+
+
+def test_lanes_are_independent():
+    source = make_source(1)
+    with admission.admit(source, LANE_EXPENSIVE):
+        with pytest.raises(AdmissionRejected):
+            with admission.admit(source, LANE_EXPENSIVE):
+                pass
+        with admission.admit(source, LANE_CHEAP):
+            pass
+
+
+def test_cancelled_request_stops_waiting():
+    source = make_source(1)
+    token = CancelToken("q", "scope", "graph")
+    token.cancel()
+    with admission.admit(source, LANE_EXPENSIVE):
+        with pytest.raises(QueryCancelled):
+            with admission.admit(source, LANE_EXPENSIVE, cancel_token=token):
+                pass
+
+
+def test_disabled_admission_does_not_limit(admission_config):
+    admission_config["enabled"] = False
+    source = make_source(1)
+    with admission.admit(source, LANE_EXPENSIVE):
+        with admission.admit(source, LANE_EXPENSIVE):
+            pass
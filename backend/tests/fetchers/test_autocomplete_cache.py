@@ -0,0 +1,122 @@
+import time
+from unittest.mock import Mock, patch
+
+import pytest
+
+from telescope.fetchers.autocomplete_cache import AutocompleteCache, ValueIndex
+
+
+@pytest.fixture
+def autocomplete_cache():
+    cache = AutocompleteCache()
+    # indexes are built explicitly by calling refresh()
+    with patch.object(cache, "_start"):
+        yield cache
+
+
+@pytest.fixture
+def source():
+    source = Mock(id=1)
+    source.data = {"autocomplete_cache": True}
+    source._columns = {
+        "service": Mock(autocomplete=True),
+        "host": Mock(autocomplete=True),
+        "message": Mock(autocomplete=False),
+    }
+    source.column_catalog = Mock(fingerprint="columns")
+    source.conn = Mock(data={"host": "localhost"})
+    return source
+
+
+def test_value_index_matches_substrings_in_order():
+    index = ValueIndex(["db-2", "api", "db-1", "web-db", "api"], False, 0)
+
+    assert index.search("db") == (["db-1", "db-2", "web-db"], False)
+    assert index.search("") == (["api", "db-1", "db-2", "web-db"], False)
+
+
+def test_value_index_incomplete():
+    index = ValueIndex([f"value-{i}" for i in range(10)], False, 0)
+    assert index.search("value", limit=5)[1] is True
+
+    truncated = ValueIndex(["api"], True, 0)
+    assert truncated.search("api") == (["api"], True)
+
+
+def test_search_is_served_from_index_after_refresh(autocomplete_cache, source):
+    loader = Mock(return_value=["checkout", "cart", "auth"])
+    now = int(time.time() * 1000)
+
+    assert autocomplete_cache.search(source, "service", now - 1000, "c", loader) is None
+    autocomplete_cache.refresh()
+    response = autocomplete_cache.search(source, "service", now - 1000, "c", loader)
+
+    assert response.items == ["cart", "checkout"]
+    assert response.incomplete is False
+    loader.assert_called_once()
+    # memory is bounded per source, split between autocomplete columns
+    assert loader.call_args[0][2] == 50000
+
+
+def test_search_falls_back_outside_cached_window(autocomplete_cache, source):
+    loader = Mock(return_value=["auth"])
+    autocomplete_cache.search(source, "service", 0, "", loader)
+    autocomplete_cache.refresh()
+
+    assert autocomplete_cache.search(source, "service", 0, "", loader) is None
+
+
+def test_search_respects_column_autocomplete(autocomplete_cache, source):
+    loader = Mock(return_value=[])
+
+    assert autocomplete_cache.search(source, "message", 0, "", loader) is None
+    assert autocomplete_cache.search(source, "unknown", 0, "", loader) is None
+    autocomplete_cache.refresh()
+    loader.assert_not_called()
+
+
+def test_search_disabled_for_source(autocomplete_cache, source):
+    source.data = {}
+    loader = Mock(return_value=[])
+
+    assert autocomplete_cache.search(source, "service", 0, "", loader) is None
+    autocomplete_cache.refresh()
+    loader.assert_not_called()
+
+
+def test_invalidate_drops_source_indexes(autocomplete_cache, source):
+    loader = Mock(return_value=["auth"])
+    now = int(time.time() * 1000)
+    autocomplete_cache.search(source, "service", now, "", loader)
+    autocomplete_cache.refresh()
+
+    autocomplete_cache.invalidate(source.id)
+
+    assert autocomplete_cache.search(source, "service", now, "", loader) is None
+
+
+@pytest.mark.parametrize(
+    "change",
+    [
+        lambda source: source.data.update(table="logs_v2"),
+        lambda source: setattr(source.column_catalog, "fingerprint", "new columns"),
+        lambda source: source.conn.data.update(password="rotated"),
+    ],
+)
+def test_changed_source_rebuilds_its_indexes(autocomplete_cache, source, change):
+    # other workers learn about source changes from the sources they are given
+    loader = Mock(return_value=["auth"])
+    now = int(time.time() * 1000)
+    autocomplete_cache.search(source, "service", now, "", loader)
+    autocomplete_cache.refresh()
+    assert autocomplete_cache.search(source, "service", now, "", loader) is not None
+
+    change(source)
+    new_loader = Mock(return_value=["billing"])
+
+    assert autocomplete_cache.search(source, "service", now, "", new_loader) is None
+    autocomplete_cache.refresh()
+    response = autocomplete_cache.search(source, "service", now, "", new_loader)
+
+    assert response.items == ["billing"]
+    loader.assert_called_once()
@@ -0,0 +1,159 @@
+import uuid
+
+import pytest
+from unittest.mock import Mock, MagicMock, patch
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import override_settings
+
+from telescope import metrics
+from telescope.fetchers import cancellation
+from telescope.fetchers.cancellation import (
+    CancelToken,
+    QueryCancelled,
+    QUERY_KIND_DATA,
+    QUERY_KIND_GRAPH,
+)
+from telescope.fetchers.clickhouse import Fetcher as ClickhouseFetcher
+from telescope.fetchers.starrocks import Fetcher as StarrocksFetcher
+from telescope.fetchers.starrocks import tracked_connection
+from telescope.fetchers.request import GraphDataRequest
+from telescope.views.source.views import TAB_ID_HEADER, cancellable
+
+# the cache of the configuration, as other tests get an isolated cache
+get_configured_cache = cancellation.get_cache
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache():
+    # local memory caches of the same name share their storage
+    cache = LocMemCache(uuid.uuid4().hex, {})
+    with patch("telescope.fetchers.cancellation.get_cache", return_value=cache), patch(
+        "telescope.fetchers.cancellation.kill_query"
+    ) as kill_query:
+        yield kill_query
+
+
+def test_newer_query_of_the_tab_cancels_previous_one(isolated_cache):
+    scope = cancellation.make_scope("session", "tab")
+    first = cancellation.begin(scope, QUERY_KIND_DATA, source_id=1)
+    graph = cancellation.begin(scope, QUERY_KIND_GRAPH, source_id=1)
+    before = metrics.get_counter("queries_cancelled_superseded")
+
+    second = cancellation.begin(scope, QUERY_KIND_DATA, source_id=1)
+
+    assert first.is_cancelled()
+    assert not graph.is_cancelled()
+    assert not second.is_cancelled()
+    isolated_cache.assert_called_once_with(1, first.query_id)
+    assert metrics.get_counter("queries_cancelled_superseded") == before + 1
+    with pytest.raises(QueryCancelled):
+        first.check()
+
+
+def test_requests_are_tracked_only_when_enabled():
+    request = Mock(headers={TAB_ID_HEADER: "tab"})
+    source = Mock(id=1)
+
+    with cancellable(request, source, QUERY_KIND_DATA) as token:
+        assert token is None
+    with patch.dict(settings.CONFIG["fetchers"]["cancellation"], {"enabled": True}):
+        with cancellable(request, source, QUERY_KIND_DATA) as token:
+            assert token.source_id == 1
+
+
+def test_finished_query_is_not_cancelled(isolated_cache):
+    scope = cancellation.make_scope("session", "tab")
+    first = cancellation.begin(scope, QUERY_KIND_DATA, source_id=1)
+    cancellation.finish(first)
+
+    cancellation.begin(scope, QUERY_KIND_DATA, source_id=1)
+
+    assert not first.is_cancelled()
+    isolated_cache.assert_not_called()
+
+
+def test_cancel_scope_cancels_queries_of_the_source_only():
+    scope = cancellation.make_scope("session", "tab")
+    data = cancellation.begin(scope, QUERY_KIND_DATA, source_id=1)
+    graph = cancellation.begin(scope, QUERY_KIND_GRAPH, source_id=2)
+
+    assert cancellation.cancel_scope(scope, source_id=1) == [data.query_id]
+    assert data.is_cancelled()
+    assert not graph.is_cancelled()
+
+
+def test_cancellation_is_seen_by_other_workers():
+    scope = cancellation.make_scope("session", "tab")
+    token = cancellation.begin(scope, QUERY_KIND_DATA, source_id=1)
+    # the same query as seen by a worker which did not register it
+    remote = CancelToken(token.query_id, scope, QUERY_KIND_DATA, source_id=1)
+
+    cancellation.cancel_scope(scope)
+
+    assert remote.is_cancelled()
+
+
+def test_clickhouse_queries_are_tagged_and_killed_by_prefix():
+    token = CancelToken("telescope-abc-graph-1", "abc", QUERY_KIND_GRAPH)
+    source = Mock(id=1, time_column="timestamp", date_column=None)
+    source.data = {"database": "db", "table": "logs"}
+    source._columns = {"timestamp": Mock(type="DateTime")}
+    source.conn = Mock(id=1, data={"host": "localhost"})
+    mock_client = MagicMock()
+    mock_client.query.return_value.result_rows = []
+
+    with patch("telescope.fetchers.clickhouse.ClickhouseConnect") as connect:
+        connect.return_value.__enter__.return_value.client = mock_client
+        ClickhouseFetcher.fetch_graph_data(
+            GraphDataRequest(
+                source=source,
+                query="",
+                raw_query="",
+                time_from=1000000000000,
+                time_to=1000086400000,
+                group_by=[],
+                context_columns={},
+                use_cache=False,
+                cancel_token=token,
+            )
+        )
+        assert ClickhouseFetcher.cancel_query(source, token.query_id)
+
+    settings = mock_client.query.call_args[1]["settings"]
+    assert settings["query_id"] == "telescope-abc-graph-1-graph"
+    kill = mock_client.command.call_args[0][0]
+    assert kill.startswith("KILL QUERY WHERE startsWith(query_id, ")
+    assert "'telescope-abc-graph-1'" in kill
+
+
+def test_starrocks_connections_are_tracked_in_cancellation_cache():
+    token = CancelToken("telescope-abc-data-1", "abc", QUERY_KIND_DATA)
+    source = Mock(conn=Mock(data={"host": "localhost"}))
+    cancellation_caches = {
+        **settings.CACHES,
+        "cancellation": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": uuid.uuid4().hex,
+        },
+    }
+
+    # the configured cache instead of the isolated one
+    with override_settings(CACHES=cancellation_caches), patch.dict(
+        settings.CONFIG["fetchers"]["cancellation"], {"cache": "cancellation"}
+    ), patch("telescope.fetchers.cancellation.get_cache", get_configured_cache), patch(
+        "telescope.fetchers.starrocks.StarrocksConnect"
+    ) as connect:
+        with tracked_connection(
+            Mock(cancel_token=token), Mock(connection_id=42), "data"
+        ):
+            assert (
+                caches["cancellation"].get("query:starrocks:telescope-abc-data-1-data")
+                == 42
+            )
+            assert StarrocksFetcher.cancel_query(source, token.query_id)
+
+    cursor = connect.return_value.__enter__.return_value.client.cursor.return_value
+    cursor.execute.assert_called_once_with("KILL QUERY 42")
@@ -0,0 +1,117 @@
+import pytest
+from unittest.mock import patch
+
+from telescope.fetchers.clickhouse import (
+    Fetcher as ClickhouseFetcher,
+    get_time_windows,
+    get_window_start_from_histogram,
+)
+from telescope.fetchers.response import GraphDataResponse
+from telescope.constants import UTC_ZONE
+
+TIME_FROM = 1000000000000
+TIME_TO = 1000086400000
+
+
+@pytest.fixture
+def mock_clickhouse_source(make_clickhouse_source):
+    return make_clickhouse_source(adaptive_window=True)
+
+
+@pytest.fixture
+def fetch_data(clickhouse_client, block_counts, make_data_request):
+    def fetch(source, rows_per_window, limit=100, histogram=None):
+        block_counts(rows_per_window)
+        return ClickhouseFetcher.fetch_data(
+            make_data_request(source, limit=limit, histogram=histogram),
+            tz=UTC_ZONE,
+        )
+
+    return fetch
+
+
+def executed_queries(mock_client):
+    return [call[0][0] for call in mock_client.query_column_block_stream.call_args_list]
+
+
+def test_get_time_windows_cover_range_without_overlaps():
+    windows = get_time_windows(0, 10000, 9000, 4)
+
+    assert windows == [(9000, 10000), (6000, 9000), (0, 6000)]
+
+
+def test_get_time_windows_single_window_when_start_is_out_of_range():
+    assert get_time_windows(0, 10000, -100, 4) == [(0, 10000)]
+
+
+def test_get_window_start_from_histogram():
+    histogram = GraphDataResponse(
+        timestamps=[0, 100, 200, 300],
+        data={"a": [1, 2, 3, 0], "b": [0, 0, 1, 1]},
+        total=9,
+    )
+
+    assert get_window_start_from_histogram(histogram, 0, 2) == 200
+    assert get_window_start_from_histogram(histogram, 0, 6) == 100
+    assert get_window_start_from_histogram(histogram, 0, 100) == 0
+
+
+def test_adaptive_fetch_stops_when_limit_is_satisfied(
+    mock_clickhouse_source, clickhouse_client, fetch_data
+):
+    response = fetch_data(mock_clickhouse_source, [30, 0, 80, 50])
+
+    queries = executed_queries(clickhouse_client)
+    assert len(queries) == 3
+    assert len(response.rows) == 110
+    assert "BETWEEN fromUnixTimestamp64Milli(1000086100000)" in queries[0]
+    assert "LIMIT 100" in queries[0]
+    assert "< fromUnixTimestamp64Milli(1000086100000)" in queries[1]
+    assert "LIMIT 70" in queries[1]
+    assert "LIMIT 70" in queries[2]
+
+
+def test_adaptive_fetch_ends_at_time_from(
+    mock_clickhouse_source, clickhouse_client, fetch_data
+):
+    response = fetch_data(mock_clickhouse_source, [0] * 10)
+
+    queries = executed_queries(clickhouse_client)
+    assert response.rows == []
+    assert f">= fromUnixTimestamp64Milli({TIME_FROM})" in queries[-1]
+
+
+def test_adaptive_fetch_starts_from_histogram_window(
+    mock_clickhouse_source, clickhouse_client, fetch_data
+):
+    histogram = GraphDataResponse(
+        timestamps=[TIME_FROM, 1000080000000, TIME_TO],
+        data={"Rows": [500, 200, 0]},
+        total=700,
+    )
+    fetch_data(mock_clickhouse_source, [100], histogram=histogram)
+
+    queries = executed_queries(clickhouse_client)
+    assert len(queries) == 1
+    assert "BETWEEN fromUnixTimestamp64Milli(1000080000000)" in queries[0]
+
+
+def test_combined_adaptive_fetch_uses_graph_as_histogram(
+    mock_clickhouse_source, make_data_and_graph_request
+):
+    with patch.object(
+        ClickhouseFetcher, "_fetch_graph_data"
+    ) as fetch_graph, patch.object(ClickhouseFetcher, "_fetch_data") as fetch_rows:
+        fetch_graph.return_value = GraphDataResponse(
+            timestamps=[TIME_FROM, TIME_TO], data={}, total=0
+        )
+        fetch_rows.return_value.rows = []
+        fetch_rows.return_value.error = None
+        fetch_rows.return_value.message = None
+        ClickhouseFetcher.fetch_data_and_graph(
+            make_data_and_graph_request(mock_clickhouse_source),
+            tz=UTC_ZONE,
+        )
+
+    data_request = fetch_rows.call_args[0][0]
+    assert data_request.histogram is fetch_graph.return_value
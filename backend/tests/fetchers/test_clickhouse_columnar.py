@@ -0,0 +1,108 @@
+from datetime import datetime
+from unittest.mock import Mock
+
+import pytest
+
+from telescope.fetchers.clickhouse import Fetcher as ClickhouseFetcher
+from telescope.fetchers.models import format_time, format_times
+from telescope.constants import UTC_ZONE
+
+TIMES = [
+    datetime(2024, 1, 1, 10, 0, 0, 120000, tzinfo=UTC_ZONE),
+    datetime(2024, 1, 1, 10, 0, 0, 450000, tzinfo=UTC_ZONE),
+    datetime(2024, 1, 1, 10, 0, 1, tzinfo=UTC_ZONE),
+]
+MESSAGES = ["first", "second", "third"]
+
+
+@pytest.fixture
+def mock_clickhouse_source(make_clickhouse_source):
+    return make_clickhouse_source(time_type="DateTime64(6)")
+
+
+@pytest.fixture
+def data_request(make_data_request, mock_clickhouse_source):
+    return make_data_request(mock_clickhouse_source, time_to=2000000000000)
+
+
+@pytest.fixture
+def mock_client(clickhouse_client):
+    ids = ["id-1", "id-2", "id-3"]
+    # selected columns are the pseudo id followed by sorted column names
+    clickhouse_client.query.return_value.result_rows = list(zip(ids, MESSAGES, TIMES))
+    stream = clickhouse_client.query_column_block_stream.return_value
+    stream.__enter__.side_effect = lambda: iter(
+        [
+            [ids[:2], MESSAGES[:2], TIMES[:2]],
+            [ids[2:], MESSAGES[2:], TIMES[2:]],
+        ]
+    )
+    return clickhouse_client
+
+
+def fetch_rows(mock_client, request):
+    mock_client.reset_mock()
+    response = ClickhouseFetcher.fetch_data(request, tz=UTC_ZONE)
+    return [(row.data, row.time) for row in response.rows]
+
+
+def test_format_times_matches_format_time():
+    assert format_times(TIMES) == [format_time(dt) for dt in TIMES]
+
+
+def test_format_times_applies_timezone_to_naive_values():
+    naive = [dt.replace(tzinfo=None) for dt in TIMES]
+    assert format_times(naive, UTC_ZONE) == format_times(TIMES)
+
+
+def test_fetch_data_reads_column_blocks_by_default(mock_client, data_request):
+    rows = fetch_rows(mock_client, data_request)
+
+    assert mock_client.query_column_block_stream.called
+    assert not mock_client.query.called
+    assert [data["message"] for data, _ in rows] == MESSAGES
+    assert [time["microseconds"] for _, time in rows] == ["120000", "450000", "000000"]
+
+
+def test_fetch_data_rows_mode_matches_columnar(
+    mock_client, mock_clickhouse_source, data_request
+):
+    columnar_rows = fetch_rows(mock_client, data_request)
+
+    mock_clickhouse_source.data["fetch_mode"] = "rows"
+    tuple_rows = fetch_rows(mock_client, data_request)
+
+    assert mock_client.query.called
+    assert not mock_client.query_column_block_stream.called
+    assert tuple_rows == columnar_rows
+
+
+def test_fetch_data_selects_only_projected_columns(
+    mock_client, mock_clickhouse_source, data_request
+):
+    mock_clickhouse_source._columns["payload"] = Mock(type="String")
+    data_request.columns = ["message", "timestamp"]
+
+    response = ClickhouseFetcher.fetch_data(data_request, tz=UTC_ZONE)
+
+    query = mock_client.query_column_block_stream.call_args[0][0]
+    assert "`payload`" not in query
+    assert "`message`" in query
+    assert "payload" not in response.rows[0].data
+
+
+def test_stream_data_yields_rows_while_reading_blocks(
+    mock_client, clickhouse_connect, data_request
+):
+    mock_context = clickhouse_connect.return_value
+
+    response = ClickhouseFetcher.stream_data(data_request, tz=UTC_ZONE)
+    # nothing is read before the rows are consumed
+    assert not mock_client.query_column_block_stream.called
+    rows = iter(response.rows)
+    assert next(rows).data["message"] == "first"
+    assert not mock_context.__exit__.called
+
+    assert [row.data["message"] for row in rows] == MESSAGES[1:]
+    # the pooled client is released after the last row
+    assert mock_context.__exit__.called
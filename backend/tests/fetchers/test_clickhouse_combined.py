@@ -0,0 +1,63 @@
+import pytest
+from unittest.mock import patch
+
+from telescope.fetchers.clickhouse import Fetcher as ClickhouseFetcher
+from telescope.constants import UTC_ZONE
+
+
+@pytest.fixture
+def request_with_filter(make_data_and_graph_request, mock_clickhouse_source):
+    return make_data_and_graph_request(
+        mock_clickhouse_source, query="message:error", time_to=1000000060000
+    )
+
+
+@pytest.fixture
+def graph_client(clickhouse_client):
+    clickhouse_client.query.return_value.result_rows = [
+        (1000000020000, 3),
+        (1000000040000, 2),
+    ]
+    stream = clickhouse_client.query_column_block_stream.return_value
+    stream.__enter__.return_value = iter([])
+    return clickhouse_client
+
+
+@patch("telescope.fetchers.clickhouse.build_filter_clause")
+def test_fetch_data_and_graph_compiles_filter_once(
+    mock_build_filter_clause, clickhouse_connect, graph_client, request_with_filter
+):
+    mock_build_filter_clause.return_value = "message = 'error'"
+
+    response = ClickhouseFetcher.fetch_data_and_graph(request_with_filter, tz=UTC_ZONE)
+
+    mock_build_filter_clause.assert_called_once()
+    queries = [
+        graph_client.query.call_args[0][0],
+        graph_client.query_column_block_stream.call_args[0][0],
+    ]
+    for query in queries:
+        assert "message = 'error'" in query
+    for call in clickhouse_connect.call_args_list:
+        assert call.kwargs["conn_id"] == 1
+
+    assert response.rows == []
+    assert response.graph_total == 5
+    expected = [0] * 61
+    expected[20] = 3
+    expected[40] = 2
+    assert response.graph_data == {"Rows": expected}
+    assert response.graph_timestamps == list(range(1000000000000, 1000000061000, 1000))
+
+
+def test_fetch_data_and_graph_propagates_query_errors(
+    graph_client, request_with_filter
+):
+    graph_client.query.side_effect = RuntimeError("Code: 60. Unknown table")
+    graph_client.query_column_block_stream.side_effect = RuntimeError(
+        "Code: 60. Unknown table"
+    )
+
+    request_with_filter.query = ""
+    with pytest.raises(RuntimeError):
+        ClickhouseFetcher.fetch_data_and_graph(request_with_filter, tz=UTC_ZONE)
@@ -0,0 +1,122 @@
+import pytest
+from unittest.mock import Mock
+
+from telescope.fetchers.clickhouse import (
+    Fetcher as ClickhouseFetcher,
+    GraphQuery,
+    build_graph_response,
+    get_graph_buckets,
+)
+
+TIME_FROM = 1000000000500
+TIME_TO = 1000000300500
+
+
+@pytest.fixture
+def fetch_graph(clickhouse_client, make_graph_request):
+    def fetch(source, result_rows, time_to=TIME_TO, group_by=None, group_limit=None):
+        clickhouse_client.query.return_value.result_rows = result_rows
+        response = ClickhouseFetcher.fetch_graph_data(
+            make_graph_request(
+                source,
+                time_from=TIME_FROM,
+                time_to=time_to,
+                group_by=group_by or [],
+                group_limit=group_limit,
+            )
+        )
+        return clickhouse_client.query.call_args[0][0], response
+
+    return fetch
+
+
+def test_get_graph_buckets_are_epoch_aligned():
+    buckets = get_graph_buckets(TIME_FROM, TIME_TO, 2)
+
+    assert buckets.start == 1000000000000
+    assert buckets.stop == 1000000302000
+    assert buckets.step == 2000
+    assert all(ts % 2000 == 0 for ts in buckets)
+
+
+def test_fetch_graph_data_fills_missing_buckets(mock_clickhouse_source, fetch_graph):
+    query, response = fetch_graph(mock_clickhouse_source, [(1000000004000, 2)])
+
+    assert "WITH FILL" not in query
+    assert query.endswith("GROUP BY t ORDER BY t")
+    assert response.timestamps == sorted(
+        {TIME_FROM, TIME_TO, *range(1000000000000, 1000000302000, 2000)}
+    )
+    assert response.data["Rows"][response.timestamps.index(1000000004000)] == 2
+    assert sum(response.data["Rows"]) == 2
+
+
+def test_fetch_graph_data_folds_groups_outside_of_top(
+    mock_clickhouse_source, fetch_graph
+):
+    group_by = Mock(jsonstring=False, root_name="message")
+    group_by.name = "message"
+
+    query, response = fetch_graph(
+        mock_clickhouse_source,
+        [(1000000000000, 3, 1, 4, "a"), (1000000000000, 2, 0, 4, "b")],
+        group_by=[group_by],
+        group_limit=2,
+    )
+
+    assert "dense_rank() OVER (ORDER BY `__total` DESC, `message`)" in query
+    assert "GROUP BY t, `__group` ORDER BY t" in query
+    assert response.data["a"][0] == 3
+    assert response.data["__other__"][0] == 2
+    assert response.other_groups == 2
+
+
+def test_fetch_graph_data_groups_by_several_columns(
+    mock_clickhouse_source, fetch_graph
+):
+    level = Mock(jsonstring=False, root_name="level")
+    level.name = "level"
+    host = Mock(jsonstring=False, root_name="host")
+    host.name = "host"
+
+    query, response = fetch_graph(
+        mock_clickhouse_source,
+        [(1000000000000, 3, "error", "web"), (1000000000000, 1, "info", "")],
+        group_by=[level, host],
+    )
+
+    assert ", toString(level) as `level`, toString(host) as `host` FROM" in query
+    assert "GROUP BY t, `level`, `host` ORDER BY t" in query
+    assert response.data["error / web"][0] == 3
+    assert response.data["info / __none__"][0] == 1
+
+
+def test_fetch_graph_data_short_range_keeps_raw_timestamps(
+    mock_clickhouse_source, fetch_graph
+):
+    query, response = fetch_graph(
+        mock_clickhouse_source,
+        [(1000000001000, 4)],
+        time_to=TIME_FROM + 10000,
+    )
+
+    assert response.timestamps == [TIME_FROM, 1000000001000, TIME_FROM + 10000]
+    assert response.data == {"Rows": [0, 4, 0]}
+
+
+def test_build_graph_response_handles_missing_buckets():
+    graph_query = GraphQuery(sql="", grouped=True, buckets=range(0, 5000, 1000))
+    result_rows = [
+        (1000, 2, "error"),
+        (3000, 1, "error"),
+        (0, 5, ""),
+    ]
+
+    response = build_graph_response(result_rows, 0, 4500, graph_query)
+
+    assert response.timestamps == [0, 1000, 2000, 3000, 4000, 4500]
+    assert response.data == {
+        "error": [0, 2, 0, 1, 0, 0],
+        "__none__": [5, 0, 0, 0, 0, 0],
+    }
+    assert response.total == 8
@@ -0,0 +1,87 @@
+import pytest
+from unittest.mock import patch
+
+from telescope.fetchers.clickhouse import (
+    Fetcher as ClickhouseFetcher,
+    LATE_KEYS_TABLE,
+    get_row_key_columns,
+)
+from telescope.constants import UTC_ZONE
+
+
+@pytest.fixture
+def mock_clickhouse_source(make_clickhouse_source):
+    return make_clickhouse_source(late_materialization=True)
+
+
+@pytest.fixture
+def fetch_data(clickhouse_client, block_counts, make_data_request):
+    def fetch(source, keys, rows_per_query):
+        clickhouse_client.query.return_value.result_rows = keys
+        block_counts(rows_per_query)
+        return ClickhouseFetcher.fetch_data(make_data_request(source), tz=UTC_ZONE)
+
+    return fetch
+
+
+def test_row_key_columns_prefer_uniq_column(mock_clickhouse_source):
+    assert get_row_key_columns(mock_clickhouse_source) == [
+        ("_part", "String"),
+        ("_part_offset", "UInt64"),
+    ]
+
+    mock_clickhouse_source.uniq_column = "message"
+    assert get_row_key_columns(mock_clickhouse_source) == [("`message`", "String")]
+
+
+def test_late_fetch_reads_keys_then_rows(
+    mock_clickhouse_source, clickhouse_client, fetch_data
+):
+    keys = [("all_1_1_0", 7, 1000000005000), ("all_2_2_0", 3, 1000000001000)]
+    with patch("telescope.fetchers.clickhouse.ExternalData") as external_data:
+        response = fetch_data(mock_clickhouse_source, keys, [2])
+
+    keys_query = clickhouse_client.query.call_args[0][0]
+    assert keys_query.startswith("SELECT _part, _part_offset, toUnixTimestamp64Milli(")
+    assert "LIMIT 100" in keys_query
+
+    rows_call = clickhouse_client.query_column_block_stream.call_args
+    rows_query = rows_call[0][0]
+    assert f"(_part, _part_offset) IN (SELECT * FROM {LATE_KEYS_TABLE})" in rows_query
+    assert ">= fromUnixTimestamp64Milli(1000000001000)" in rows_query
+    assert "< fromUnixTimestamp64Milli(1000000005001)" in rows_query
+    assert "LIMIT 2" in rows_query
+
+    assert rows_call[1]["external_data"] is external_data.return_value
+    assert external_data.call_args[1]["file_name"] == LATE_KEYS_TABLE
+    assert external_data.call_args[1]["data"] == b"all_1_1_0\t7\nall_2_2_0\t3\n"
+    assert external_data.call_args[1]["structure"] == ["k0 String", "k1 UInt64"]
+    assert len(response.rows) == 2
+
+
+def test_late_fetch_without_keys_skips_second_phase(
+    mock_clickhouse_source, clickhouse_client, fetch_data
+):
+    response = fetch_data(mock_clickhouse_source, [], [])
+
+    assert response.rows == []
+    clickhouse_client.query_column_block_stream.assert_not_called()
+
+
+def test_late_fetch_falls_back_when_rows_are_missing(
+    mock_clickhouse_source, clickhouse_client, fetch_data
+):
+    keys = [("all_1_1_0", 7, 1000000005000), ("all_2_2_0", 3, 1000000001000)]
+    with patch("telescope.fetchers.clickhouse.ExternalData"):
+        response = fetch_data(mock_clickhouse_source, keys, [1, 2])
+
+    queries = [
+        call[0][0]
+        for call in clickhouse_client.query_column_block_stream.call_args_list
+    ]
+    assert len(queries) == 2
+    assert LATE_KEYS_TABLE not in queries[1]
+    assert (
+        "external_data" not in clickhouse_client.query_column_block_stream.call_args[1]
+    )
+    assert len(response.rows) == 2
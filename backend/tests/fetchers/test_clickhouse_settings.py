@@ -91,8 +91,8 @@ def test_fetch_data_includes_settings(mock_clickhouse_connect, mock_clickhouse_s
     ClickhouseFetcher.fetch_data(request, tz=UTC_ZONE)
 
     # Verify query was called
-    assert mock_client.query.called
-    query = mock_client.query.call_args[0][0]
+    assert mock_client.query_column_block_stream.called
+    query = mock_client.query_column_block_stream.call_args[0][0]
 
     # Assert SETTINGS clause is present
     assert "SETTINGS" in query
@@ -133,8 +133,8 @@ def test_fetch_data_without_settings(
     ClickhouseFetcher.fetch_data(request, tz=UTC_ZONE)
 
     # Verify query was called
-    assert mock_client.query.called
-    query = mock_client.query.call_args[0][0]
+    assert mock_client.query_column_block_stream.called
+    query = mock_client.query_column_block_stream.call_args[0][0]
 
     # Assert SETTINGS clause is NOT present
     assert "SETTINGS" not in query
@@ -246,8 +246,8 @@ def test_settings_empty_string_not_added(
     ClickhouseFetcher.fetch_data(request, tz=UTC_ZONE)
 
     # Verify query was called
-    assert mock_client.query.called
-    query = mock_client.query.call_args[0][0]
+    assert mock_client.query_column_block_stream.called
+    query = mock_client.query_column_block_stream.call_args[0][0]
 
     # Assert SETTINGS clause is NOT present for empty string
     assert "SETTINGS" not in query
@@ -281,7 +281,7 @@ def test_settings_query_position(mock_clickhouse_connect, mock_clickhouse_source
     ClickhouseFetcher.fetch_data(request, tz=UTC_ZONE)
 
     # Verify query structure
-    query = mock_client.query.call_args[0][0]
+    query = mock_client.query_column_block_stream.call_args[0][0]
 
     # Assert query structure: SELECT ... FROM ... WHERE ... ORDER BY ... LIMIT ... SETTINGS ...
     assert "SELECT" in query
@@ -0,0 +1,220 @@
+import threading
+import uuid
+
+import pytest
+from unittest.mock import Mock, MagicMock, patch
+
+from django.conf import settings
+from django.core.cache.backends.locmem import LocMemCache
+
+from telescope.fetchers import sharding
+from telescope.fetchers.cancellation import (
+    CancelToken,
+    QUERY_KIND_DATA,
+    QUERY_KIND_GRAPH,
+)
+from telescope.fetchers.clickhouse import Fetcher as ClickhouseFetcher
+from telescope.constants import UTC_ZONE
+
+DAY = 86400000
+TIME_FROM = 1000000000000
+TIME_TO = TIME_FROM + 3 * DAY
+# shards of the range, newest first
+SHARDS = [
+    (11577 * DAY, TIME_TO),
+    (11576 * DAY, 11577 * DAY),
+    (11575 * DAY, 11576 * DAY),
+    (TIME_FROM, 11575 * DAY),
+]
+
+
+@pytest.fixture(autouse=True)
+def sharding_config():
+    config = {"shard_seconds": 86400, "max_shards": 32, "max_workers": 2}
+    with patch.dict(settings.CONFIG["fetchers"]["sharded_execution"], config):
+        yield
+
+
+@pytest.fixture
+def mock_clickhouse_source(make_clickhouse_source):
+    return make_clickhouse_source(sharded_execution=True)
+
+
+def get_shard_idx(sql):
+    for idx, (lower, _) in enumerate(SHARDS):
+        if f"fromUnixTimestamp64Milli({lower}) and" in sql:
+            return idx
+    raise AssertionError(f"no shard in {sql}")
+
+
+@pytest.fixture
+def fetch_data(clickhouse_client, make_data_request):
+    def fetch(source, rows_per_shard, limit=100):
+        def query_stream(sql, **kwargs):
+            # rows are the shard index, blocks are not turned into rows
+            count = rows_per_shard[get_shard_idx(sql)]
+            stream = MagicMock()
+            stream.__enter__.return_value = iter(
+                [[[get_shard_idx(sql)] * count]] if count else []
+            )
+            return stream
+
+        clickhouse_client.query_column_block_stream.side_effect = query_stream
+        with patch(
+            "telescope.fetchers.clickhouse.build_rows_from_block",
+            side_effect=lambda source, columns, block, tz: block[0],
+        ):
+            return ClickhouseFetcher.fetch_data(
+                make_data_request(
+                    source, time_from=TIME_FROM, time_to=TIME_TO, limit=limit
+                ),
+                tz=UTC_ZONE,
+            )
+
+    return fetch
+
+
+@pytest.fixture
+def fetch_graph(clickhouse_client, make_graph_request):
+    def fetch(source, rows_per_shard, group_by=None, group_limit=None):
+        token = CancelToken("telescope-abc-graph-1", "abc", QUERY_KIND_GRAPH)
+
+        def query(sql, settings):
+            idx = int(settings["query_id"].rsplit("-", 1)[1])
+            return Mock(result_rows=rows_per_shard[idx], summary={"read_rows": "10"})
+
+        clickhouse_client.query.side_effect = query
+        response = ClickhouseFetcher.fetch_graph_data(
+            make_graph_request(
+                source,
+                time_from=TIME_FROM,
+                time_to=TIME_TO,
+                group_by=group_by or [],
+                use_cache=False,
+                group_limit=group_limit,
+                cancel_token=token,
+            )
+        )
+        return clickhouse_client, response
+
+    return fetch
+
+
+def test_split_range_is_day_aligned_newest_first():
+    assert sharding.split_range(TIME_FROM, TIME_TO, DAY, 32) == SHARDS
+
+
+def test_split_range_skips_empty_shard_at_aligned_end():
+    assert sharding.split_range(0, 2 * DAY, DAY, 32) == [(DAY, 2 * DAY), (0, DAY)]
+
+
+def test_split_range_widens_shards_over_max_shards():
+    assert sharding.split_range(0, 10 * DAY - 1, DAY, 4) == [
+        (9 * DAY, 10 * DAY - 1),
+        (6 * DAY, 9 * DAY),
+        (3 * DAY, 6 * DAY),
+        (0, 3 * DAY),
+    ]
+
+
+def test_short_range_is_not_sharded(mock_clickhouse_source):
+    day_start = 11575 * DAY
+
+    assert sharding.get_shards(mock_clickhouse_source, TIME_FROM, TIME_TO) == SHARDS
+    assert sharding.get_shards(mock_clickhouse_source, day_start, day_start + 1) == []
+    mock_clickhouse_source.data["sharded_execution"] = False
+    assert sharding.get_shards(mock_clickhouse_source, TIME_FROM, TIME_TO) == []
+
+
+def test_sharded_rows_are_taken_newest_first_up_to_limit(
+    mock_clickhouse_source, fetch_data
+):
+    response = fetch_data(mock_clickhouse_source, [30, 0, 80, 50])
+
+    assert response.rows == [0] * 30 + [2] * 70
+    assert response.stats.shards == 4
+    assert response.stats.shards_done == 3
+    assert response.stats.result_rows == 100
+
+
+def test_sharded_rows_read_all_shards_below_limit(mock_clickhouse_source, fetch_data):
+    response = fetch_data(mock_clickhouse_source, [1, 2, 3, 4])
+
+    assert response.rows == [0, 1, 1, 2, 2, 2, 3, 3, 3, 3]
+    assert response.stats.shards_done == 4
+
+
+def test_running_shards_are_killed_and_waited_for_at_limit(
+    mock_clickhouse_source, clickhouse_client, make_data_request
+):
+    killed = threading.Event()
+    finished = []
+
+    def query_stream(sql, **kwargs):
+        idx = get_shard_idx(sql)
+        if idx == 1:
+            # the older shard runs until it is killed
+            assert killed.wait(5)
+            finished.append(idx)
+        stream = MagicMock()
+        stream.__enter__.return_value = iter([[[idx] * 100]])
+        return stream
+
+    clickhouse_client.query_column_block_stream.side_effect = query_stream
+    clickhouse_client.command.side_effect = lambda sql: killed.set()
+    cancellation_cache = LocMemCache(uuid.uuid4().hex, {})
+    request = make_data_request(
+        mock_clickhouse_source,
+        time_from=TIME_FROM,
+        time_to=TIME_TO,
+        cancel_token=CancelToken("telescope-abc-data-1", "abc", QUERY_KIND_DATA),
+    )
+    with patch(
+        "telescope.fetchers.cancellation.get_cache", return_value=cancellation_cache
+    ), patch(
+        "telescope.fetchers.clickhouse.build_rows_from_block",
+        side_effect=lambda source, columns, block, tz: block[0],
+    ):
+        response = ClickhouseFetcher.fetch_data(request, tz=UTC_ZONE)
+
+    assert response.rows == [0] * 100
+    clickhouse_client.command.assert_called_once_with(
+        "KILL QUERY WHERE startsWith(query_id, 'telescope-abc-data-1-data-') ASYNC"
+    )
+    assert finished == [1]
+    assert clickhouse_client.query_column_block_stream.call_count == 2
+
+
+def test_sharded_graph_merges_shard_buckets(mock_clickhouse_source, fetch_graph):
+    step = 1728000  # bucket interval of a 3 days range
+    mock_client, response = fetch_graph(
+        mock_clickhouse_source,
+        [[], [(11576 * DAY, 2)], [(11576 * DAY - step, 3)], [(TIME_FROM, 1)]],
+    )
+
+    calls = mock_client.query.call_args_list
+    assert len({call[1]["settings"]["query_id"] for call in calls}) == 4
+    assert response.total == 6
+    series = response.data["Rows"]
+    assert series[response.timestamps.index(11576 * DAY)] == 2
+    assert series[response.timestamps.index(11576 * DAY - step)] == 3
+    assert series[response.timestamps.index(TIME_FROM)] == 1
+    assert response.stats.shards_done == 4
+    assert response.stats.queries == 4
+    assert response.stats.read_rows == 40
+
+
+def test_sharded_graph_folds_groups_after_merge(mock_clickhouse_source, fetch_graph):
+    group_by = Mock(jsonstring=False, root_name="message")
+    group_by.name = "message"
+
+    mock_client, response = fetch_graph(
+        mock_clickhouse_source,
+        [[(TIME_TO, 3, "a")], [], [(TIME_FROM, 2, "b")], [(TIME_FROM, 2, "b")]],
+        group_by=[group_by],
+        group_limit=1,
+    )
+
+    assert "dense_rank()" not in mock_client.query.call_args[0][0]
+    assert set(response.data) == {"b", "__other__"}
+    assert response.other_groups == 1
@@ -0,0 +1,176 @@
+import os
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from telescope import metrics
+from telescope.fetchers.pool import ClientPool, get_data_hash
+
+CERT_PARAMS = {"ca_cert": "ca_cert", "client_cert": "client_cert"}
+
+
+@pytest.fixture(autouse=True)
+def reset_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def make_pool(factory=None, **kwargs):
+    factory = factory or (lambda data, cert_files: MagicMock(cert_files=cert_files))
+    return ClientPool(
+        name="test",
+        factory=factory,
+        cert_params=CERT_PARAMS,
+        **kwargs,
+    )
+
+
+def get(pool, conn_id, data):
+    pooled = pool.acquire(conn_id, data)
+    pool.release(pooled)
+    return pooled.client
+
+
+def test_pool_reuses_client_for_same_connection():
+    pool = make_pool()
+    data = {"host": "localhost"}
+
+    first = get(pool, 1, data)
+    second = get(pool, 1, dict(data))
+
+    assert first is second
+    stats = pool.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["size"] == 1
+
+
+def test_pool_creates_new_client_when_data_changes():
+    pool = make_pool()
+
+    first = get(pool, 1, {"host": "localhost"})
+    second = get(pool, 1, {"host": "otherhost"})
+
+    assert first is not second
+    assert pool.stats()["misses"] == 2
+
+
+def test_pool_is_bounded():
+    pool = make_pool(max_size=2)
+
+    first = get(pool, 1, {"host": "a"})
+    get(pool, 2, {"host": "b"})
+    get(pool, 3, {"host": "c"})
+
+    assert pool.stats()["size"] == 2
+    assert pool.stats()["evictions"] == 1
+    first.close.assert_called_once()
+
+
+def test_pool_evicts_idle_clients():
+    pool = make_pool(idle_timeout=10)
+
+    with patch("telescope.fetchers.pool.time.monotonic", return_value=100):
+        first = get(pool, 1, {"host": "a"})
+    with patch("telescope.fetchers.pool.time.monotonic", return_value=200):
+        second = get(pool, 1, {"host": "a"})
+
+    assert first is not second
+    first.close.assert_called_once()
+
+
+def test_pool_invalidate_connection():
+    pool = make_pool()
+
+    first = get(pool, 1, {"host": "a"})
+    other = get(pool, 2, {"host": "b"})
+    pool.invalidate(1)
+
+    assert pool.stats()["size"] == 1
+    first.close.assert_called_once()
+    other.close.assert_not_called()
+    assert get(pool, 1, {"host": "a"}) is not first
+
+
+def test_pool_materializes_cert_files_once():
+    pool = make_pool()
+    data = {"host": "a", "ca_cert": "CA PEM", "client_cert": ""}
+
+    client = get(pool, 1, data)
+    path = client.cert_files["ca_cert"]
+
+    assert "client_cert" not in client.cert_files
+    with open(path) as fd:
+        assert fd.read() == "CA PEM"
+    assert get_data_hash(data)[:12] in path
+
+    assert get(pool, 1, data) is client
+    pool.invalidate()
+    assert not os.path.exists(path)
+
+
+def test_pool_cleans_cert_files_when_factory_fails():
+    created = []
+
+    def factory(data, cert_files):
+        created.append(cert_files["ca_cert"])
+        raise RuntimeError("connection refused")
+
+    pool = make_pool(factory=factory)
+    with pytest.raises(RuntimeError):
+        get(pool, 1, {"ca_cert": "CA PEM"})
+
+    assert not os.path.exists(created[0])
+    assert pool.stats()["size"] == 0
+
+
+@patch("telescope.fetchers.clickhouse.get_client_pool")
+def test_clickhouse_connect_uses_pool_for_saved_connections(mock_get_pool):
+    from telescope.fetchers.clickhouse import ClickhouseConnect
+
+    data = {"host": "localhost"}
+    with ClickhouseConnect(data, conn_id=1) as c:
+        client = c.client
+
+    pool = mock_get_pool.return_value
+    pool.acquire.assert_called_once_with(1, data)
+    assert client is pool.acquire.return_value.client
+    pool.release.assert_called_once_with(pool.acquire.return_value)
+    client.close.assert_not_called()
+
+
+def test_pool_closes_invalidated_client_once_released():
+    pool = make_pool()
+
+    pooled = pool.acquire(1, {"host": "a"})
+    pool.invalidate(1)
+
+    pooled.client.close.assert_not_called()
+    pool.release(pooled)
+    pooled.client.close.assert_called_once()
+
+
+def test_pool_closes_evicted_client_once_released():
+    pool = make_pool(max_size=1)
+
+    first = pool.acquire(1, {"host": "a"})
+    second = pool.acquire(2, {"host": "b"})
+    pool.release(second)
+
+    assert pool.stats()["evictions"] == 1
+    first.client.close.assert_not_called()
+    pool.release(first)
+    first.client.close.assert_called_once()
+
+
+def test_pool_does_not_evict_idle_clients_in_use():
+    pool = make_pool(idle_timeout=10)
+
+    with patch("telescope.fetchers.pool.time.monotonic", return_value=100):
+        first = pool.acquire(1, {"host": "a"})
+    with patch("telescope.fetchers.pool.time.monotonic", return_value=200):
+        second = pool.acquire(1, {"host": "a"})
+
+    assert first is second
+    first.client.close.assert_not_called()
@@ -0,0 +1,135 @@
+from unittest.mock import Mock, patch
+
+import pytest
+
+from django.conf import settings
+
+from telescope import metrics
+from telescope.fetchers import compiled_queries
+from telescope.models import ColumnCatalog
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    compiled_queries.clear()
+    yield
+    compiled_queries.clear()
+
+
+def make_source(source_id=1, message_type="String"):
+    source = Mock(id=source_id)
+    source.column_catalog = ColumnCatalog(
+        {
+            "message": {
+                "display_name": "",
+                "type": message_type,
+                "jsonstring": False,
+                "autocomplete": False,
+                "suggest": False,
+                "group_by": False,
+                "values": [],
+            }
+        }
+    )
+    source._columns = source.column_catalog.columns
+    return source
+
+
+def make_compiler():
+    build_columns = Mock(side_effect=lambda columns: dict(columns))
+    to_sql = Mock(return_value="message = 'error'")
+    return build_columns, to_sql
+
+
+def test_query_is_compiled_once():
+    build_columns, to_sql = make_compiler()
+    source = make_source()
+    hits = metrics.get_counter("compiled_query_hits")
+
+    first = compiled_queries.compile_query(
+        source, 'message="error"', "clickhouse", build_columns, to_sql
+    )
+    second = compiled_queries.compile_query(
+        source, 'message="error"', "clickhouse", build_columns, to_sql
+    )
+
+    assert second is first
+    assert first.sql == "message = 'error'"
+    assert first.root is not None
+    assert to_sql.call_count == 1
+    assert metrics.get_counter("compiled_query_hits") == hits + 1
+
+
+def test_queries_of_a_schema_share_columns():
+    build_columns, to_sql = make_compiler()
+    source = make_source()
+
+    first = compiled_queries.compile_query(
+        source, 'message="a"', "clickhouse", build_columns, to_sql
+    )
+    second = compiled_queries.compile_query(
+        source, 'message="b"', "clickhouse", build_columns, to_sql
+    )
+
+    assert second.columns is first.columns
+    assert build_columns.call_count == 1
+    assert to_sql.call_count == 2
+
+
+def test_schema_change_and_invalidation_recompile():
+    build_columns, to_sql = make_compiler()
+    query = 'message="error"'
+
+    compiled_queries.compile_query(
+        make_source(), query, "clickhouse", build_columns, to_sql
+    )
+    compiled_queries.compile_query(
+        make_source(message_type="LowCardinality(String)"),
+        query,
+        "clickhouse",
+        build_columns,
+        to_sql,
+    )
+    assert to_sql.call_count == 2
+
+    compiled_queries.invalidate(1)
+    compiled_queries.compile_query(
+        make_source(), query, "clickhouse", build_columns, to_sql
+    )
+    assert to_sql.call_count == 3
+
+
+def test_schema_columns_are_evicted_with_their_last_query():
+    build_columns, to_sql = make_compiler()
+    cache = compiled_queries.CompiledQueryCache()
+    first = make_source(1)
+    second = make_source(2)
+
+    with patch.dict(
+        settings.CONFIG["fetchers"]["compiled_queries"], {"max_entries": 2}
+    ):
+        cache.compile(first, 'message="a"', "clickhouse", build_columns, to_sql)
+        cache.compile(first, 'message="b"', "clickhouse", build_columns, to_sql)
+        cache.compile(second, 'message="a"', "clickhouse", build_columns, to_sql)
+        assert [key[0] for key in cache.columns] == [1, 2]
+
+        cache.compile(second, 'message="b"', "clickhouse", build_columns, to_sql)
+        assert [key[0] for key in cache.columns] == [2]
+        assert cache.schema_queries == {
+            (2, second.column_catalog.fingerprint, "clickhouse"): 2
+        }
+
+
+def test_errors_are_not_cached():
+    build_columns, to_sql = make_compiler()
+    to_sql.side_effect = [ValueError("unknown column"), "message = 'error'"]
+    source = make_source()
+
+    with pytest.raises(ValueError):
+        compiled_queries.compile_query(
+            source, 'message="error"', "clickhouse", build_columns, to_sql
+        )
+    compiled = compiled_queries.compile_query(
+        source, 'message="error"', "clickhouse", build_columns, to_sql
+    )
+    assert compiled.sql == "message = 'error'"
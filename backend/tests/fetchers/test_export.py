@@ -0,0 +1,82 @@
+import io
+from unittest.mock import Mock, MagicMock, patch
+
+import pytest
+
+from telescope.fetchers import export
+from telescope.fetchers.clickhouse import Fetcher as ClickhouseFetcher
+from telescope.fetchers.starrocks import Fetcher as StarrocksFetcher
+from telescope.fetchers.request import DataRequest
+from telescope.models import Source
+
+
+@pytest.fixture
+def mock_source():
+    source = Mock(spec=Source)
+    source.slug = "logs"
+    source.data = {"catalog": "default", "database": "db", "table": "logs"}
+    source.time_column = "timestamp"
+    source.date_column = None
+    source._columns = {
+        "timestamp": Mock(type="DateTime"),
+        "message": Mock(type="String"),
+    }
+    source.conn = Mock(id=1, data={"host": "localhost"})
+    return source
+
+
+def make_request(source):
+    return DataRequest(
+        source=source,
+        query=None,
+        raw_query="level = 'error'",
+        time_from=1000000000000,
+        time_to=2000000000000,
+        limit=50000,
+        context_columns={},
+        columns=["message", "timestamp"],
+    )
+
+
+def test_encode_batches_csv():
+    batches = [[("a,b", 1)], [("c", 2)]]
+    chunks = list(export.encode_batches(batches, ["message", "n"], export.FORMAT_CSV))
+    assert b"".join(chunks) == b'message,n\n"a,b",1\nc,2\n'
+    assert len(chunks) == 2
+
+
+def test_encode_batches_csv_without_rows_has_header():
+    chunks = export.encode_batches([], ["message"], export.FORMAT_CSV)
+    assert b"".join(chunks) == b"message\n"
+
+
+def test_encode_batches_ndjson():
+    chunks = export.encode_batches([[("a", 1), ("b", 2)]], ["m", "n"], "ndjson")
+    assert b"".join(chunks) == b'{"m": "a", "n": 1}\n{"m": "b", "n": 2}\n'
+
+
+@patch("telescope.fetchers.clickhouse.ClickhouseConnect")
+def test_clickhouse_export_streams_server_encoded_output(mock_connect, mock_source):
+    mock_client = MagicMock()
+    mock_client.raw_stream.return_value = io.BytesIO(b"message,timestamp\nhi,1\n")
+    mock_connect.return_value.__enter__.return_value.client = mock_client
+
+    chunks = ClickhouseFetcher.export_data(make_request(mock_source), "csv")
+    # nothing runs before the response is consumed
+    assert not mock_client.raw_stream.called
+
+    assert b"".join(chunks) == b"message,timestamp\nhi,1\n"
+    query = mock_client.raw_stream.call_args[0][0]
+    kwargs = mock_client.raw_stream.call_args[1]
+    assert query.startswith(
+        "SELECT `message`, toTimeZone(`timestamp`, 'UTC') AS `timestamp` FROM db.logs"
+    )
+    assert "level = 'error'" in query
+    assert query.endswith("LIMIT 50000")
+    assert kwargs["fmt"] == "CSVWithNames"
+    assert kwargs["settings"]["cancel_http_readonly_queries_on_client_close"] == 1
+
+
+def test_starrocks_export_rejects_parquet(mock_source):
+    with pytest.raises(ValueError):
+        StarrocksFetcher.export_data(make_request(mock_source), "parquet")
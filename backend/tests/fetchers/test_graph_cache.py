@@ -0,0 +1,134 @@
+import pytest
+from unittest.mock import Mock, patch
+
+from django.conf import settings
+from django.core.cache.backends.locmem import LocMemCache
+
+from telescope.fetchers import graph_cache
+from telescope.fetchers.graph import (
+    GraphQuery,
+    build_graph_response,
+    get_graph_buckets,
+    get_graph_interval,
+)
+from telescope.fetchers.request import GraphDataRequest
+
+STEP = 576000  # bucket interval of a 24 hours range
+NOW = 1700000000000
+DAY = 86400000
+EVENTS = [(ts, "error" if ts % 3 else "info") for ts in range(NOW - 2 * DAY, NOW, 7919)]
+
+
+@pytest.fixture(autouse=True)
+def enabled_graph_cache():
+    config = {"enabled": True, "ttl": 3600, "closed_after_seconds": 120}
+    with patch.dict(settings.CONFIG["fetchers"]["graph_cache"], config), patch(
+        "telescope.fetchers.graph_cache.cache", LocMemCache("graph-cache-test", {})
+    ), patch("telescope.fetchers.graph_cache.time.time", return_value=NOW / 1000):
+        yield
+
+
+def make_request(time_from, time_to, use_cache=True):
+    source = Mock(id=1, kind="clickhouse", time_column="time", date_column="")
+    source.data = {"database": "db", "table": "logs"}
+    return GraphDataRequest(
+        source=source,
+        query="",
+        raw_query="",
+        time_from=time_from,
+        time_to=time_to,
+        group_by=[],
+        context_columns={},
+        use_cache=use_cache,
+    )
+
+
+class FakeQuery:
+    """Counts EVENTS per epoch-aligned bucket like the histogram query."""
+
+    def __init__(self, request):
+        self.request = request
+        self.windows = []
+
+    def __call__(self, window):
+        self.windows.append(window)
+        lower, upper = window
+        step = get_graph_interval(self.request.time_from, self.request.time_to) * 1000
+        counts = {}
+        for ts, group in EVENTS:
+            if (
+                ts < lower
+                or ts > upper
+                or (ts == upper and upper != self.request.time_to)
+            ):
+                continue
+            key = (ts // step * step, group)
+            counts[key] = counts.get(key, 0) + 1
+        return [(ts, count, group) for (ts, group), count in counts.items()]
+
+
+def fetch(request):
+    query = FakeQuery(request)
+    response = graph_cache.fetch_graph(
+        request, key_parts=["true", "level"], grouped=True, query_window=query
+    )
+    return query, response
+
+
+def expected(request):
+    query = FakeQuery(request)
+    interval = get_graph_interval(request.time_from, request.time_to)
+    buckets = get_graph_buckets(request.time_from, request.time_to, interval)
+    return build_graph_response(
+        query((request.time_from, request.time_to)),
+        request.time_from,
+        request.time_to,
+        GraphQuery(sql="", grouped=True, buckets=buckets),
+    )
+
+
+def assert_same_graph(response, other):
+    assert response.timestamps == other.timestamps
+    assert response.data == other.data
+    assert response.total == other.total
+
+
+def test_first_request_queries_whole_range():
+    request = make_request(NOW - DAY, NOW)
+
+    query, response = fetch(request)
+
+    assert query.windows == [(NOW - DAY, NOW)]
+    assert_same_graph(response, expected(request))
+
+
+def test_sliding_request_queries_only_head_and_tail():
+    fetch(make_request(NOW - DAY - 30000, NOW - 30000))
+    request = make_request(NOW - DAY, NOW)
+
+    query, response = fetch(request)
+
+    assert len(query.windows) == 2
+    head, tail = query.windows
+    assert head[0] == NOW - DAY and head[1] - head[0] <= STEP
+    assert tail[1] == NOW and tail[1] - tail[0] <= 2 * STEP + 120000
+    assert_same_graph(response, expected(request))
+
+
+def test_open_buckets_are_not_cached():
+    request = make_request(NOW - DAY, NOW)
+    fetch(request)
+
+    query, _ = fetch(request)
+
+    # the partial head bucket and the still open tail buckets are queried again
+    head, tail = query.windows
+    assert head[1] - head[0] < STEP
+    assert tail[1] == NOW and NOW - tail[0] <= STEP + 120000 + STEP
+
+
+def test_cache_bypass():
+    assert graph_cache.is_enabled(make_request(NOW - DAY, NOW))
+    assert not graph_cache.is_enabled(make_request(NOW - DAY, NOW, use_cache=False))
+    # short ranges are not bucketed and never cached
+    assert not graph_cache.is_enabled(make_request(NOW - 10000, NOW))
@@ -0,0 +1,99 @@
+from unittest.mock import Mock
+
+from telescope.fetchers.graph import (
+    OTHER_GROUP,
+    GraphQuery,
+    build_graph_response,
+    build_top_groups_sql,
+    fold_groups,
+    get_group_by_columns,
+)
+
+
+def test_fold_groups_keeps_top_series():
+    data = {"a": [1, 0, 1], "b": [5, 5, 0], "c": [0, 2, 0], "d": [3, 0, 3]}
+
+    folded, other_groups = fold_groups(data, 2)
+
+    assert folded == {"b": [5, 5, 0], "d": [3, 0, 3], OTHER_GROUP: [1, 2, 1]}
+    assert other_groups == 2
+
+
+def test_fold_groups_without_limit():
+    data = {"a": [1], "b": [2]}
+
+    assert fold_groups(data, None) == (data, 0)
+    assert fold_groups(data, 2) == (data, 0)
+
+
+def test_fold_groups_merges_existing_other_series():
+    data = {"a": [9], OTHER_GROUP: [4], "b": [1], "c": [2]}
+
+    folded, other_groups = fold_groups(data, 2)
+
+    assert folded == {"a": [9], OTHER_GROUP: [7]}
+    assert other_groups == 2
+
+
+def test_build_top_groups_sql():
+    sql = build_top_groups_sql(
+        "SELECT t, COUNT() as Count, `level`, `host`"
+        " FROM logs GROUP BY t, `level`, `host`",
+        ["level", "host"],
+        10,
+    )
+
+    assert sql.startswith(
+        "SELECT t, sum(Count) AS `__count`, if(`__rank` <= 10, `__rank`, 0)"
+    )
+    assert "dense_rank() OVER (ORDER BY `__total` DESC, `level`, `host`)" in sql
+    assert "sum(Count) OVER (PARTITION BY `level`, `host`)" in sql
+    assert "max(`level`) AS `__value0`, max(`host`) AS `__value1`" in sql
+    assert sql.endswith("GROUP BY t, `__group`")
+
+
+def test_build_graph_response_reports_folded_groups():
+    graph_query = GraphQuery(
+        sql="", grouped=True, buckets=range(0, 3000, 1000), group_limit=2
+    )
+    result_rows = [
+        (0, 4, 1, 5, "error"),
+        (1000, 2, 0, 5, "info"),
+        (2000, 1, 2, 5, ""),
+    ]
+
+    response = build_graph_response(result_rows, 0, 2500, graph_query)
+
+    assert response.data == {
+        "error": [4, 0, 0, 0],
+        OTHER_GROUP: [0, 2, 0, 0],
+        "__none__": [0, 0, 1, 0],
+    }
+    assert response.total == 7
+    assert response.other_groups == 3
+
+
+def test_build_graph_response_names_composite_groups():
+    graph_query = GraphQuery(sql="", grouped=True, buckets=range(0, 2000, 1000))
+    result_rows = [
+        (0, 4, "error", "web"),
+        (1000, 2, "error", ""),
+        (1000, 1, "info", "web"),
+    ]
+
+    response = build_graph_response(result_rows, 0, 1500, graph_query)
+
+    assert response.data == {
+        "error / web": [4, 0, 0],
+        "error / __none__": [0, 2, 0],
+        "info / web": [0, 1, 0],
+    }
+
+
+def test_get_group_by_columns_skips_repeated_columns():
+    level, host, other_level = (Mock() for _ in range(3))
+    level.name = other_level.name = "level"
+    host.name = "host"
+
+    assert get_group_by_columns([level, host, other_level]) == [level, host]
+    assert get_group_by_columns(None) == []
@@ -318,3 +318,36 @@ def test_generate_graph_grouping_with_multiple_timestamps(mock_source):
     assert len(data["kube-system"]) == len(timestamps)
     assert sum(data["default"]) == 3
     assert sum(data["kube-system"]) == 2
+
+
+def test_generate_graph_grouping_by_several_columns(mock_source):
+    time_from = 1000000000000
+    time_to = 1000000010000
+
+    rows = [
+        create_row(mock_source, 1000000001000, {"namespace": "default", "pod": "a"}),
+        create_row(mock_source, 1000000002000, {"namespace": "default", "pod": "a"}),
+        create_row(mock_source, 1000000003000, {"namespace": "default", "pod": "b"}),
+        create_row(mock_source, 1000000004000, {"namespace": "kube-system"}),
+    ]
+
+    group_by = [
+        ParsedColumn(
+            name=name,
+            root_name=name,
+            type="string",
+            jsonstring=False,
+            display_name=name,
+            modifiers=[],
+        )
+        for name in ("namespace", "pod")
+    ]
+
+    timestamps, data, total = generate_graph_from_rows(
+        rows, time_from, time_to, group_by
+    )
+
+    assert total == 4
+    assert sum(data["default / a"]) == 2
+    assert sum(data["default / b"]) == 1
+    assert sum(data["kube-system / __none__"]) == 1
@@ -0,0 +1,226 @@
+from datetime import datetime, timedelta
+from unittest.mock import Mock
+
+import base64
+import json
+
+import pytest
+
+from telescope.constants import UTC_ZONE
+from telescope.fetchers import pagination
+from telescope.fetchers.clickhouse import apply_cursor, get_order_by_clause
+from telescope.fetchers.pagination import Cursor, InvalidCursor
+from telescope.fetchers.starrocks import build_cursor_clause
+
+
+def make_source(uniq_column=None):
+    return Mock(time_column="timestamp", uniq_column=uniq_column)
+
+
+def make_rows(*items):
+    return [
+        Mock(
+            data={
+                "timestamp": datetime(2024, 1, 1, 0, 0, second, tzinfo=UTC_ZONE),
+                "id": uniq,
+            }
+        )
+        for second, uniq in items
+    ]
+
+
+def test_cursor_roundtrip():
+    cursor = Cursor.decode(Cursor(time=1704067200000000, uniq="a'b").encode())
+
+    assert cursor.time == 1704067200000000
+    assert cursor.uniq == "a'b"
+    assert cursor.offset == 0
+    assert cursor.result_id is None
+
+
+@pytest.mark.parametrize("value", ["", "not base64!", "bnVsbA", "eyJvIjotMX0"])
+def test_invalid_cursor(value):
+    with pytest.raises(InvalidCursor):
+        Cursor.decode(value)
+
+
+def encode_payload(payload):
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+@pytest.mark.parametrize(
+    "uniq", ["[1]", '{"a":1}', "true", "NaN", "Infinity", '"x"', "1.5", "7"]
+)
+def test_cursor_uniq_is_a_scalar(uniq):
+    value = encode_payload(f'{{"t":1,"u":{uniq}}}')
+
+    if uniq in ('"x"', "1.5", "7"):
+        assert Cursor.decode(value).uniq == json.loads(uniq)
+    else:
+        with pytest.raises(InvalidCursor):
+            Cursor.decode(value)
+
+
+def test_no_cursor_on_last_page():
+    rows = make_rows((3, 1), (2, 2))
+    assert pagination.get_next_cursor(make_source("id"), rows, 3) is None
+
+
+def test_keyset_cursor_uses_last_row():
+    rows = make_rows((3, 7), (2, 5))
+
+    cursor = Cursor.decode(pagination.get_next_cursor(make_source("id"), rows, 2))
+
+    assert cursor.time == pagination.get_time_micros(rows[-1].data["timestamp"])
+    assert cursor.uniq == 5
+    assert cursor.offset == 0
+
+
+def test_no_cursor_without_uniq_column():
+    rows = make_rows((3, None), (2, None), (2, None))
+
+    assert pagination.get_next_cursor(make_source(), rows, 3) is None
+
+
+def test_paginate_serves_next_pages_from_cached_result():
+    rows = list(range(5))
+
+    page, encoded = pagination.paginate(rows, 2)
+    assert page == [0, 1]
+
+    cursor = Cursor.decode(encoded)
+    cached = pagination.get_cached_rows(cursor)
+    assert cached is rows
+    page, encoded = pagination.paginate(cached, 2, cursor, cached=True)
+    assert page == [2, 3]
+    assert Cursor.decode(encoded).result_id == cursor.result_id
+
+    page, encoded = pagination.paginate(cached, 2, Cursor.decode(encoded), cached=True)
+    assert page == [4]
+    assert encoded is None
+
+
+def test_expired_result_cursor_is_not_resumed():
+    rows = list(range(5))
+    page, encoded = pagination.paginate(rows, 2)
+    cursor = Cursor.decode(encoded)
+    assert not pagination.is_expired(cursor)
+
+    expired = Cursor(offset=2, result_id="gone")
+    assert pagination.is_expired(expired)
+    assert not pagination.is_expired(Cursor(time=1, uniq=1))
+
+    # logs read again are paged from the first page, not from a stale offset
+    page, encoded = pagination.paginate([9, 8, 7], 2, expired)
+    assert page == [9, 8]
+    assert Cursor.decode(encoded).offset == 2
+    assert Cursor.decode(encoded).result_id != "gone"
+
+
+@pytest.mark.parametrize(
+    "time_type,expected_time",
+    [
+        ("DateTime64(3)", "fromUnixTimestamp64Micro(1704067200123456)"),
+        ("DateTime", "fromUnixTimestamp64Micro(1704067200123456)"),
+        ("UInt64", "1704067200"),
+    ],
+)
+def test_clickhouse_cursor_clause(time_type, expected_time):
+    source = make_source("id")
+    source._columns = {"timestamp": Mock(type=time_type)}
+    request = Mock(source=source, cursor=Cursor(time=1704067200123456, uniq="x"))
+
+    clause = apply_cursor(request, "1 = 1")
+
+    assert clause == f"1 = 1 AND (`timestamp`, `id`) < ({expected_time}, 'x')"
+
+
+@pytest.mark.parametrize("uniq,expected", [(7, "7"), (1.5, "1.5"), (None, "NULL")])
+def test_cursor_clause_formats_numbers(uniq, expected):
+    source = make_source("id")
+    source._columns = {"timestamp": Mock(type="DateTime")}
+    request = Mock(source=source, cursor=Cursor(time=1, uniq=uniq))
+
+    assert apply_cursor(request, "1 = 1").endswith(f", {expected})")
+    assert build_cursor_clause(source, request.cursor).endswith(f"`id` < {expected}))")
+
+
+def test_cursor_clause_rejects_objects():
+    source = make_source("id")
+    source._columns = {"timestamp": Mock(type="DateTime")}
+    request = Mock(source=source, cursor=Cursor(time=1, uniq=["1) OR (1"]))
+
+    with pytest.raises(InvalidCursor):
+        apply_cursor(request, "1 = 1")
+    with pytest.raises(InvalidCursor):
+        build_cursor_clause(source, request.cursor)
+
+
+def test_nanosecond_times_are_paged_by_microsecond():
+    source = make_source("id")
+    source._columns = {"timestamp": Mock(type="DateTime64(9, 'UTC')")}
+    request = Mock(source=source, cursor=Cursor(time=1704067200123456, uniq=2))
+
+    assert get_order_by_clause(source) == (
+        "ORDER BY toDateTime64(`timestamp`, 6) DESC, `id` DESC"
+    )
+    assert apply_cursor(request, "1 = 1") == (
+        "1 = 1 AND (toDateTime64(`timestamp`, 6), `id`) < "
+        "(fromUnixTimestamp64Micro(1704067200123456), 2)"
+    )
+
+    # rows of the same microsecond, as (nanoseconds, id), paged as the queries do
+    nanos = 1704067200123456000
+    table = [(nanos + 900, 1), (nanos + 100, 2), (nanos + 500, 3), (nanos - 1000, 4)]
+
+    def sort_key(item):
+        return item[0] // 1000, item[1]
+
+    pages = []
+    cursor = None
+    while True:
+        selected = sorted(
+            (
+                item
+                for item in table
+                if cursor is None or sort_key(item) < (cursor.time, cursor.uniq)
+            ),
+            key=sort_key,
+            reverse=True,
+        )[:2]
+        pages.extend(selected)
+        rows = [
+            Mock(
+                data={
+                    "timestamp": pagination.EPOCH
+                    + timedelta(microseconds=item[0] // 1000),
+                    "id": item[1],
+                }
+            )
+            for item in selected
+        ]
+        encoded = pagination.get_next_cursor(source, rows, 2)
+        if encoded is None:
+            break
+        cursor = Cursor.decode(encoded)
+
+    assert sorted(pages) == sorted(table)
+
+
+@pytest.mark.parametrize(
+    "time_type,expected_time",
+    [
+        ("datetime", "to_datetime_ntz(1704067200123456, 6)"),
+        ("bigint", "1704067200123"),
+    ],
+)
+def test_starrocks_cursor_clause(time_type, expected_time):
+    source = make_source("id")
+    source._columns = {"timestamp": Mock(type=time_type)}
+
+    clause = build_cursor_clause(source, Cursor(time=1704067200123456, uniq="x"))
+
+    assert clause == (
+        f"(`timestamp` < {expected_time} OR (`timestamp` = {expected_time} "
+        "AND `id` < 'x'))"
+    )
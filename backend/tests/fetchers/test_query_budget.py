@@ -0,0 +1,127 @@
+import pytest
+from unittest.mock import Mock, MagicMock, patch
+
+from django.conf import settings
+
+from telescope import metrics
+from telescope.fetchers import budget
+from telescope.fetchers.budget import BudgetExceeded
+from telescope.fetchers.clickhouse import Fetcher as ClickhouseFetcher
+from telescope.fetchers.request import DataAndGraphDataRequest
+from telescope.models import Source
+from telescope.constants import UTC_ZONE
+
+
+@pytest.fixture(autouse=True)
+def query_budgets():
+    budgets = {
+        "data": {"max_execution_time": 60, "max_rows_to_read": None},
+        "graph": {"max_execution_time": 30},
+        "autocomplete": {"max_execution_time": 5},
+    }
+    with patch.dict(settings.CONFIG["fetchers"], {"query_budgets": budgets}):
+        yield budgets
+
+
+@pytest.fixture
+def source():
+    source = Mock(spec=Source)
+    source.id = 1
+    source.data = {"database": "db", "table": "logs"}
+    source.time_column = "timestamp"
+    source.date_column = None
+    source._columns = {
+        "timestamp": Mock(type="DateTime"),
+        "message": Mock(type="String"),
+    }
+    source._record_pseudo_id_column = "record_id"
+    source.conn = Mock(id=1, data={"host": "localhost"})
+    return source
+
+
+def make_request(source):
+    return DataAndGraphDataRequest(
+        source=source,
+        query="",
+        raw_query="",
+        time_from=1000000000000,
+        time_to=1000086400000,
+        limit=10,
+        group_by=[],
+        context_columns={},
+        use_cache=False,
+    )
+
+
+def test_source_budget_overrides_defaults(source):
+    source.data["budgets"] = {"data": {"max_rows_to_read": 1000}}
+
+    assert budget.get_budget(source, "data") == {
+        "max_execution_time": 60,
+        "max_rows_to_read": 1000,
+    }
+    assert budget.get_budget(source, "graph") == {"max_execution_time": 30}
+
+
+def test_database_limit_errors_become_budget_exceeded(source):
+    before = metrics.get_counter("query_budget_exceeded_graph")
+    with pytest.raises(BudgetExceeded) as err:
+        with budget.enforce(source, "graph", "clickhouse"):
+            raise RuntimeError("Code: 159. DB::Exception: Timeout exceeded")
+
+    assert err.value.setting == "max_execution_time"
+    assert "max_execution_time=30" in str(err.value)
+    assert metrics.get_counter("query_budget_exceeded_graph") == before + 1
+
+    with pytest.raises(RuntimeError):
+        with budget.enforce(source, "graph", "clickhouse"):
+            raise RuntimeError("Code: 60. DB::Exception: Unknown table")
+
+
+@patch("telescope.fetchers.clickhouse.ClickhouseConnect")
+def test_clickhouse_queries_carry_budget_settings(mock_connect, source):
+    mock_client = MagicMock()
+    mock_client.query.return_value.result_rows = []
+    mock_client.query_column_block_stream.return_value.__enter__.return_value = []
+    mock_connect.return_value.__enter__.return_value.client = mock_client
+
+    ClickhouseFetcher.fetch_data_and_graph(make_request(source), tz=UTC_ZONE)
+    ClickhouseFetcher.load_autocomplete_values(source, "message", 0, 1000, 10)
+
+    data_kwargs = mock_client.query_column_block_stream.call_args[1]
+    assert data_kwargs["settings"] == {"max_execution_time": 60}
+    graph_kwargs, autocomplete_kwargs = [
+        item[1] for item in mock_client.query.call_args_list
+    ]
+    assert graph_kwargs["settings"] == {"max_execution_time": 30}
+    assert autocomplete_kwargs["settings"] == {"max_execution_time": 5}
+
+
+@patch("telescope.fetchers.clickhouse.ClickhouseConnect")
+def test_graph_over_budget_keeps_rows(mock_connect, source):
+    mock_client = MagicMock()
+    mock_client.query.side_effect = RuntimeError(
+        "Code: 158. DB::Exception: Limit for rows to read exceeded"
+    )
+    mock_client.query_column_block_stream.return_value.__enter__.return_value = []
+    mock_connect.return_value.__enter__.return_value.client = mock_client
+
+    response = ClickhouseFetcher.fetch_data_and_graph(make_request(source), tz=UTC_ZONE)
+
+    assert response.error is None
+    assert response.graph_timestamps == []
+    assert "graph query exceeded its rows to read budget" in response.message
+
+
+@patch("telescope.fetchers.clickhouse.ClickhouseConnect")
+def test_both_parts_over_budget_fail(mock_connect, source):
+    mock_client = MagicMock()
+    error = RuntimeError("Code: 241. DB::Exception: Memory limit exceeded")
+    mock_client.query.side_effect = error
+    mock_client.query_column_block_stream.side_effect = error
+    mock_connect.return_value.__enter__.return_value.client = mock_client
+
+    with pytest.raises(BudgetExceeded) as err:
+        ClickhouseFetcher.fetch_data_and_graph(make_request(source), tz=UTC_ZONE)
+    assert err.value.request_type == "data"
+    assert err.value.setting == "max_memory_usage"
@@ -0,0 +1,66 @@
+from datetime import datetime
+from unittest.mock import MagicMock
+
+import pytest
+
+from telescope.constants import UTC_ZONE
+from telescope.fetchers.clickhouse import Fetcher as ClickhouseFetcher
+from telescope.fetchers.stats import QueryStats
+
+
+def test_summaries_are_added_up():
+    stats = QueryStats()
+    stats.add_summary(
+        {"read_rows": "100", "read_bytes": "2048", "elapsed_ns": "1500000"}
+    )
+    stats.add_summary({"read_rows": "5", "read_bytes": "10"})
+    stats.add_summary(None)
+
+    result = stats.as_dict()
+    assert result["read_rows"] == 105
+    assert result["read_bytes"] == 2058
+    assert result["server_elapsed_ms"] == 1.5
+
+
+def test_stats_without_summary_stay_unknown():
+    stats = QueryStats()
+    with stats.fetching():
+        pass
+    with stats.fetching(query=False):
+        pass
+
+    result = stats.as_dict()
+    assert result["queries"] == 1
+    assert result["read_rows"] is None
+    assert result["server_elapsed_ms"] is None
+    assert result["fetch_ms"] >= 0
+
+
+def test_clickhouse_data_response_carries_stats(
+    mock_clickhouse_source, clickhouse_client, make_data_request
+):
+    stream = MagicMock()
+    stream.source.summary = {"read_rows": "42", "read_bytes": "4200"}
+    # selected columns are the pseudo id followed by sorted column names
+    stream.__iter__.return_value = iter(
+        [
+            [
+                ["id-1", "id-2"],
+                ["first", "second"],
+                [datetime(2024, 1, 1, tzinfo=UTC_ZONE)] * 2,
+            ]
+        ]
+    )
+    clickhouse_client.query_column_block_stream.return_value.__enter__.return_value = (
+        stream
+    )
+
+    response = ClickhouseFetcher.fetch_data(
+        make_data_request(mock_clickhouse_source, limit=10), tz=UTC_ZONE
+    )
+
+    assert len(response.rows) == 2
+    assert response.stats.queries == 1
+    assert response.stats.read_rows == 42
+    assert response.stats.read_bytes == 4200
+    assert response.stats.result_rows == 2
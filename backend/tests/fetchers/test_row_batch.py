@@ -0,0 +1,101 @@
+from datetime import datetime
+
+from telescope.constants import UTC_ZONE
+from telescope.fetchers.models import (
+    BatchRow,
+    BlockBatch,
+    Row,
+    build_rows,
+    format_times,
+)
+from telescope.models import Source
+
+SELECTED_COLUMNS = ["_____record_pseudo_id", "id", "level", "payload", "timestamp"]
+VALUES = [
+    ("p-1", "id-1", "error", '{"a": 1}', datetime(2024, 1, 1, 10, 0, 0, 120000)),
+    ("p-2", "", "info", "{broken}", datetime(2024, 1, 1, 10, 0, 0, 450000)),
+    ("p-3", "id-3", None, "[1, 2[", datetime(2024, 1, 1, 10, 0, 1, tzinfo=UTC_ZONE)),
+]
+
+
+def make_column(type, jsonstring=False):
+    return {
+        "display_name": "",
+        "type": type,
+        "jsonstring": jsonstring,
+        "autocomplete": False,
+        "suggest": False,
+        "group_by": False,
+        "values": [],
+    }
+
+
+def make_source(kind="clickhouse", **kwargs):
+    return Source(
+        kind=kind,
+        time_column="timestamp",
+        uniq_column="id",
+        severity_column="level",
+        columns={
+            "timestamp": make_column("DateTime64(6)"),
+            "id": make_column("String"),
+            "level": make_column("String"),
+            "payload": make_column("String", jsonstring=True),
+            "not_selected": make_column("String"),
+        },
+        **kwargs,
+    )
+
+
+def test_batch_rows_match_rows():
+    source = make_source()
+
+    batch_rows = build_rows(source, SELECTED_COLUMNS, VALUES, UTC_ZONE)
+    rows = [
+        Row(source=source, selected_columns=SELECTED_COLUMNS, values=item, tz=UTC_ZONE)
+        for item in VALUES
+    ]
+
+    assert all(isinstance(row, BatchRow) for row in batch_rows)
+    for batch_row, row in zip(batch_rows, rows):
+        assert batch_row.as_dict() == row.as_dict()
+        assert batch_row.data == row.data
+        assert batch_row.time == row.time
+        assert batch_row.record_id == row.record_id
+        assert batch_row.severity == row.severity
+
+
+def test_sources_transforming_the_body_keep_rows():
+    source = make_source(kind="docker", severity_rules=None)
+
+    rows = build_rows(
+        source,
+        ["body", "timestamp"],
+        [('{"message": "hi"}', datetime(2024, 1, 1, tzinfo=UTC_ZONE))],
+    )
+
+    assert isinstance(rows[0], Row)
+    assert rows[0].data["body"] == {"message": "hi"}
+
+
+def test_empty_result():
+    assert build_rows(make_source(), SELECTED_COLUMNS, []) == []
+
+
+def test_block_batch_rows_match_batch_rows():
+    source = make_source()
+    block = [list(column) for column in zip(*VALUES)]
+    times = format_times(block[SELECTED_COLUMNS.index("timestamp")], UTC_ZONE)
+
+    block_rows = BlockBatch(source, SELECTED_COLUMNS, block, times).rows()
+    batch_rows = build_rows(source, SELECTED_COLUMNS, VALUES, UTC_ZONE)
+
+    assert len(block_rows) == len(VALUES)
+    for block_row, batch_row in zip(block_rows, batch_rows):
+        assert block_row.as_dict() == batch_row.as_dict()
+        assert block_row.data == batch_row.data
+        assert block_row.record_id == batch_row.record_id
+        assert block_row.severity == batch_row.severity
+    assert block_rows[0].batch.get_columns(0, 3) == batch_rows[0].batch.get_columns(
+        0, 3
+    )
@@ -0,0 +1,118 @@
+from unittest.mock import Mock
+
+import pytest
+
+from telescope.fetchers import severity
+from telescope.fetchers.utils import extract_severity_with_rules
+
+RULES = {
+    "extract": [
+        {"type": "json", "path": ["log", "level"]},
+        {"type": "json", "path": ["level"]},
+        {"type": "json", "path": []},
+        {"type": "regex", "pattern": r"[invalid(", "group": 1},
+        {"type": "regex", "pattern": r"\[(\w+)\]", "group": 1},
+        {"type": "regex", "pattern": r"level=(\w+)", "group": 5},
+        {"type": "regex", "pattern": r"\b(warn|error)\b", "case_insensitive": True},
+        {"type": "unknown", "pattern": "test"},
+    ],
+    "remap": [
+        {"pattern": "[invalid(", "value": "BAD"},
+        {"pattern": "error"},
+        {"pattern": "e.*", "value": "ERROR"},
+        {"pattern": "WARN", "value": "WARNING"},
+        {"pattern": "[0-3]", "value": "CRITICAL"},
+        {"pattern": "info", "value": "INFO", "case_insensitive": True},
+    ],
+}
+
+MESSAGES = [
+    '{"level": "error"}',
+    '  {"log": {"level": "Info"}}',
+    '{"level": 2}',
+    '{"level": null}',
+    '{"level": {"nested": "value"}}',
+    '["level", "error"]',
+    '"[WARN] quoted"',
+    "[WARN] Low disk space",
+    "[DEBUG] starting",
+    "level=ERROR message",
+    "this is a Warn line",
+    "{broken json [ERROR]",
+    "plain log message",
+    "",
+]
+
+
+@pytest.mark.parametrize("message", MESSAGES)
+def test_program_matches_rules_interpretation(message):
+    program = severity.SeverityProgram(RULES)
+
+    result, _ = program.extract(message)
+
+    assert result == extract_severity_with_rules(message, RULES)
+
+
+@pytest.mark.parametrize("rules", [None, {}, {"extract": []}, "invalid", Mock()])
+def test_program_without_rules(rules):
+    assert severity.SeverityProgram(rules).extract("[ERROR] x")[0] == "UNKNOWN"
+
+
+def test_body_is_parsed_once_and_shared():
+    program = severity.SeverityProgram(RULES)
+
+    result, parsed = program.extract('{"level": "warn", "message": "hi"}')
+    assert result == "warn"
+    assert parsed == {"level": "warn", "message": "hi"}
+
+    # no JSON rule needed the body
+    regex_only = severity.SeverityProgram({"extract": [RULES["extract"][4]]})
+    assert regex_only.extract("[ERROR] x") == ("ERROR", severity.NOT_PARSED)
+
+
+def test_remapped_values_are_memoized():
+    program = severity.SeverityProgram(RULES)
+
+    assert program.remap("error") == "ERROR"
+    assert program.remap("error") == "ERROR"
+    assert program.remapped == {"error": "ERROR"}
+
+
+def test_program_is_compiled_once_per_rules():
+    source = Mock(severity_rules=RULES, _severity_program=None)
+
+    program = severity.get_program(source)
+    assert severity.get_program(source) is program
+
+    source.severity_rules = {"extract": [{"type": "json", "path": ["level"]}]}
+    assert severity.get_program(source) is not program
+
+
+@pytest.mark.parametrize(
+    "body, expected",
+    [
+        ('{"a": 1}', {"a": 1}),
+        ('\n {"a": 1}', {"a": 1}),
+        ("[1, 2]", None),
+        ("{broken", None),
+        ("plain", None),
+        ("", None),
+    ],
+)
+def test_parse_object(body, expected):
+    assert severity.parse_object(body) == expected
+
+
+def test_empty_extracted_values_do_not_match():
+    program = severity.SeverityProgram(
+        {
+            "extract": [
+                {"type": "json", "path": ["level"]},
+                {"type": "regex", "pattern": r"lvl:(\w*)", "group": 1},
+                {"type": "regex", "pattern": r"\[(\w+)\]", "group": 1},
+            ]
+        }
+    )
+
+    assert program.extract('{"level": ""} [INFO]')[0] == "INFO"
+    assert program.extract("lvl: [WARN]")[0] == "WARN"
@@ -0,0 +1,292 @@
+import json
+import re
+from datetime import datetime
+from unittest.mock import Mock
+
+import pytest
+
+from telescope.constants import UTC_ZONE
+from telescope.fetchers import clickhouse, severity, starrocks
+from telescope.fetchers.models import build_rows
+from telescope.fetchers.request import DataRequest
+from telescope.models import Source
+
+RULES = {
+    "extract": [
+        {"type": "json", "path": ["level"]},
+        {"type": "regex", "pattern": r"level=(\w+)", "group": 1},
+    ],
+    "remap": [
+        {"pattern": "warn", "value": "WARNING"},
+        {"pattern": "err.*", "value": "ERROR", "case_insensitive": True},
+    ],
+}
+
+
+def make_column(type):
+    return {
+        "display_name": "",
+        "type": type,
+        "jsonstring": False,
+        "autocomplete": False,
+        "suggest": False,
+        "group_by": False,
+        "values": [],
+    }
+
+
+def make_source(kind="clickhouse", severity_rules=RULES):
+    return Source(
+        kind=kind,
+        time_column="timestamp",
+        uniq_column="",
+        severity_column="message",
+        severity_rules=severity_rules,
+        data={"database": "db", "table": "logs"},
+        columns={
+            "timestamp": make_column("DateTime64(6)"),
+            "message": make_column("String"),
+        },
+    )
+
+
+def make_group_by(name):
+    group_by = Mock(jsonstring=False, root_name=name)
+    group_by.name = name
+    return group_by
+
+
+def test_clickhouse_severity_expr():
+    expr = clickhouse.build_severity_expr(make_source())
+
+    assert expr.startswith(
+        "ifNull(nullIf(transform(`_____record_severity_value`, ['warn'], ['WARNING'], "
+        "multiIf(match(`_____record_severity_value`, '(?i)^(?:err.*)$'), 'ERROR', "
+        "(coalesce(nullIf(if(JSONType(toString(`message`), 'level') = 'String', "
+        "JSONExtractString(toString(`message`), 'level'), "
+        "transform(JSONExtractRaw(toString(`message`), 'level'), "
+        "['null', 'true', 'false'], ['None', 'True', 'False'], "
+    )
+    assert "nullIf(regexpExtract(toString(`message`), 'level=(\\\\w+)', 1), '')" in expr
+    assert expr.endswith(") AS `_____record_severity_value`))), ''), 'UNKNOWN')")
+    # the extracted value is computed once
+    assert expr.count("coalesce(") == 1
+
+
+def test_starrocks_severity_expr():
+    expr = starrocks.build_severity_expr(make_source(kind="starrocks"))
+
+    assert expr.startswith(
+        "coalesce(nullif(array_map(x -> CASE x WHEN 'warn' THEN 'WARNING' "
+        "ELSE CASE WHEN x REGEXP '(?i)^(?:err.*)$' THEN 'ERROR' ELSE x END END, "
+        "[coalesce(nullif(CASE json_string(json_query(parse_json(`message`), "
+        "'$.\"level\"')) WHEN 'null' THEN 'None' WHEN 'true' THEN 'True' "
+        "WHEN 'false' THEN 'False' ELSE get_json_string(`message`, '$.\"level\"') END"
+    )
+    assert "nullif(regexp_extract(`message`, 'level=(\\\\w+)', 1), '')" in expr
+    assert expr.endswith("])[1], ''), 'UNKNOWN')")
+
+
+def test_regex_groups_missing_from_pattern_are_dropped():
+    rules = {
+        "extract": [
+            {"type": "regex", "pattern": r"level=(\w+)", "group": 2},
+            {"type": "regex", "pattern": r"level=(\w+)", "group": 1},
+        ]
+    }
+
+    expr = clickhouse.build_severity_expr(make_source(severity_rules=rules))
+
+    assert expr.count("regexpExtract") == 1
+    assert ", 1)" in expr
+
+
+def test_remap_rules_keep_their_order():
+    rules = {
+        "extract": RULES["extract"],
+        "remap": [
+            {"pattern": "warn", "value": "WARNING"},
+            {"pattern": "warn", "value": "WARN"},
+            {"pattern": "info", "value": "INFO"},
+            {"pattern": "e.*", "value": "ERROR"},
+            {"pattern": "err", "value": "ERR"},
+        ],
+    }
+
+    expr = clickhouse.build_severity_expr(make_source(severity_rules=rules))
+
+    assert (
+        "transform(`_____record_severity_value`, ['warn', 'info'], ['WARNING', 'INFO'], "
+        "multiIf(match(`_____record_severity_value`, '^(?:e.*)$'), 'ERROR', "
+        "transform(`_____record_severity_value`, ['err'], ['ERR'], (coalesce("
+    ) in expr
+
+
+class PythonDialect(severity.SqlDialect):
+    """
+    Builds the severity expression as Python code evaluated per message, with
+    the semantics of the database functions the dialects use: extracting
+    functions return empty strings instead of failing, JSON values are
+    rendered as the JSON functions render them.
+    """
+
+    def __init__(self):
+        super().__init__(repr)
+
+    def get_value(self, column: str) -> str:
+        return "message"
+
+    def json_value(self, value: str, path) -> str:
+        return f"json_value({value}, {list(path)!r})"
+
+    def regex_value(self, value: str, regex: str, group: int) -> str:
+        return f"regex_value({value}, {regex}, {group})"
+
+    def first_non_empty(self, values) -> str:
+        return f"next((v for v in [{', '.join(values)}] if v), None)"
+
+    def regex_match(self, value: str, regex: str) -> str:
+        # NULL matches no regex
+        return f"({value} is not None and re.search({regex}, {value}) is not None)"
+
+    def conditional(self, branches, default: str) -> str:
+        expr = default
+        for condition, value in reversed(branches):
+            expr = f"({value} if {condition} else {expr})"
+        return expr
+
+    def remap_literals(self, value: str, literals, default: str) -> str:
+        lookup = ", ".join(f"{literal}: {target}" for literal, target in literals)
+        return f"{{{lookup}}}.get({value}, {default})"
+
+    def bind(self, value: str, build) -> str:
+        return f"(lambda bound: {build('bound', 'bound')})({value})"
+
+    def if_empty(self, value: str, default: str) -> str:
+        return f"({value} or {default})"
+
+
+def json_value(message, path):
+    value = severity.parse_object(message)
+    for key in path:
+        if not isinstance(value, dict) or key not in value:
+            return ""
+        value = value[key]
+    if isinstance(value, str):
+        return value
+    if value is None or isinstance(value, bool):
+        return str(value)
+    return json.dumps(value)
+
+
+def regex_value(message, regex, group):
+    match = re.search(regex, message)
+    return (match.group(group) or "") if match else ""
+
+
+PARITY_RULES = {
+    "extract": [
+        {"type": "json", "path": ["log", "level"]},
+        {"type": "json", "path": ["level"]},
+        {"type": "regex", "pattern": r"level=(\w+)|lvl:(\w*)", "group": 1},
+        {"type": "regex", "pattern": r"\[(\w+)\]", "group": 1},
+        {"type": "regex", "pattern": r"\b(warn|error)\b", "case_insensitive": True},
+    ],
+    "remap": [
+        {"pattern": "warn", "value": "WARNING"},
+        {"pattern": "e.*", "value": "ERROR", "case_insensitive": True},
+        {"pattern": "True", "value": "TRUE"},
+        {"pattern": "2", "value": "CRITICAL"},
+    ],
+}
+
+
+@pytest.mark.parametrize(
+    "message",
+    [
+        '{"level": "error"}',
+        '{"log": {"level": "Info"}}',
+        '{"level": 2}',
+        '{"level": null}',
+        '{"level": true}',
+        '{"level": false}',
+        '{"level": ""} [DEBUG]',
+        '{"other": 1} level=warn',
+        "lvl:[INFO] text",
+        "lvl: a Warn line",
+        "level=ERROR message",
+        "[WARN] Low disk space",
+        "plain log message",
+        "",
+    ],
+)
+def test_sql_rules_match_program(message):
+    expr = severity.build_sql_expr(
+        make_source(severity_rules=PARITY_RULES), PythonDialect()
+    )
+    expected, _ = severity.SeverityProgram(PARITY_RULES).extract(message)
+
+    result = eval(
+        expr,
+        {"re": re, "json_value": json_value, "regex_value": regex_value},
+        {"message": message},
+    )
+
+    assert result == expected
+
+
+def test_no_extract_rules_is_unknown():
+    source = make_source(severity_rules={"extract": [], "remap": RULES["remap"]})
+
+    assert clickhouse.build_severity_expr(source) == "'UNKNOWN'"
+
+
+def test_no_rules():
+    source = make_source(severity_rules=None)
+
+    assert clickhouse.build_severity_expr(source) is None
+    assert clickhouse.get_group_by_expr(source, make_group_by("message")) == (
+        "toString(message)"
+    )
+
+
+def test_data_query_selects_severity():
+    source = make_source()
+    request = DataRequest(
+        source=source,
+        query="",
+        raw_query="",
+        time_from=0,
+        time_to=1000,
+        limit=10,
+        context_columns={},
+    )
+
+    query, selected_columns = clickhouse.build_data_query(request, "true")
+
+    assert selected_columns[-1] == "_____record_severity"
+    assert f", {clickhouse.build_severity_expr(source)} FROM db.logs" in query
+
+
+def test_graph_groups_by_computed_severity():
+    source = make_source()
+
+    assert clickhouse.get_group_by_expr(
+        source, make_group_by("message")
+    ) == clickhouse.build_severity_expr(source)
+    assert clickhouse.get_group_by_expr(source, make_group_by("host")) == (
+        "toString(host)"
+    )
+
+
+def test_rows_use_computed_severity():
+    source = make_source()
+
+    rows = build_rows(
+        source,
+        ["_____record_pseudo_id", "message", "timestamp", "_____record_severity"],
+        [("p-1", "level=warn", datetime(2024, 1, 1, tzinfo=UTC_ZONE), "WARNING")],
+    )
+
+    assert rows[0].severity == "WARNING"
+    assert "_____record_severity" not in rows[0].as_dict()["data"]
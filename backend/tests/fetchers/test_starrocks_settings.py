@@ -1,6 +1,8 @@
 import pytest
 from unittest.mock import Mock, MagicMock, patch
 
+from django.conf import settings
+
 from telescope.fetchers.starrocks import Fetcher as StarrocksFetcher
 from telescope.fetchers.request import DataRequest, GraphDataRequest
 from telescope.models import Source
@@ -302,3 +304,44 @@ def test_settings_query_position(mock_starrocks_connect, mock_starrocks_source):
     assert (
         select_pos < settings_pos < from_pos
     ), "SET_VAR clause should come after SELECT"
+
+
+@patch("telescope.fetchers.starrocks.StarrocksConnect")
+def test_fetch_data_includes_budget(
+    mock_starrocks_connect, mock_starrocks_source, mock_starrocks_source_no_settings
+):
+    """Test that fetch_data() adds budget variables not set by the source"""
+    mock_client = MagicMock()
+    mock_cursor = MagicMock()
+    mock_client.cursor.return_value = mock_cursor
+
+    mock_context = MagicMock()
+    mock_context.__enter__.return_value.client = mock_client
+    mock_starrocks_connect.return_value = mock_context
+
+    budgets = {"data": {"max_execution_time": 30, "max_memory_usage": 1024}}
+    with patch.dict(settings.CONFIG["fetchers"], {"query_budgets": budgets}):
+        for source in (mock_starrocks_source, mock_starrocks_source_no_settings):
+            StarrocksFetcher.fetch_data(
+                DataRequest(
+                    source=source,
+                    time_from=1000000000000,
+                    time_to=2000000000000,
+                    limit=100,
+                    query=None,
+                    raw_query=None,
+                    context_columns={},
+                ),
+                tz=UTC_ZONE,
+            )
+
+    with_settings, without_settings = [
+        item[0][0] for item in mock_cursor.execute.call_args_list
+    ]
+    # the source settings take precedence over the budget
+    assert with_settings.lstrip().startswith(
+        "SELECT /*+ SET_VAR(query_timeout=60, time_zone='UTC', query_mem_limit=1024) */"
+    )
+    assert without_settings.lstrip().startswith(
+        "SELECT /*+ SET_VAR(query_timeout=30, query_mem_limit=1024) */"
+    )
@@ -0,0 +1,84 @@
+import pickle
+
+import pytest
+
+from telescope.models import Source
+
+
+def make_column(type, jsonstring=False):
+    return {
+        "display_name": "",
+        "type": type,
+        "jsonstring": jsonstring,
+        "autocomplete": False,
+        "suggest": False,
+        "group_by": False,
+        "values": [],
+    }
+
+
+def make_source():
+    return Source(
+        kind="clickhouse",
+        time_column="timestamp",
+        columns={
+            "timestamp": make_column("DateTime64(3)"),
+            "payload": make_column("String", jsonstring=True),
+        },
+    )
+
+
+def test_columns_are_parsed_once():
+    source = make_source()
+
+    assert source._columns is source._columns
+    assert source._columns["payload"].type == "String"
+    assert source.column_catalog.jsonstring_columns == {"payload"}
+
+
+def test_columns_are_read_only():
+    source = make_source()
+
+    with pytest.raises(TypeError):
+        source._columns["message"] = None
+
+
+def test_catalog_follows_columns_assignment():
+    source = make_source()
+    assert "message" not in source._columns
+
+    source.columns = {**source.columns, "message": make_column("String")}
+
+    assert "message" in source._columns
+
+
+def test_fingerprint_follows_schema_changes():
+    source = make_source()
+    fingerprint = source.column_catalog.fingerprint
+
+    assert make_source().column_catalog.fingerprint == fingerprint
+
+    source.columns = {**source.columns, "payload": make_column("JSON")}
+
+    assert source.column_catalog.fingerprint != fingerprint
+
+
+def test_source_with_catalog_can_be_pickled():
+    source = make_source()
+    source._columns
+
+    restored = pickle.loads(pickle.dumps(source))
+
+    assert restored._columns["payload"].jsonstring
+
+
+@pytest.mark.django_db
+def test_catalog_is_rebuilt_on_save(clickhouse_source):
+    columns = clickhouse_source._columns
+    name = next(iter(columns))
+
+    clickhouse_source.columns[name]["jsonstring"] = not columns[name].jsonstring
+    clickhouse_source.save()
+
+    assert clickhouse_source._columns is not columns
+    assert clickhouse_source._columns[name].jsonstring != columns[name].jsonstring
@@ -0,0 +1,90 @@
+from datetime import datetime
+
+from telescope import columnar
+from telescope.constants import UTC_ZONE
+from telescope.fetchers.models import BlockBatch, build_rows, format_times
+
+from tests.fetchers.test_row_batch import SELECTED_COLUMNS, VALUES, make_source
+
+
+def make_row(unixtime, severity, data):
+    return {
+        "time": {
+            "unixtime": unixtime,
+            "datetime": "2024-01-01 10:00:00",
+            "microseconds": "000000",
+        },
+        "severity": severity,
+        "data": data,
+    }
+
+
+def decode_column(column, dictionary):
+    if "codes" in column:
+        return [None if code is None else dictionary[code] for code in column["codes"]]
+    return column["values"]
+
+
+def test_encode_rows():
+    rows = [
+        make_row(1, "error", {"host": "a", "count": 1, "payload": {"a": 1}}),
+        make_row(2, "error", {"host": "a", "count": 2, "payload": None}),
+        make_row(3, "info", {"host": "b", "count": 3}),
+        make_row(4, None, {"host": "a", "count": 4, "payload": "text"}),
+    ]
+
+    result = columnar.encode_rows(rows)
+    dictionary = result["dictionary"]
+
+    assert result["length"] == 4
+    assert result["time"]["unixtime"] == {"values": [1, 2, 3, 4]}
+    assert "codes" in result["time"]["datetime"]
+    assert "codes" in result["severity"]
+    assert decode_column(result["severity"], dictionary) == [
+        "error",
+        "error",
+        "info",
+        None,
+    ]
+    assert decode_column(result["data"]["host"], dictionary) == ["a", "a", "b", "a"]
+    assert result["data"]["count"] == {"values": [1, 2, 3, 4]}
+    assert result["data"]["payload"] == {"values": [{"a": 1}, None, None, "text"]}
+    # values repeated across columns are stored once
+    assert len(dictionary) == len(set(dictionary))
+
+
+def test_unique_strings_are_not_encoded():
+    rows = [make_row(idx, "", {"id": f"id-{idx}"}) for idx in range(4)]
+
+    result = columnar.encode_rows(rows)
+
+    assert result["data"]["id"] == {"values": ["id-0", "id-1", "id-2", "id-3"]}
+
+
+def test_empty_rows():
+    assert columnar.encode_rows([]) == {
+        "length": 0,
+        "time": {},
+        "severity": {"values": []},
+        "data": {},
+        "dictionary": [],
+    }
+
+
+def test_encode_fetched_rows_matches_encode_rows():
+    source = make_source()
+    block = [list(column) for column in zip(*VALUES)]
+    times = format_times(block[SELECTED_COLUMNS.index("timestamp")], UTC_ZONE)
+    batch = BlockBatch(source, SELECTED_COLUMNS, block, times)
+    other_source = make_source(kind="docker", severity_rules=None)
+    other_rows = build_rows(
+        other_source,
+        ["body", "timestamp"],
+        [('{"message": "hi"}', datetime(2024, 1, 1, tzinfo=UTC_ZONE))],
+    )
+    # rows of a batch are not always consecutive, e.g. after merging shards
+    rows = batch.rows()[:2] + other_rows + batch.rows()[2:] + batch.rows()[:1]
+
+    assert columnar.encode_fetched_rows(rows) == columnar.encode_rows(
+        [row.as_dict() for row in rows]
+    )
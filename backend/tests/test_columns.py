@@ -1,7 +1,7 @@
 import pytest
 from unittest.mock import MagicMock
 
-from telescope.columns import ParsedColumn, parse_columns
+from telescope.columns import ParsedColumn, parse_columns, get_required_column_names
 from flyql.columns import ParserError as ColumnsParserError
 
 
@@ -149,3 +149,33 @@ class TestParseColumns:
             parse_columns(mock_source, "unknown.nested.field")
 
         assert "unknown" in str(exc_info.value)
+
+
+class TestGetRequiredColumnNames:
+    def test_adds_time_uniq_and_severity_columns(self):
+        mock_source = MagicMock()
+        mock_source._columns = {
+            name: MagicMock()
+            for name in ["time", "id", "level", "message", "labels", "payload"]
+        }
+        mock_source.time_column = "time"
+        mock_source.uniq_column = "id"
+        mock_source.severity_column = "level"
+        columns = [
+            ParsedColumn("message", "message", "string", False, "Message", []),
+            ParsedColumn("labels.app", "labels", "json", True, "App", []),
+        ]
+
+        result = get_required_column_names(mock_source, columns)
+
+        assert result == ["id", "labels", "level", "message", "time"]
+
+    def test_skips_empty_optional_columns(self):
+        mock_source = MagicMock()
+        mock_source._columns = {"time": MagicMock(), "message": MagicMock()}
+        mock_source.time_column = "time"
+        mock_source.uniq_column = ""
+        mock_source.severity_column = ""
+        columns = [ParsedColumn("message", "message", "string", False, "Message", [])]
+
+        assert get_required_column_names(mock_source, columns) == ["message", "time"]
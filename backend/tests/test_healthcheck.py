@@ -2,6 +2,8 @@ import pytest
 
 from unittest.mock import patch
 
+from django.conf import settings
+
 from telescope.models import HealthCheck
 
 
@@ -48,3 +50,29 @@ def test_liveness_no_auth_required(client):
 def test_readiness_no_auth_required(client):
     response = client.get("/readiness")
     assert response.status_code == 200
+
+
+@pytest.mark.django_db
+def test_metrics_returns_counters(client):
+    from telescope import metrics
+
+    metrics.incr("test_counter")
+    with patch.dict(settings.CONFIG["metrics"], {"enabled": True, "token": ""}):
+        response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.json()["counters"]["test_counter"] >= 1
+
+
+@pytest.mark.django_db
+def test_metrics_disabled_by_default(client):
+    response = client.get("/metrics")
+    assert response.status_code == 404
+
+
+@pytest.mark.django_db
+def test_metrics_require_token(client):
+    config = {"enabled": True, "token": "secret"}
+    with patch.dict(settings.CONFIG["metrics"], config):
+        assert client.get("/metrics").status_code == 403
+        response = client.get("/metrics", HTTP_AUTHORIZATION="Bearer secret")
+    assert response.status_code == 200
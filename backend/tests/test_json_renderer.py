@@ -0,0 +1,32 @@
+from datetime import datetime
+from decimal import Decimal
+from uuid import UUID
+
+from telescope.utils import DefaultJSONRenderer, FastJSONRenderer
+
+DATA = {
+    "time": datetime(2024, 1, 1, 10, 0, 0, 120000),
+    "id": UUID("12345678-1234-5678-1234-567812345678"),
+    "amount": Decimal("1.50"),
+    "message": "line\u2028separator\u2029",
+    "unicode": "логи",
+    "items": [1, None, True, {"nested": "value"}],
+    1: "int key",
+}
+
+
+def test_output_matches_default_renderer():
+    rendered = FastJSONRenderer().render(DATA)
+
+    assert rendered == DefaultJSONRenderer().render(DATA)
+    assert b"\\u2028" in rendered and b"\\u2029" in rendered
+
+
+def test_wide_integers_are_rendered():
+    rendered = FastJSONRenderer().render({"value": 2**70})
+
+    assert rendered == b'{"value":1180591620717411303424}'
+
+
+def test_none_is_empty():
+    assert FastJSONRenderer().render(None) == b""
@@ -0,0 +1,27 @@
+from datetime import datetime
+from unittest.mock import Mock
+
+from telescope import streaming
+
+
+def test_dumps_line():
+    line = streaming.dumps_line({"time": datetime(2024, 1, 1), "data": {"a": 1}})
+    assert line == b'{"time":"2024-01-01 00:00:00","data":{"a":1}}\n'
+
+
+def test_chunked_joins_small_items():
+    items = [b"a" * 3, b"b" * 3, b"c" * 3, b"d"]
+    assert list(streaming.chunked(items, size=5)) == [b"aaabbb", b"cccd"]
+    assert list(streaming.chunked([], size=5)) == []
+
+
+def test_closing_iterable_runs_callback_when_not_consumed():
+    on_close = Mock()
+
+    def lines():
+        yield b"line\n"
+
+    content = streaming.ClosingIterable(lines(), on_close)
+    content.close()
+
+    on_close.assert_called_once_with()
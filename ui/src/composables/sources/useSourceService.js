@@ -2,6 +2,7 @@ import { ref } from 'vue'
 import { Source, SourceRoleBiding } from '@/sdk/models/source'
 import { SourceService } from '@/sdk/services/source'
 import { SavedView } from '@/sdk/models/savedView'
+import { getResponseRows } from '@/utils/columnar'
 
 const srv = new SourceService()
 
@@ -63,6 +64,7 @@ const useGetSourceData = () => {
     const rows = ref(null)
     const columns = ref(null)
     const message = ref(null)
+    const stats = ref(null)
     const error = ref(null)
     const loading = ref(null)
     const validation = ref(null)
@@ -74,16 +76,17 @@ const useGetSourceData = () => {
         let response = await srv.getData(sourceSlug, params, controller.value.signal)
         if (!response.aborted) {
             if (response.result) {
-                rows.value = response.data.rows
+                rows.value = getResponseRows(response.data)
                 columns.value = response.data.columns
                 message.value = response.data.message
+                stats.value = response.data.stats
             }
             error.value = response.errors.join(', ')
             validation.value = response.validation
         }
         loading.value = false
     }
-    return { rows, columns, message, error, loading, validation, load, controller }
+    return { rows, columns, message, stats, error, loading, validation, load, controller }
 }
 
 const useGetSourceGraphData = () => {
@@ -189,6 +192,7 @@ const useGetSourceDataAndGraph = () => {
     const rows = ref(null)
     const columns = ref(null)
     const message = ref(null)
+    const stats = ref(null)
     const graphData = ref(null)
     const error = ref(null)
     const loading = ref(null)
@@ -201,9 +205,10 @@ const useGetSourceDataAndGraph = () => {
         let response = await srv.getDataAndGraph(sourceSlug, params, controller.value.signal)
         if (!response.aborted) {
             if (response.result) {
-                rows.value = response.data.rows
+                rows.value = getResponseRows(response.data)
                 columns.value = response.data.columns
                 message.value = response.data.message
+                stats.value = response.data.stats
                 graphData.value = response.data.graph
             }
             error.value = response.errors.join(', ')
@@ -211,7 +216,7 @@ const useGetSourceDataAndGraph = () => {
         }
         loading.value = false
     }
-    return { rows, columns, message, graphData, error, loading, validation, load, controller }
+    return { rows, columns, message, stats, graphData, error, loading, validation, load, controller }
 }
 
 export {
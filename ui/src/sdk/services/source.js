@@ -81,6 +81,10 @@ class SourceService {
         let response = await http.Post(`ui/v1/sources/${sourceSlug}/dataAndGraph`, params, signal)
         return response
     }
+    cancelQueries = async (sourceSlug, keepalive) => {
+        let response = await http.Post(`ui/v1/sources/${sourceSlug}/cancel`, {}, undefined, keepalive)
+        return response
+    }
     autocomplete = async (sourceSlug, params) => {
         let response = await http.Post(`ui/v1/sources/${sourceSlug}/autocomplete`, params)
         return response
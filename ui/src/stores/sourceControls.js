@@ -183,6 +183,7 @@ export const useSourceControlsStore = defineStore('sourceDataControls', () => {
             from: from.value,
             to: to.value,
             context_columns: structuredClone(contextColumns.value),
+            columnar: true,
         }
 
         if (query.value) params.query = query.value
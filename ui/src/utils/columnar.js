@@ -0,0 +1,33 @@
+// Decodes the columnar rows of data responses, see telescope/columnar.py
+function decodeColumn(column, dictionary) {
+    if (column.codes === undefined) {
+        return column.values
+    }
+    return column.codes.map((code) => (code === null ? null : dictionary[code]))
+}
+
+function decodeColumnarRows(columnar) {
+    const dictionary = columnar.dictionary
+    const time = Object.entries(columnar.time).map(([key, column]) => [key, decodeColumn(column, dictionary)])
+    const severity = decodeColumn(columnar.severity, dictionary)
+    const data = Object.entries(columnar.data).map(([name, column]) => [name, decodeColumn(column, dictionary)])
+
+    const rows = new Array(columnar.length)
+    for (let idx = 0; idx < columnar.length; idx++) {
+        const row = { time: {}, severity: severity[idx], data: {} }
+        for (const [key, values] of time) {
+            row.time[key] = values[idx]
+        }
+        for (const [name, values] of data) {
+            row.data[name] = values[idx]
+        }
+        rows[idx] = row
+    }
+    return rows
+}
+
+function getResponseRows(data) {
+    return data.columnar ? decodeColumnarRows(data.columnar) : data.rows
+}
+
+export { decodeColumnarRows, getResponseRows }
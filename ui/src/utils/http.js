@@ -1,8 +1,9 @@
 import getCSRFToken from '@/utils/csrf'
 import UIResponse from '@/sdk/models/response'
+import getTabId from '@/utils/tab'
 
 class HTTP {
-    Request = async (url, method, data, signal) => {
+    Request = async (url, method, data, signal, keepalive) => {
         let response = new UIResponse()
         try {
             let requestOptions = {
@@ -10,11 +11,16 @@ class HTTP {
                 headers: {
                     Accept: 'application/json',
                     'Content-Type': 'application/json',
+                    'X-Telescope-Tab': getTabId(),
                 },
             }
             if (signal !== undefined) {
                 requestOptions.signal = signal
             }
+            if (keepalive) {
+                // lets the request outlive the page, e.g. when the tab is closed
+                requestOptions.keepalive = true
+            }
             if (method === 'POST' || method === 'DELETE' || method === 'PATCH') {
                 requestOptions.headers['X-CSRFToken'] = getCSRFToken()
             }
@@ -23,7 +29,8 @@ class HTTP {
             }
 
             let r = await fetch(url, requestOptions)
-            if (!r.ok) {
+            // 429 carries a regular response explaining the source is busy
+            if (!r.ok && r.status !== 429) {
                 throw Error(`failed to fetch ${r.url}. ${r.status}: ${r.statusText}`)
             } else {
                 try {
@@ -48,8 +55,8 @@ class HTTP {
     Get = async (url, signal) => {
         return this.Request(url, 'GET', undefined, signal)
     }
-    Post = async (url, data, signal) => {
-        return this.Request(url, 'POST', data, signal)
+    Post = async (url, data, signal, keepalive) => {
+        return this.Request(url, 'POST', data, signal, keepalive)
     }
     Patch = async (url, data, signal) => {
         return this.Request(url, 'PATCH', data, signal)
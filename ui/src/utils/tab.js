@@ -0,0 +1,14 @@
+// Id of the browser tab, sent with every request so the backend can cancel
+// queries a tab has abandoned or superseded. sessionStorage is per tab.
+const TAB_ID_KEY = 'telescope-tab-id'
+
+function getTabId() {
+    let tabId = sessionStorage.getItem(TAB_ID_KEY)
+    if (!tabId) {
+        tabId = crypto.randomUUID()
+        sessionStorage.setItem(TAB_ID_KEY, tabId)
+    }
+    return tabId
+}
+
+export default getTabId